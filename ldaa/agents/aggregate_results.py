@@ -1,10 +1,27 @@
-from ldaa.utils.logging import log_event, log_error
-from ldaa.schemas import SegmentAnalysis
+import numpy as np
+from ldaa.agents.config import load_config
+from ldaa.utils.analysis_store import ACTIONS, AnalysisStore, build_table, count_by, group_stats, low_confidence_hotspots
+from ldaa.utils.cache import cache_root
+from ldaa.utils.logging import log_event, log_error, log_debug
+from ldaa.utils.session import generate_session_id
+
+DOCS = ("doc1", "doc2")
+
+def run_id_for(state, config):
+    """The LangGraph thread_id when available, else a per-run id kept in state.meta."""
+    if isinstance(config, dict):
+        thread_id = (config.get("configurable") or {}).get("thread_id")
+        if thread_id:
+            return str(thread_id)
+    return state.meta.setdefault("run_id", generate_session_id())
 
 def aggregate_results(state, config, store):
     """
     Aggregates all segment analyses and their actions for each document.
     Updates the state in-place and returns it, as required by LangGraph node conventions.
+    The analyses and actions are laid out as one columnar table (see
+    ldaa.utils.analysis_store); counts, per-category statistics and the accepted segments
+    come from vectorized masks over it, and the table is appended to the analysis store.
     Inputs (from state):
         - doc1_analysis: List of analysis dicts for doc1 segments
         - doc2_analysis: List of analysis dicts for doc2 segments
@@ -13,46 +30,40 @@ def aggregate_results(state, config, store):
     Outputs (to state):
         - doc1_accepted_segments: List of accepted analysis dicts for doc1
         - doc2_accepted_segments: List of accepted analysis dicts for doc2
-        - meta_log_aggregate: Aggregation meta information (counts, etc)
+        - meta_log_aggregate: Aggregation meta information (counts, per-category stats, etc)
     """
     log_event("AGGREGATE", "Starting aggregation of results.")
     try:
-        doc1_analysis = state.doc1_analysis
-        doc2_analysis = state.doc2_analysis
-        doc1_actions = state.doc1_segment_actions
-        doc2_actions = state.doc2_segment_actions
-        print("[DEBUG] doc1_analysis:", doc1_analysis)
-        print("[DEBUG] doc1_actions:", doc1_actions)
-        print("[DEBUG] doc2_analysis:", doc2_analysis)
-        print("[DEBUG] doc2_actions:", doc2_actions)
-        doc1_accepted, doc2_accepted = [], []
-        doc1_counts = {"accept": 0, "retry": 0, "mark_review": 0}
-        doc2_counts = {"accept": 0, "retry": 0, "mark_review": 0}
-        # Aggregate doc1
-        for i, (analysis, action) in enumerate(zip(doc1_analysis, doc1_actions)):
-            print(f"[DEBUG] doc1 Index {i}: action={getattr(action, 'action', None)}, analysis={analysis}")
-            act = action.action
-            doc1_counts[act] = doc1_counts[act] + 1 if act in doc1_counts else 1
-            if act == "accept":
-                print(f"[DEBUG] Accepting doc1 analysis at index {i}: {analysis}")
-                doc1_accepted.append(analysis)
-        # Aggregate doc2
-        for i, (analysis, action) in enumerate(zip(doc2_analysis, doc2_actions)):
-            print(f"[DEBUG] doc2 Index {i}: action={getattr(action, 'action', None)}, analysis={analysis}")
-            act = action.action
-            doc2_counts[act] = doc2_counts[act] + 1 if act in doc2_counts else 1
-            if act == "accept":
-                print(f"[DEBUG] Accepting doc2 analysis at index {i}: {analysis}")
-                doc2_accepted.append(analysis)
-        meta_log = {
-            "doc1": doc1_counts,
-            "doc2": doc2_counts,
-        }
-        state.doc1_accepted_segments = doc1_accepted
-        state.doc2_accepted_segments = doc2_accepted
+        settings = load_config().analysis_store
+        analyses = {doc: getattr(state, f"{doc}_analysis") for doc in DOCS}
+        actions = {doc: getattr(state, f"{doc}_segment_actions") for doc in DOCS}
+        log_debug("AGGREGATE", "Aggregation input", doc1_segments=len(analyses["doc1"]), doc2_segments=len(analyses["doc2"]))
+        run_id = run_id_for(state, config)
+        table = build_table(run_id, {
+            doc: (analyses[doc], actions[doc], getattr(state, f"{doc}_segment_attempts"))
+            for doc in DOCS
+        })
+        decided = table[table["action"] != ""]
+        meta_log = {}
+        for doc in DOCS:
+            rows = decided[decided["doc"] == doc]
+            meta_log[doc] = {**dict.fromkeys(ACTIONS, 0), **count_by(rows, "action")}
+            accepted = rows["segment_index"][rows["action"] == "accept"]
+            setattr(state, f"{doc}_accepted_segments", [analyses[doc][i] for i in accepted.tolist()])
+            log_debug("AGGREGATE", "Accepted analyses", doc=doc, indices=accepted.tolist())
+        meta_log["categories"] = group_stats(decided, "category")
+        meta_log["hotspots"] = low_confidence_hotspots(decided, settings.hotspot_threshold)
+        meta_log["mean_confidence"] = round(float(np.mean(decided["confidence"])), 4) if len(decided) else None
+        if settings.enabled:
+            try:
+                root = settings.path or cache_root() / "analysis_store"
+                meta_log["store"] = {"run_id": run_id, "rows": len(table), "path": str(AnalysisStore(root).append(run_id, table))}
+            except Exception as e:
+                # The store is for analytics; a failed write must not fail the run
+                log_error(str(e), context="aggregate_results.store")
         state.meta['aggregate'] = meta_log
         log_event("AGGREGATE", "Aggregation successful.")
         return state
     except Exception as e:
         log_error(str(e), context="aggregate_results")
-        raise 
\ No newline at end of file
+        raise
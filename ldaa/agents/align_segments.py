@@ -0,0 +1,79 @@
+from ldaa.agents.config import load_config
+from ldaa.agents.embeddings import embedding_spec, get_embeddings
+from ldaa.utils.alignment import align, cosine_similarity_matrix
+from ldaa.utils.logging import log_event, log_error
+
+# Minimum cosine similarity of an aligned pair when `alignment.threshold` is not set. Hashed
+# n-gram vectors only share surface vocabulary, so related articles score much lower with them.
+DEFAULT_THRESHOLDS = {"hashing": 0.3, "openai": 0.75}
+
+async def embed_texts(texts, settings):
+    """Embeds `texts` in batches with the embedder configured by `settings` (the `embeddings` section)."""
+    if not texts:
+        return []
+    return await get_embeddings(settings).aembed_documents(texts)
+
+def alignment_text(analysis, max_chars):
+    return f"{analysis.summary}\n{analysis.segment[:max_chars]}"
+
+def alignment_prompt_section(alignment, doc1_ids=None, doc2_ids=None):
+    """
+    Renders the alignment as structured prompt input, optionally restricted to the given
+    segment ids (e.g. the segments of one category). Returns "" when there is nothing to add.
+    """
+    if not alignment:
+        return ""
+    keep1 = (lambda sid: sid in doc1_ids) if doc1_ids is not None else (lambda sid: True)
+    keep2 = (lambda sid: sid in doc2_ids) if doc2_ids is not None else (lambda sid: True)
+    pairs = [p for p in alignment["pairs"] if keep1(p["doc1"]) and keep2(p["doc2"])]
+    unmatched1 = [sid for sid in alignment["unmatched"]["doc1"] if keep1(sid)]
+    unmatched2 = [sid for sid in alignment["unmatched"]["doc2"] if keep2(sid)]
+    if not (pairs or unmatched1 or unmatched2):
+        return ""
+    lines = ["", "Aligned segments (doc1 segment_id <-> doc2 segment_id, similarity); compare these pairs directly:"]
+    lines += [f"- {p['doc1']} <-> {p['doc2']} ({p['score']:.2f})" for p in pairs] or ["- none"]
+    lines.append(f"Document 1 segments without a counterpart in Document 2 (candidate gaps): {', '.join(unmatched1) or 'none'}")
+    lines.append(f"Document 2 segments without a counterpart in Document 1 (candidate gaps): {', '.join(unmatched2) or 'none'}")
+    return "\n".join(lines) + "\n"
+
+async def align_segments(state, config, store):
+    """
+    Agentic node: Aligns the accepted segments of doc1 with those of doc2 before comparison.
+    Embeds both sets, builds the doc1 x doc2 cosine similarity matrix and solves the
+    configured assignment. Aligned pairs and unmatched segments (candidate gaps) are stored
+    in `state.segment_alignment` and passed to compare_documents as structured input.
+    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    """
+    config = load_config()
+    settings, embeddings = config.alignment, config.embeddings
+    threshold = settings.threshold if settings.threshold is not None else DEFAULT_THRESHOLDS.get(embeddings.backend, 0.75)
+    doc1, doc2 = state.doc1_accepted_segments, state.doc2_accepted_segments
+    try:
+        vectors = await embed_texts([alignment_text(a, settings.max_chars) for a in list(doc1) + list(doc2)], embeddings)
+        similarity = cosine_similarity_matrix(vectors[:len(doc1)], vectors[len(doc1):])
+        result = align(similarity, settings.method, threshold)
+    except Exception as e:
+        log_error(str(e), context="align_segments")
+        state.segment_alignment = {}
+        state.meta['alignment'] = {"success": False, "reasoning": f"Alignment failed: {str(e)}"}
+        return state
+    state.segment_alignment = {
+        "method": settings.method,
+        "pairs": [{"doc1": doc1[i].segment_id, "doc2": doc2[j].segment_id, "score": score} for i, j, score in result["pairs"]],
+        "unmatched": {
+            "doc1": [doc1[i].segment_id for i in result["unmatched_rows"]],
+            "doc2": [doc2[j].segment_id for j in result["unmatched_cols"]],
+        },
+    }
+    meta_log = {
+        "success": True,
+        "method": settings.method,
+        "threshold": threshold,
+        "embeddings": embedding_spec(embeddings),
+        "pairs": len(result["pairs"]),
+        "unmatched_doc1": len(result["unmatched_rows"]),
+        "unmatched_doc2": len(result["unmatched_cols"]),
+    }
+    state.meta['alignment'] = meta_log
+    log_event("ALIGN", "Segment alignment completed.", **meta_log)
+    return state
@@ -0,0 +1,87 @@
+"""
+Pipelined analysis and self-reflection.
+
+`analyze_and_reflect_segment` replaces the analyze_segment -> self_reflect_segment pair
+when `pipeline.fused_analyze_reflect` is enabled. Instead of waiting for every analysis
+before reflecting on any, each unit of work (a single segment, or one packed batch when
+batching is on) is reflected on as soon as its own analysis returns. All units share the
+LLM scheduler, so wall-clock time approaches that of the slowest unit.
+"""
+import asyncio
+from ldaa.agents.analyze_segment import plan_analysis, run_analysis_jobs, build_segment_analysis, group_jobs_by_cluster
+from ldaa.agents.self_reflect_segment import run_reflection_jobs, to_segment_action
+from ldaa.agents.config import load_config
+from ldaa.agents.llm import get_scheduler, llm_cache_stats, llm_pool_stats
+from ldaa.utils.batching import pack_batches
+from ldaa.utils.logging import log_event
+from ldaa.utils.tokens import count_tokens
+from ldaa.utils.usage import tracks_usage
+
+def split_into_units(jobs, batching, clusters=None):
+    """
+    Groups analysis jobs into pipeline units: packed batches when batching is on, else one
+    segment each. Members of a duplicate cluster always share a unit, so the cluster is
+    analyzed once.
+    """
+    groups = [[jobs[k] for k in group] for group in group_jobs_by_cluster(jobs, clusters or {})]
+    if not batching.enabled:
+        return groups
+    batches = pack_batches(
+        groups,
+        cost=lambda group: count_tokens(group[0][2].text),
+        max_tokens=batching.max_batch_tokens,
+        max_items=batching.max_batch_size,
+    )
+    return [[job for group in batch for job in group] for batch in batches]
+
+async def analyze_then_reflect(unit, batching, max_attempts, clusters=None):
+    """Analyzes one unit of (doc, index, segment, attempt) jobs, then reflects on it right away."""
+    results, _ = await run_analysis_jobs(unit, batching, clusters)
+    analyses = [build_segment_analysis(analysis) for analysis in results]
+    reflections, _ = await run_reflection_jobs(
+        [(doc, i, analysis) for (doc, i, _, _), analysis in zip(unit, analyses)], batching
+    )
+    actions = [
+        to_segment_action(reflection, attempt, max_attempts)
+        for (_, _, _, attempt), reflection in zip(unit, reflections)
+    ]
+    return list(zip(unit, analyses, actions))
+
+@tracks_usage("analyze_and_reflect_segment")
+async def analyze_and_reflect_segment(state, config, store):
+    """
+    Agentic node: analyzes each pending segment and reflects on it as soon as its analysis
+    is done, keeping `docN_analysis` and `docN_segment_actions` index-aligned. Retry passes
+    only redo the segments flagged 'retry', as in the staged nodes.
+    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    """
+    jobs, analyses, attempts, pending = plan_analysis(state)
+    settings = load_config()
+    previous = {"doc1": state.doc1_segment_actions, "doc2": state.doc2_segment_actions}
+    actions = {}
+    for doc in analyses:
+        count = len(analyses[doc])
+        actions[doc] = list(previous[doc][:count]) + [None] * (count - len(previous[doc][:count]))
+    units = split_into_units(jobs, settings.batching, state.segment_clusters)
+    log_event("ANALYZE_REFLECT", "Starting pipelined analysis and reflection.", segments=len(jobs), units=len(units))
+    outcomes = await asyncio.gather(*(analyze_then_reflect(unit, settings.batching, settings.max_segment_attempts, state.segment_clusters) for unit in units))
+    analysis_log = {"doc1": [], "doc2": [], "pending": {doc: len(indices) for doc, indices in pending.items()}}
+    reflect_log = {"doc1": [], "doc2": []}
+    for (doc, i, _, attempt), analysis, action in (item for outcome in outcomes for item in outcome):
+        analyses[doc][i] = analysis
+        actions[doc][i] = action
+        analysis_log[doc].append({"segment": i, "attempt": attempt, "success": analysis.success, "reasoning": analysis.reasoning})
+        reflect_log[doc].append({"segment": i, "success": action.success, "reasoning": action.reasoning, "rule": action.rule})
+    state.doc1_analysis = analyses["doc1"]
+    state.doc2_analysis = analyses["doc2"]
+    state.doc1_segment_attempts = attempts["doc1"]
+    state.doc2_segment_attempts = attempts["doc2"]
+    state.doc1_segment_actions = actions["doc1"]
+    state.doc2_segment_actions = actions["doc2"]
+    state.meta['analysis'] = analysis_log
+    state.meta['reflect_segment'] = reflect_log
+    state.meta['pipeline'] = {"mode": "fused", "units": len(units), "scheduler": get_scheduler().stats()}
+    state.meta['llm_cache'] = llm_cache_stats()
+    state.meta['llm_pool'] = llm_pool_stats()
+    log_event("ANALYZE_REFLECT", "Pipelined analysis and reflection completed.")
+    return state
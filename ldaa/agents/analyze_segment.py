@@ -1,13 +1,24 @@
-from ldaa.agents.llm import get_llm
+from ldaa.agents.llm import get_llm, get_scheduler, invoke_llm, variant_seed, llm_cache_stats, llm_pool_stats
 from ldaa.agents.config import load_config
 import asyncio
 from ldaa.utils.logging import log_event, log_error
 from ldaa.utils.json import extract_json_from_llm_output
 from ldaa.schemas import SegmentAnalysis
 from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.tokens import count_tokens
+from ldaa.utils.batching import pack_batches, index_batch_response
+from ldaa.utils.minhash import content_hash
+from ldaa.utils.usage import tracks_usage
+from pydantic import ValidationError
+import json
 
-async def analyze_one_segment(segment, doc_label="doc"):
-    llm = get_llm()
+# Prefixes of `reasoning` for analyses that did not come back usable
+FAILURE_MARKER = "LLM analysis failed"
+INVALID_MARKER = "Invalid analysis"
+
+async def analyze_one_segment(segment, doc_label="doc", attempt=1):
+    # Retries skip the response cache, which would return the rejected answer again
+    llm = get_llm() if attempt <= 1 else get_llm(cache=False)
     config = load_config()
     taxonomy = ', '.join(config.taxonomy)
     prompt_templates = [
@@ -27,10 +38,10 @@ You are tasked with analyzing a legal segment. Return a JSON object with: - 'seg
 Act as a legal segment reviewer. For the segment below, provide a JSON object: - 'segment_id': unique id - 'segment': text - 'summary': summary - 'category': topic/category (from: {taxonomy}) - 'pros': 2-5 strengths - 'cons': 2-5 weaknesses - 'confidence': 0-1 - 'reasoning': explanation.\n\nSegment ID: {segment_id}\nTitle: {title}\nText: {text}
 """
     ]
-    prompt = get_random_prompt_variant(prompt_templates, {"taxonomy": taxonomy, "segment_id": segment.id, "title": getattr(segment, 'title', ''), "text": segment.text})
+    prompt = get_random_prompt_variant(prompt_templates, {"taxonomy": taxonomy, "segment_id": segment.id, "title": getattr(segment, 'title', ''), "text": segment.text}, seed=variant_seed(segment.text, attempt))
     log_event("ANALYZE", f"Analyzing segment {doc_label} with title: {getattr(segment, 'title', 'No Title')}")
     try:
-        response = await llm.ainvoke(prompt)
+        response = await invoke_llm(llm, prompt)
         analysis = extract_json_from_llm_output(response.content)
         analysis["segment"] = segment.text
         analysis["segment_id"] = segment.id
@@ -46,34 +57,207 @@ Act as a legal segment reviewer. For the segment below, provide a JSON object: -
             "pros": [],
             "cons": [],
             "confidence": 0.0,
-            "reasoning": f"LLM analysis failed: {str(e)}",
+            "reasoning": f"{FAILURE_MARKER}: {str(e)}",
+            "success": False,
         }
     return analysis
 
+def build_segment_analysis(analysis):
+    """
+    Validates an analysis dict into a SegmentAnalysis. Failed or invalid analyses (e.g. the
+    empty pros/cons of a failed call) are kept as unvalidated models with success=False, so
+    reflection can route them to a retry instead of the node raising.
+    """
+    try:
+        return SegmentAnalysis(**analysis)
+    except ValidationError as e:
+        if analysis.get("success", True):
+            log_error(f"Invalid segment analysis: {e}", context="analyze_segment")
+        placeholder = {"summary": "", "category": "", "pros": [], "cons": [], "confidence": 0.0, "reasoning": ""}
+        analysis = {**placeholder, **analysis, "success": False}
+        if not analysis["reasoning"].startswith(FAILURE_MARKER):
+            analysis["reasoning"] = f"{INVALID_MARKER}: {analysis['reasoning']}".rstrip(": ")
+        return SegmentAnalysis.model_construct(**analysis)
+
+BATCH_PROMPT_TEMPLATES = [
+    """
+You are a legal document analysis assistant. Analyze each of the segments below independently. Return a JSON array with exactly one object per segment, each with: - 'segment_id': the id of the segment, copied exactly - 'summary': a concise summary of the segment - 'category': a topic or category tag. Use one of the following taxonomy categories: {taxonomy} - 'pros': a list of positive aspects or strengths (at least 2, max 5) - 'cons': a list of negative aspects or weaknesses (at least 2, max 5) - 'confidence': a score from 0 to 1 for your confidence in your analysis - 'reasoning': a short explanation of your reasoning. Do not repeat the segment text.\n\nSegments (JSON):\n{segments}
+""",
+    """
+As a legal segment analyst, review every segment below on its own and output a JSON array with one object per segment: - 'segment_id': copied exactly - 'summary': concise summary - 'category': topic/category (choose from: {taxonomy}) - 'pros': 2-5 strengths - 'cons': 2-5 weaknesses - 'confidence': confidence score (0-1) - 'reasoning': brief explanation. Do not echo the text.\n\nSegments (JSON):\n{segments}
+""",
+    """
+Analyze the following legal document segments one by one. Output a JSON array, one object per segment, with: - 'segment_id': exact id - 'summary': concise summary - 'category': topic/category (from: {taxonomy}) - 'pros': 2-5 strengths - 'cons': 2-5 weaknesses - 'confidence': 0-1 score - 'reasoning': short explanation.\n\nSegments (JSON):\n{segments}
+""",
+]
+
+async def analyze_segment_batch(segments, taxonomy, retry=False):
+    """
+    Analyzes several segments with a single LLM call.
+    Returns one entry per segment, in order: the analysis dict, or None if the segment was
+    missing or malformed in the response (the caller re-queues those individually).
+    """
+    llm = get_llm(cache=False) if retry else get_llm()
+    payload = json.dumps(
+        [{"segment_id": seg.id, "title": getattr(seg, "title", None) or "", "text": seg.text} for seg in segments],
+        ensure_ascii=False,
+    )
+    prompt = get_random_prompt_variant(BATCH_PROMPT_TEMPLATES, {"taxonomy": taxonomy, "segments": payload}, seed=variant_seed(payload, retry))
+    log_event("ANALYZE", f"Analyzing batch of {len(segments)} segments.")
+    try:
+        response = await invoke_llm(llm, prompt)
+        entries = index_batch_response(extract_json_from_llm_output(response.content))
+    except Exception as e:
+        log_error(str(e), context="analyze_segment_batch")
+        return [None] * len(segments)
+    results = []
+    for seg in segments:
+        entry = entries.get(str(seg.id))
+        if entry is None:
+            results.append(None)
+            continue
+        analysis = {
+            **entry,
+            "segment": seg.text,
+            "segment_id": seg.id,
+            "segment_type": getattr(seg, "segment_type", None),
+        }
+        try:
+            SegmentAnalysis(**analysis)
+        except (ValidationError, TypeError):
+            analysis = None
+        results.append(analysis)
+    return results
+
+async def analyze_segments_batched(jobs, batching):
+    """
+    Runs the (doc, index, segment, attempt) `jobs` as packed multi-segment prompts and returns the
+    analyses in job order, plus batching stats. Segments the batch answers miss or garble
+    are analyzed again with `analyze_one_segment`.
+    """
+    taxonomy = ', '.join(load_config().taxonomy)
+    batches = pack_batches(
+        jobs,
+        cost=lambda job: count_tokens(job[2].text),
+        max_tokens=batching.max_batch_tokens,
+        max_items=batching.max_batch_size,
+        key=lambda job: job[2].id,
+    )
+    batch_results = await asyncio.gather(*(
+        analyze_segment_batch([job[2] for job in batch], taxonomy, retry=any(job[3] > 1 for job in batch))
+        for batch in batches
+    ))
+    results = [analysis for batch in batch_results for analysis in batch]
+    requeued = [k for k, analysis in enumerate(results) if analysis is None]
+    retried = await asyncio.gather(*(analyze_one_segment(jobs[k][2], doc_label=f"{jobs[k][0]}_seg_{jobs[k][1]}", attempt=jobs[k][3]) for k in requeued))
+    for k, analysis in zip(requeued, retried):
+        results[k] = analysis
+    return results, {"batches": len(batches), "segments": len(jobs), "requeued": len(requeued)}
+
+def pending_segment_indices(items, actions):
+    """
+    Per-document indices of `items` to (re)process in this pass. When every document has a
+    complete action list and some were flagged 'retry', only those indices are returned, so
+    retry cost scales with the number of failures. Otherwise (first pass, or a reboot that
+    starts the analysis over) every index is.
+    """
+    complete = all(len(actions[doc]) == len(items[doc]) for doc in items)
+    flagged = {doc: [i for i, action in enumerate(actions[doc]) if action.action == "retry"] for doc in items}
+    if complete and any(flagged.values()):
+        return flagged
+    return {doc: list(range(len(items[doc]))) for doc in items}
+
+def plan_analysis(state):
+    """
+    Works out which segments to analyze in this pass.
+    Returns (jobs, analyses, attempts, pending): `jobs` are (doc, index, segment, attempt)
+    tuples in document order, `analyses` and `attempts` are per-document lists padded to the
+    segment count (kept entries stay in place), and `pending` maps doc -> indices to redo.
+    """
+    segments = {"doc1": state.doc1_segments, "doc2": state.doc2_segments}
+    previous = {"doc1": state.doc1_analysis, "doc2": state.doc2_analysis}
+    pending = pending_segment_indices(segments, {"doc1": state.doc1_segment_actions, "doc2": state.doc2_segment_actions})
+    analyses, attempts = {}, {}
+    for doc, attempt_counts in (("doc1", state.doc1_segment_attempts), ("doc2", state.doc2_segment_attempts)):
+        count = len(segments[doc])
+        analyses[doc] = list(previous[doc][:count]) + [None] * (count - len(previous[doc][:count]))
+        attempts[doc] = list(attempt_counts[:count]) + [0] * (count - len(attempt_counts[:count]))
+        for i in pending[doc]:
+            attempts[doc][i] += 1
+    jobs = [(doc, i, segments[doc][i], attempts[doc][i]) for doc in ("doc1", "doc2") for i in pending[doc]]
+    return jobs, analyses, attempts, pending
+
+def group_jobs_by_cluster(jobs, clusters):
+    """Job indices grouped by duplicate cluster (see deduplicate_segments), in first-seen order."""
+    groups = {}
+    for k, (_, _, seg, _) in enumerate(jobs):
+        groups.setdefault(clusters.get(seg.id, seg.id), []).append(k)
+    return list(groups.values())
+
+def share_analysis(analysis, representative, member, members):
+    """Copy of the representative's analysis for `member`, recording the sharing in meta."""
+    shared = dict(analysis)
+    if member is not representative:
+        shared.update({"segment": member.text, "segment_id": member.id, "segment_type": getattr(member, "segment_type", None)})
+    shared["meta"] = {
+        **(analysis.get("meta") or {}),
+        "dedup": {
+            "analyzed_as": representative.id,
+            "shared_with": [seg.id for seg in members if seg is not member],
+            "match": "exact" if content_hash(member.text) == content_hash(representative.text) else "near",
+        },
+    }
+    return shared
+
+async def run_analysis_jobs(jobs, batching, clusters=None):
+    """
+    Analyzes `jobs`, batched when enabled; returns (analysis dicts in job order, batching
+    stats or None). With `clusters`, only the first job of each duplicate cluster is sent
+    to the LLM and its analysis is shared with the other members.
+    """
+    if clusters:
+        groups = group_jobs_by_cluster(jobs, clusters)
+        if len(groups) < len(jobs):
+            results, stats = await run_analysis_jobs([jobs[group[0]] for group in groups], batching)
+            shared = [None] * len(jobs)
+            for group, analysis in zip(groups, results):
+                members = [jobs[k][2] for k in group]
+                for k in group:
+                    shared[k] = share_analysis(analysis, members[0], jobs[k][2], members) if len(group) > 1 else analysis
+            return shared, stats
+    if batching.enabled and len(jobs) > 1:
+        return await analyze_segments_batched(jobs, batching)
+    results = await asyncio.gather(*(
+        analyze_one_segment(seg, doc_label=f"{doc}_seg_{i}", attempt=attempt) for doc, i, seg, attempt in jobs
+    ))
+    return list(results), None
+
+@tracks_usage("analyze_segment")
 async def analyze_segment(state, config, store):
     """
     Agentic node: Uses an LLM to analyze each segment of both documents.
+    On a segment retry only the segments flagged 'retry' are analyzed again; the other
+    analyses are kept. Per-segment attempt counts are tracked in the state.
     Updates the state in-place and returns it, as required by LangGraph node conventions.
     """
-    doc1_segments = state.doc1_segments
-    doc2_segments = state.doc2_segments
-    doc1_analysis, doc2_analysis = [], []
-    meta_log = {"doc1": [], "doc2": []}
-    log_event("ANALYZE", "Starting segment analysis.")
-    # Analyze doc1 segments
-    for i, seg in enumerate(doc1_segments):
-        analysis = await analyze_one_segment(seg, doc_label=f"doc1_seg_{i}")
-        analysis = SegmentAnalysis(**analysis)
-        doc1_analysis.append(analysis)
-        meta_log["doc1"].append({"segment": i, "success": analysis.success, "reasoning": analysis.reasoning})
-    # Analyze doc2 segments
-    for i, seg in enumerate(doc2_segments):
-        analysis = await analyze_one_segment(seg, doc_label=f"doc2_seg_{i}")
-        analysis = SegmentAnalysis(**analysis)
-        doc2_analysis.append(analysis)
-        meta_log["doc2"].append({"segment": i, "success": analysis.success, "reasoning": analysis.reasoning})
-    state.doc1_analysis = doc1_analysis
-    state.doc2_analysis = doc2_analysis
+    jobs, analyses, attempts, pending = plan_analysis(state)
+    meta_log = {"doc1": [], "doc2": [], "pending": {doc: len(indices) for doc, indices in pending.items()}}
+    log_event("ANALYZE", "Starting segment analysis.", pending=meta_log["pending"])
+    # Segments of both documents share one scheduler queue; gather keeps results in order
+    results, batching_stats = await run_analysis_jobs(jobs, load_config().batching, state.segment_clusters)
+    if batching_stats:
+        meta_log["batching"] = batching_stats
+    for (doc, i, _, attempt), analysis in zip(jobs, results):
+        analysis = build_segment_analysis(analysis)
+        analyses[doc][i] = analysis
+        meta_log[doc].append({"segment": i, "attempt": attempt, "success": analysis.success, "reasoning": analysis.reasoning})
+    state.doc1_analysis = analyses["doc1"]
+    state.doc2_analysis = analyses["doc2"]
+    state.doc1_segment_attempts = attempts["doc1"]
+    state.doc2_segment_attempts = attempts["doc2"]
+    meta_log["scheduler"] = get_scheduler().stats()
     state.meta['analysis'] = meta_log
+    state.meta['llm_cache'] = llm_cache_stats()
+    state.meta['llm_pool'] = llm_pool_stats()
     log_event("ANALYZE", "Segment analysis completed.")
     return state 
\ No newline at end of file
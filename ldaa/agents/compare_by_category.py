@@ -0,0 +1,288 @@
+"""
+Map-reduce document comparison.
+
+Instead of one LLM call over every accepted segment, accepted analyses are grouped by their
+taxonomy `category` (anything outside the taxonomy goes to "other"), each category is
+compared in its own, smaller call, and the partial results are merged locally into one
+DocumentComparison. Partials are kept in `state.comparison_partials` together with a
+fingerprint of their input, so a rerun only recomputes the categories that failed, came
+back below the confidence threshold, or whose analyses changed.
+"""
+import asyncio
+import hashlib
+from ldaa.agents.align_segments import alignment_prompt_section
+from ldaa.agents.config import load_config
+from ldaa.agents.llm import get_llm, invoke_llm, variant_seed
+from ldaa.schemas import DocumentComparison
+from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.json import extract_json_from_llm_output
+from ldaa.utils.prompt_format import format_analyses, serialization_savings
+from ldaa.utils.logging import log_event, log_error, log_debug
+
+OTHER_CATEGORY = "other"
+EXPECTED_OUTPUT_TOKENS = 1200
+PROMPT_FIELDS = ("segment_id", "category", "confidence", "summary", "pros", "cons", "reasoning")
+PROMPT_MAX_CHARS = 300
+
+CATEGORY_PROMPT_TEMPLATES = [
+    """
+You are a legal document analysis assistant. Compare how two documents treat the topic '{category}'. Consider the summaries, pros, cons, and reasoning for each segment below. Output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities and gaps on this topic - 'similarities': A list of dictionaries, each with 'topic' (str, use '{category}' or a narrower sub-topic) and 'explanation' (str) - 'differences': A list of dictionaries, each with 'topic' (str) and 'explanation' (str) - 'focus_areas': A dictionary with keys 'doc1' and 'doc2' mapping to lists of the aspects of this topic each document focuses on - 'gaps': A list of strings, each describing an element on this topic that one document covers and the other omits, or that both miss. Do NOT return objects in this list. - 'confidence': a score from 0 to 1 - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown section (starting at heading level 3) with the detailed comparison for this topic.\n\nDocument 1 segments on '{category}':\n{doc1_segments}\n\nDocument 2 segments on '{category}':\n{doc2_segments}\n{alignment}\nNow, output the required JSON object.
+""",
+    """
+As a comparative legal analyst, compare the treatment of '{category}' in the two documents below, based on each segment's summary, pros, cons and reasoning. Return only a JSON object with: - 'comparative_summary': short summary for this topic - 'similarities': list of {{'topic', 'explanation'}} - 'differences': list of {{'topic', 'explanation'}} - 'focus_areas': {{'doc1': [...], 'doc2': [...]}} aspects each document emphasizes - 'gaps': list of strings (omissions in either or both documents) - 'confidence': 0-1 - 'reasoning': brief explanation - 'verbose_report': markdown section (level-3 heading) detailing the comparison.\n\nDocument 1 segments on '{category}':\n{doc1_segments}\n\nDocument 2 segments on '{category}':\n{doc2_segments}\n{alignment}
+""",
+]
+
+def group_by_category(doc1_segments, doc2_segments, taxonomy):
+    """Maps category -> (doc1 analyses, doc2 analyses), in taxonomy order, with 'other' last."""
+    groups = {}
+    for doc, segments in (("doc1", doc1_segments), ("doc2", doc2_segments)):
+        for analysis in segments:
+            category = analysis.category if analysis.category in taxonomy else OTHER_CATEGORY
+            groups.setdefault(category, ([], []))[0 if doc == "doc1" else 1].append(analysis)
+    order = {category: i for i, category in enumerate(list(taxonomy) + [OTHER_CATEGORY])}
+    return dict(sorted(groups.items(), key=lambda item: order[item[0]]))
+
+def category_fingerprint(category, doc1_segments, doc2_segments, alignment=""):
+    digest = hashlib.sha256(f"{category}\x00{alignment}".encode("utf-8"))
+    for doc, segments in (("doc1", doc1_segments), ("doc2", doc2_segments)):
+        for analysis in segments:
+            digest.update(f"{doc}\x00{analysis.segment_id}\x00{analysis.summary}\x00{analysis.confidence}\x00".encode("utf-8"))
+    return digest.hexdigest()
+
+async def compare_category(category, doc1_segments, doc2_segments, alignment=""):
+    """Map step: compares one category. Returns a partial result dict with 'success'."""
+    llm = get_llm()
+    seed = variant_seed(category, doc1_segments, doc2_segments)
+    render = lambda d1, d2: get_random_prompt_variant(
+        CATEGORY_PROMPT_TEMPLATES, {"category": category, "doc1_segments": d1, "doc2_segments": d2, "alignment": alignment}, seed=seed
+    )
+    prompt = render(format_analyses(doc1_segments, PROMPT_FIELDS, PROMPT_MAX_CHARS), format_analyses(doc2_segments, PROMPT_FIELDS, PROMPT_MAX_CHARS))
+    serialization = serialization_savings(prompt, render(doc1_segments, doc2_segments))
+    try:
+        response = await invoke_llm(llm, prompt, expected_output_tokens=EXPECTED_OUTPUT_TOKENS)
+        partial = extract_json_from_llm_output(response.content)
+        if not isinstance(partial, dict):
+            raise ValueError(f"Expected a JSON object, got {type(partial).__name__}")
+        partial["success"] = True
+        log_debug("COMPARE", "Category comparison done", category=category, confidence=partial.get("confidence"))
+    except Exception as e:
+        log_error(str(e), context=f"compare_category:{category}")
+        partial = {"success": False, "reasoning": f"LLM comparison failed: {str(e)}"}
+    partial["segments"] = {"doc1": len(doc1_segments), "doc2": len(doc2_segments)}
+    partial["serialization"] = serialization
+    return partial
+
+def _unique(items):
+    seen, unique = set(), []
+    for item in items:
+        key = repr(item)
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+    return unique
+
+def _topic_items(items, category):
+    """Keeps {'topic', 'explanation'} dicts with string values, defaulting the topic to the category."""
+    result = []
+    for item in items or []:
+        if isinstance(item, dict) and item.get("explanation"):
+            result.append({"topic": str(item.get("topic") or category), "explanation": str(item["explanation"])})
+        elif isinstance(item, str) and item:
+            result.append({"topic": category, "explanation": item})
+    return result
+
+def reduce_partials(partials):
+    """
+    Reduce step: merges category partials into one DocumentComparison. Lists are
+    concatenated without duplicates, focus areas are merged per document, and confidence
+    is the segment-weighted mean over the categories that succeeded.
+    """
+    similarities, differences, gaps, summaries, sections = [], [], [], [], []
+    focus_areas = {"doc1": [], "doc2": []}
+    weighted, weights = 0.0, 0
+    status = {}
+    for category, partial in partials.items():
+        status[category] = {
+            "success": partial.get("success", False),
+            "confidence": partial.get("confidence"),
+            "segments": partial.get("segments"),
+            "prompt_tokens": (partial.get("serialization") or {}).get("prompt_tokens"),
+        }
+        if not partial.get("success"):
+            continue
+        similarities += _topic_items(partial.get("similarities"), category)
+        differences += _topic_items(partial.get("differences"), category)
+        gaps += [gap if isinstance(gap, str) else str(gap) for gap in partial.get("gaps") or []]
+        areas = partial.get("focus_areas") if isinstance(partial.get("focus_areas"), dict) else {}
+        for doc in focus_areas:
+            if (partial.get("segments") or {}).get(doc):
+                focus_areas[doc].append(category)
+            focus_areas[doc] += [str(area) for area in areas.get(doc) or []]
+        if partial.get("comparative_summary"):
+            summaries.append(f"{category}: {partial['comparative_summary']}")
+        if partial.get("verbose_report"):
+            sections.append(f"## {category}\n\n{partial['verbose_report']}")
+        weight = sum((partial.get("segments") or {}).values()) or 1
+        weighted += float(partial.get("confidence") or 0.0) * weight
+        weights += weight
+    succeeded = [c for c, s in status.items() if s["success"]]
+    failed = [c for c, s in status.items() if not s["success"]]
+    reasoning = f"Map-reduce comparison over {len(partials)} categories; {len(succeeded)} succeeded"
+    if failed:
+        reasoning += f", failed: {', '.join(failed)}"
+    return DocumentComparison(
+        similarities=_unique(similarities),
+        differences=_unique(differences),
+        focus_areas={doc: _unique(areas) for doc, areas in focus_areas.items()},
+        gaps=_unique(gaps),
+        meta={"mode": "map_reduce", "categories": status},
+        verbose_comparison="\n\n".join(sections),
+        comparative_summary="\n".join(summaries),
+        confidence=round(weighted / weights, 4) if weights else 0.0,
+        reasoning=reasoning + ".",
+        success=bool(succeeded) or not partials,
+    )
+
+def _replace(items, old, new):
+    """`items` without the entries in `old`, followed by the entries of `new` not already kept."""
+    removed = {repr(item) for item in old}
+    return _unique([item for item in items if repr(item) not in removed] + new)
+
+def merge_category_partials(comparison, old_partials, new_partials):
+    """
+    Returns a copy of `comparison` in which the content each category's old partial
+    contributed (similarities, differences, gaps, focus areas, summary line and report
+    section) is replaced by that of its new partial. Everything else, including fields
+    refined since the last reduce, is kept. Failed new partials leave their category as is.
+    """
+    merged = comparison.model_dump()
+    for category, new in new_partials.items():
+        if not new.get("success"):
+            continue
+        old = old_partials.get(category) or {}
+        for key in ("similarities", "differences"):
+            stale = _topic_items(old.get(key), category) + [item for item in merged[key] if item.get("topic") == category]
+            merged[key] = _replace(merged[key], stale, _topic_items(new.get(key), category))
+        as_strings = lambda gaps: [gap if isinstance(gap, str) else str(gap) for gap in gaps or []]
+        merged["gaps"] = _replace(merged["gaps"], as_strings(old.get("gaps")), as_strings(new.get("gaps")))
+        old_areas = old.get("focus_areas") if isinstance(old.get("focus_areas"), dict) else {}
+        new_areas = new.get("focus_areas") if isinstance(new.get("focus_areas"), dict) else {}
+        focus_areas = dict(merged.get("focus_areas") or {})
+        for doc in ("doc1", "doc2"):
+            areas = [category] if (new.get("segments") or {}).get(doc) else []
+            focus_areas[doc] = _replace(
+                focus_areas.get(doc) or [],
+                [str(area) for area in old_areas.get(doc) or []],
+                areas + [str(area) for area in new_areas.get(doc) or []],
+            )
+        merged["focus_areas"] = focus_areas
+        pairs = (
+            ("comparative_summary", "\n", f"{category}: {{}}", "comparative_summary"),
+            ("verbose_comparison", "\n\n", f"## {category}\n\n{{}}", "verbose_report"),
+        )
+        for field, separator, template, key in pairs:
+            text = merged.get(field) or ""
+            old_text = template.format(old[key]) if old.get(key) else None
+            new_text = template.format(new[key]) if new.get(key) else ""
+            if old_text and old_text in text:
+                text = text.replace(old_text, new_text)
+            elif new_text:
+                text = f"{text}{separator}{new_text}" if text else new_text
+            merged[field] = text
+    partials = {**old_partials, **{c: p for c, p in new_partials.items() if p.get("success")}}
+    reduced = reduce_partials(partials)
+    merged["confidence"] = reduced.confidence
+    merged["meta"] = {**(merged.get("meta") or {}), "categories": reduced.meta["categories"]}
+    return DocumentComparison(**merged)
+
+async def recompute_categories(state, categories):
+    """
+    Recomputes the partials of `categories` only (those without accepted segments are
+    skipped) and stores them in `state.comparison_partials`. Returns (old partials of the
+    recomputed categories, new partials, meta log).
+    """
+    config = load_config()
+    groups = group_by_category(state.doc1_accepted_segments, state.doc2_accepted_segments, config.taxonomy)
+    jobs = []
+    for category in categories:
+        if category not in groups:
+            continue
+        doc1_segments, doc2_segments = groups[category]
+        alignment = alignment_prompt_section(
+            state.segment_alignment,
+            {a.segment_id for a in doc1_segments},
+            {a.segment_id for a in doc2_segments},
+        )
+        jobs.append((category, category_fingerprint(category, doc1_segments, doc2_segments, alignment), doc1_segments, doc2_segments, alignment))
+    log_event("COMPARE", "Recomputing deficient categories.", categories=[job[0] for job in jobs])
+    results = await asyncio.gather(*(compare_category(category, d1, d2, alignment) for category, _, d1, d2, alignment in jobs))
+    previous = dict(state.comparison_partials or {})
+    old, new = {}, {}
+    for (category, fingerprint, *_), partial in zip(jobs, results):
+        partial["fingerprint"] = fingerprint
+        old[category] = previous.get(category)
+        new[category] = partial
+        if partial.get("success"):
+            previous[category] = partial
+    state.comparison_partials = {category: previous[category] for category in groups if category in previous}
+    meta = {
+        "success": any(partial.get("success") for partial in results) or not results,
+        "mode": "map_reduce",
+        "recomputed": [category for category, *_ in jobs],
+        "serialization": {
+            key: sum(partial["serialization"][key] for partial in results)
+            for key in ("prompt_tokens", "repr_tokens", "saved_tokens")
+        },
+    }
+    return {c: p for c, p in old.items() if p}, new, meta
+
+async def compare_documents_by_category(state, retry=False):
+    """
+    Runs the map-reduce comparison on the accepted analyses in `state`, reusing stored
+    partials that succeeded with enough confidence on unchanged input. On a `retry` where
+    every partial would be reused, all categories are recomputed instead. Returns
+    (DocumentComparison, meta log) and updates `state.comparison_partials`.
+    """
+    config = load_config()
+    groups = group_by_category(state.doc1_accepted_segments, state.doc2_accepted_segments, config.taxonomy)
+    previous = state.comparison_partials or {}
+    partials, pending, all_jobs = {}, [], []
+    for category, (doc1_segments, doc2_segments) in groups.items():
+        alignment = alignment_prompt_section(
+            state.segment_alignment,
+            {a.segment_id for a in doc1_segments},
+            {a.segment_id for a in doc2_segments},
+        )
+        fingerprint = category_fingerprint(category, doc1_segments, doc2_segments, alignment)
+        stored = previous.get(category)
+        if (
+            stored and stored.get("fingerprint") == fingerprint and stored.get("success")
+            and float(stored.get("confidence") or 0.0) >= config.confidence_threshold
+        ):
+            partials[category] = stored
+        else:
+            pending.append((category, fingerprint, doc1_segments, doc2_segments, alignment))
+        all_jobs.append((category, fingerprint, doc1_segments, doc2_segments, alignment))
+    if retry and not pending:
+        pending, partials = all_jobs, {}
+    log_event("COMPARE", "Comparing by category.", categories=len(groups), pending=len(pending))
+    results = await asyncio.gather(*(compare_category(category, d1, d2, alignment) for category, _, d1, d2, alignment in pending))
+    for (category, fingerprint, *_), partial in zip(pending, results):
+        partial["fingerprint"] = fingerprint
+        partials[category] = partial
+    partials = {category: partials[category] for category in groups}  # Taxonomy order
+    state.comparison_partials = partials
+    comparison = reduce_partials(partials)
+    meta = {
+        "success": comparison.success,
+        "reasoning": comparison.reasoning,
+        "mode": "map_reduce",
+        "categories": len(partials),
+        "recomputed": [category for category, *_ in pending],
+        "serialization": {
+            key: sum(partial["serialization"][key] for partial in results)
+            for key in ("prompt_tokens", "repr_tokens", "saved_tokens")
+        },
+    }
+    return comparison, meta
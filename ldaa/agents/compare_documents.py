@@ -1,10 +1,148 @@
-from ldaa.agents.llm import get_llm
-from ldaa.utils.logging import log_event, log_error
-from ldaa.utils.json import extract_json_from_llm_output
+import os
+import time
+from pathlib import Path
+from langgraph.config import get_stream_writer
+from ldaa.agents.llm import get_llm, invoke_llm, variant_seed, llm_cache_stats, llm_pool_stats
+from ldaa.utils.logging import log_event, log_error, log_debug
+from ldaa.utils.json import extract_json_from_llm_output, IncrementalJSONParser
 from ldaa.schemas import DocumentComparison
 from ldaa.agents.config import load_config
+from ldaa.agents.compare_by_category import compare_documents_by_category
+from ldaa.agents.align_segments import alignment_prompt_section
+from ldaa.agents.refine_comparison import rerun_deficient_parts
 from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.tokens import count_tokens
+from ldaa.utils.prompt_format import format_analyses, serialization_savings, truncate
+from ldaa.utils.usage import tracks_usage
 
+# The comparison returns a long markdown report; used for pre-flight estimates
+EXPECTED_OUTPUT_TOKENS = 4000
+# Characters kept per summary, pro, con and reasoning when the prompt must be trimmed
+TRIMMED_FIELD_CHARS = 120
+# Analysis fields the comparison prompt needs; the quoted source text is referenced by segment id
+PROMPT_FIELDS = ("segment_id", "category", "confidence", "summary", "pros", "cons", "reasoning")
+PROMPT_MAX_CHARS = 300
+
+def shorten_analysis(analysis, max_chars):
+    """Copy of `analysis` with the text fields the comparison prompt renders cut to `max_chars`."""
+    return analysis.model_copy(update={
+        "summary": truncate(analysis.summary, max_chars),
+        "pros": [truncate(item, max_chars) for item in analysis.pros],
+        "cons": [truncate(item, max_chars) for item in analysis.cons],
+        "reasoning": truncate(analysis.reasoning, max_chars),
+    })
+
+def fit_comparison_to_budget(render, doc1_segments, doc2_segments, max_tokens, model=None):
+    """
+    Budget hook for the comparison prompt. While render(doc1, doc2) is over `max_tokens`
+    (counted with the tokenizer of `model`, as invoke_llm does), trims in increasing order
+    of information loss: shorten the summaries, pros, cons and reasoning of every analysis,
+    then leave out the lowest-confidence analyses.
+    Returns (doc1_segments, doc2_segments, steps taken).
+    """
+    steps = []
+    fits = lambda d1, d2: count_tokens(render(d1, d2), model) <= max_tokens
+    if not max_tokens or fits(doc1_segments, doc2_segments):
+        return doc1_segments, doc2_segments, steps
+    doc1_segments = [shorten_analysis(a, TRIMMED_FIELD_CHARS) for a in doc1_segments]
+    doc2_segments = [shorten_analysis(a, TRIMMED_FIELD_CHARS) for a in doc2_segments]
+    steps.append("shortened_analysis_fields")
+    if fits(doc1_segments, doc2_segments):
+        return doc1_segments, doc2_segments, steps
+    # Lowest confidence first; about a tenth of the remaining analyses per round
+    ranked = sorted(
+        (a.confidence, doc, i)
+        for doc, segments in (("doc1", doc1_segments), ("doc2", doc2_segments))
+        for i, a in enumerate(segments)
+    )
+    dropped = set()
+    kept1, kept2 = doc1_segments, doc2_segments
+    while ranked and not fits(kept1, kept2):
+        step = max(1, len(ranked) // 10)
+        dropped.update((doc, i) for _, doc, i in ranked[:step])
+        ranked = ranked[step:]
+        kept1 = [a for i, a in enumerate(doc1_segments) if ("doc1", i) not in dropped]
+        kept2 = [a for i, a in enumerate(doc2_segments) if ("doc2", i) not in dropped]
+    steps.append(f"dropped_{len(dropped)}_low_confidence_analyses")
+    return kept1, kept2, steps
+
+def stream_writer():
+    """LangGraph's custom stream writer, or a no-op when the node runs outside a graph."""
+    try:
+        return get_stream_writer()
+    except RuntimeError:
+        return lambda event: None
+
+def write_report(report_path, text):
+    """Replaces `report_path` with `text` atomically (readers never see a partial report)."""
+    report_path = Path(report_path)
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = report_path.with_name(f".{report_path.name}.{os.getpid()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, report_path)
+
+class ComparisonStream:
+    """
+    Consumes the comparison response while it is generated. Each completed top-level field
+    is emitted as a LangGraph custom stream event {"node", "field", "value"}, so consumers of
+    `compiled_graph.astream(..., stream_mode="custom")` can show it right away. The
+    markdown `verbose_report` is emitted as {"node", "field", "delta"} events and written
+    to a temporary file as it arrives; `close(commit=True)` moves it to `report_path` in one
+    step, so the report there is always a complete one. When the call is retried after
+    throttling, `restart()` discards the partial output and emits {"node", "restart"}.
+    """
+    def __init__(self, report_path):
+        self.writer = stream_writer()
+        self.report_path = Path(report_path)
+        self.report_path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.report_path.with_name(f".{self.report_path.name}.{os.getpid()}.tmp")
+        self.report = open(self.tmp_path, "w", encoding="utf-8")
+        self.started = time.monotonic()
+        self.first_output_s = None
+        self.restarts = 0
+        self._reset()
+
+    def _reset(self):
+        self.parser = IncrementalJSONParser(stream_fields={"verbose_report"})
+        self.fields = []
+
+    def restart(self):
+        self._reset()
+        self.report.seek(0)
+        self.report.truncate()
+        self.restarts += 1
+        self.writer({"node": "compare_documents", "restart": True})
+        log_event("COMPARE", "Comparison stream restarted after a retried call.", restarts=self.restarts)
+
+    def feed(self, text):
+        for kind, key, value in self.parser.feed(text):
+            if self.first_output_s is None:
+                self.first_output_s = round(time.monotonic() - self.started, 3)
+            if kind == "delta":
+                self.report.write(value)
+                self.report.flush()
+                self.writer({"node": "compare_documents", "field": key, "delta": value})
+                continue
+            self.fields.append(key)
+            self.writer({"node": "compare_documents", "field": key, "value": value})
+            log_event("COMPARE", "Comparison field streamed.", field=key)
+
+    def close(self, commit=True):
+        """Publishes the streamed report (or, without `commit`, discards it); returns stream meta."""
+        self.report.close()
+        if commit:
+            os.replace(self.tmp_path, self.report_path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+        return {
+            "fields": self.fields,
+            "first_output_s": self.first_output_s,
+            "total_s": round(time.monotonic() - self.started, 3),
+            "restarts": self.restarts,
+            "report_path": str(self.report_path) if commit else None,
+        }
+
+@tracks_usage("compare_documents")
 async def compare_documents(state, config, store):
     """
     Agentic node: Compares two sets of document segments using an LLM.
@@ -17,39 +155,78 @@ async def compare_documents(state, config, store):
         - meta_log: Comparison meta information (success, errors, etc)
     """
     log_event("COMPARE", "Starting document comparison.")
-    llm = get_llm()
     config = load_config()
+    state.comparison_attempts += 1
+    action = state.comparison_action
+    retry = action is not None and action.action == "retry" and isinstance(state.comparison_result, DocumentComparison)
+    if retry and action.deficient_parts and state.comparison_result.success:
+        # Reflection named the weak parts: regenerate only those and keep the rest
+        state.comparison_result, state.meta['compare'] = await rerun_deficient_parts(state, action, config.comparison.mode)
+        if config.comparison.streaming and state.comparison_result.verbose_comparison:
+            # Keep the report on disk in step with the refined comparison
+            write_report(config.comparison.report_path, state.comparison_result.verbose_comparison)
+        state.meta['llm_cache'] = llm_cache_stats()
+        state.meta['llm_pool'] = llm_pool_stats()
+        return state
+    if config.comparison.mode == "map_reduce":
+        state.comparison_result, state.meta['compare'] = await compare_documents_by_category(state, retry=retry)
+        state.meta['llm_cache'] = llm_cache_stats()
+        state.meta['llm_pool'] = llm_pool_stats()
+        return state
+    llm = get_llm()
     doc1_segments = state.doc1_accepted_segments
     doc2_segments = state.doc2_accepted_segments
     taxonomy = config.taxonomy
     prompt_templates = [
         # 1
         """
-You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n\nNow, output the required JSON object.
+You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n{alignment}\nNow, output the required JSON object.
 """,
         # 2
         """
-As a legal document analysis assistant, compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n\nNow, output the required JSON object.
+As a legal document analysis assistant, compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n{alignment}\nNow, output the required JSON object.
 """,
         # 3
         """
-You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n\nNow, output the required JSON object.
+You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n{alignment}\nNow, output the required JSON object.
 """,
         # 4
         """
-You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n\nNow, output the required JSON object.
+You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n{alignment}\nNow, output the required JSON object.
 """,
         # 5
         """
-You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n\nNow, output the required JSON object.
+You are a legal document analysis assistant. Compare the following two sets of document segments. Consider the summaries, categories, pros, cons, and reasoning for each segment. At the end, output a JSON object with: - 'comparative_summary': a concise summary of the key differences, similarities, focus areas, and gaps between the two documents - 'similarities': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing commonalities. - 'differences': A list of dictionaries, each with 'topic' (str, as per the taxonomy: {taxonomy}) and 'explanation' (str), describing distinctions. - 'focus_areas': A dictionary with two keys identifying each document ('doc1', 'doc2') and mapping to a list of high-level topics (as per the taxonomy: {taxonomy}) that represent the main areas of focus for that document. - 'gaps': A list of strings, each describing an omission or missing element in either document that is present in the other, or important regulatory elements that are missing in both. Do NOT return a list of objects or dicts for this field. - 'confidence': a score from 0 to 1 for your confidence in your comparison - 'reasoning': a short explanation of your reasoning - 'verbose_report': a markdown-formatted, detailed report of your comparative analysis, including per-paragraph summaries, topic tags, pros and cons, a final synthesis highlighting similarities, differences, and gaps, reasoning logs, and a summary table of key contrasts between the two proposals.\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}\n{alignment}\nNow, output the required JSON object.
 """
     ]
-    prompt = get_random_prompt_variant(prompt_templates, {"taxonomy": taxonomy, "doc1_segments": doc1_segments, "doc2_segments": doc2_segments})
+    seed = variant_seed(doc1_segments, doc2_segments)
+    alignment = alignment_prompt_section(state.segment_alignment)
+    # The alignment goes right after the segment blocks, before the output instruction
+    render_with = lambda d1, d2: get_random_prompt_variant(prompt_templates, {"taxonomy": taxonomy, "doc1_segments": d1, "doc2_segments": d2, "alignment": alignment}, seed=seed)
+    render = lambda d1, d2: render_with(format_analyses(d1, PROMPT_FIELDS, PROMPT_MAX_CHARS), format_analyses(d2, PROMPT_FIELDS, PROMPT_MAX_CHARS))
+    doc1_segments, doc2_segments, trim_steps = fit_comparison_to_budget(render, doc1_segments, doc2_segments, config.budget.max_prompt_tokens, config.model)
+    prompt = render(doc1_segments, doc2_segments)
+    budget_meta = {"trimmed": trim_steps, **serialization_savings(prompt, render_with(doc1_segments, doc2_segments))}
+    if trim_steps:
+        log_event("COMPARE", "Comparison prompt trimmed to fit the token budget.", **budget_meta)
+    stream, stream_meta = None, None
     try:
-        print("[DEBUG] Prompt sent to LLM:\n", prompt)
-        response = await llm.ainvoke(prompt)
+        log_debug("COMPARE", "Prompt sent to LLM", num_chars=len(prompt), prompt=prompt)
+        if config.comparison.streaming:
+            stream = ComparisonStream(config.comparison.report_path)
+        completed = False
+        try:
+            response = await invoke_llm(
+                llm, prompt, expected_output_tokens=EXPECTED_OUTPUT_TOKENS,
+                on_chunk=stream.feed if stream else None,
+                on_retry=stream.restart if stream else None,
+            )
+            completed = True
+        finally:
+            if stream:
+                stream_meta = stream.close(commit=completed)
         content = getattr(response, 'content', None)
-        print("[DEBUG] Raw LLM response content:\n", repr(content))
+        log_debug("COMPARE", "Raw LLM response", content=content)
         if not content or not isinstance(content, str):
             raise ValueError(f"LLM returned empty or non-string content: {repr(content)}")
         comparison = extract_json_from_llm_output(content)
@@ -86,7 +263,6 @@ You are a legal document analysis assistant. Compare the following two sets of d
             meta = {"success": False, "reasoning": f"LLM comparison failed: {str(e)}"}
     except Exception as e:
         log_error(str(e), context="compare_documents")
-        print("[ERROR] Exception during LLM comparison:", str(e))
         comparison = DocumentComparison(
             similarities=[],
             differences=[],
@@ -101,5 +277,10 @@ You are a legal document analysis assistant. Compare the following two sets of d
         )
         meta = {"success": False, "reasoning": f"LLM comparison failed: {str(e)}"}
     state.comparison_result = comparison
+    meta["budget"] = budget_meta
+    if stream_meta:
+        meta["stream"] = stream_meta
     state.meta['compare'] = meta
+    state.meta['llm_cache'] = llm_cache_stats()
+    state.meta['llm_pool'] = llm_pool_stats()
     return state 
\ No newline at end of file
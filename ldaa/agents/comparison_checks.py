@@ -0,0 +1,90 @@
+"""
+Local structural and coverage checks for comparison reflection.
+
+Many problems of a DocumentComparison can be measured without an LLM: a failed comparison,
+empty similarity and difference lists, focus areas missing a document, no verbose report,
+topics outside the taxonomy, or accepted-segment categories the comparison never mentions.
+`check_comparison` computes these metrics and a verdict:
+    - "retry"  when a structural defect or very low category coverage is certain; the
+               deficient parts are named so compare_documents only redoes those
+    - "accept" when nothing is wrong and confidence is above the threshold
+    - None     for borderline cases, which go to the LLM together with the metrics
+"""
+from ldaa.agents.refine_comparison import CATEGORY_PREFIX
+
+DOCS = ("doc1", "doc2")
+
+def _field(obj, name, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+def _topics(items):
+    return [str(item.get("topic") or "").strip() for item in items or [] if isinstance(item, dict)]
+
+def comparison_metrics(comparison, doc1_segments, doc2_segments, taxonomy):
+    """Coverage and consistency metrics of `comparison` against the accepted analyses."""
+    similarities = _field(comparison, "similarities") or []
+    differences = _field(comparison, "differences") or []
+    focus_areas = _field(comparison, "focus_areas") or {}
+    if not isinstance(focus_areas, dict):
+        focus_areas = {}
+    topics = _topics(similarities) + _topics(differences)
+    mentioned = set(topics) | {str(area).strip() for areas in focus_areas.values() for area in areas or []}
+    segment_categories = sorted(
+        {a.category for a in list(doc1_segments) + list(doc2_segments) if a.category in taxonomy}
+    )
+    uncovered = [category for category in segment_categories if category not in mentioned]
+    off_taxonomy = sorted({topic for topic in topics if topic and topic not in taxonomy})
+    return {
+        "success": _field(comparison, "success", False) is not False and comparison is not None,
+        "similarities": len(similarities),
+        "differences": len(differences),
+        "gaps": len(_field(comparison, "gaps") or []),
+        "focus_areas_missing": [doc for doc in DOCS if not focus_areas.get(doc)],
+        "has_verbose_report": bool(str(_field(comparison, "verbose_comparison") or "").strip()),
+        "off_taxonomy_topics": off_taxonomy,
+        "segment_categories": len(segment_categories),
+        "uncovered_categories": uncovered,
+        "category_coverage": round(1 - len(uncovered) / len(segment_categories), 4) if segment_categories else 1.0,
+        "confidence": float(_field(comparison, "confidence", 0.0) or 0.0),
+    }
+
+def check_comparison(comparison, doc1_segments, doc2_segments, taxonomy, threshold, min_coverage):
+    """
+    Returns (verdict, deficient parts, issues, metrics). The verdict is 'retry', 'accept'
+    or None (borderline: let the LLM decide, with the metrics).
+    """
+    metrics = comparison_metrics(comparison, doc1_segments, doc2_segments, taxonomy)
+    if not metrics["success"]:
+        return "retry", [], ["the comparison failed"], metrics
+    issues, parts = [], []
+    if not metrics["similarities"] and not metrics["differences"]:
+        issues.append("no similarities or differences")
+        parts += ["similarities", "differences"]
+    if metrics["focus_areas_missing"]:
+        issues.append(f"focus_areas missing {', '.join(metrics['focus_areas_missing'])}")
+        parts.append("focus_areas")
+    if not metrics["has_verbose_report"]:
+        issues.append("no verbose report")
+        parts.append("verbose_report")
+    if metrics["category_coverage"] < min_coverage:
+        issues.append(f"category coverage {metrics['category_coverage']} below {min_coverage}")
+        parts += [CATEGORY_PREFIX + category for category in metrics["uncovered_categories"]]
+    if issues:
+        return "retry", parts, issues, metrics
+    # Softer problems are left to the LLM
+    if metrics["uncovered_categories"]:
+        issues.append(f"categories never mentioned: {', '.join(metrics['uncovered_categories'])}")
+    if metrics["off_taxonomy_topics"]:
+        issues.append(f"topics outside the taxonomy: {', '.join(metrics['off_taxonomy_topics'])}")
+    if not issues and metrics["confidence"] > threshold:
+        return "accept", [], [], metrics
+    return None, [], issues, metrics
+
+def metrics_prompt_section(metrics, issues):
+    """Renders the metrics for the LLM in borderline cases."""
+    lines = ["", "Local checks (computed from the comparison and the accepted segment analyses):"]
+    lines += [f"- {name}: {value}" for name, value in metrics.items()]
+    lines.append(f"- issues: {'; '.join(issues) or 'none'}")
+    return "\n".join(lines) + "\n"
@@ -1,16 +1,157 @@
+import os
+import threading
 import yaml
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List, Literal, Optional, Tuple
 from pathlib import Path
 
+class IngestConfig(BaseModel):
+    parallel: bool = True  # Extract pages in a process pool, off the event loop
+    max_workers: Optional[int] = Field(None, ge=1)  # Defaults to os.cpu_count()
+    pages_per_task: int = Field(8, ge=1)  # Pages handed to each worker task
+    cache_enabled: bool = True  # Reuse extracted text for PDFs with identical bytes
+    cache_dir: Optional[str] = None  # Defaults to <LDAA_CACHE_DIR>/ingest
+    cache_max_bytes: int = Field(256 * 1024 * 1024, ge=0)  # LRU-evicted above this size
+
+class SegmentationConfig(BaseModel):
+    output: Literal["boundaries", "full_text"] = "boundaries"  # boundaries: LLM returns anchors, text is sliced locally
+    strategy: Literal["llm", "hybrid"] = "hybrid"  # hybrid: rule-based pre-segmentation, LLM for the rest
+    min_articles: int = Field(3, ge=1)  # Fewer detected articles means the layout is not trusted
+    fallback_min_chars: int = Field(400, ge=0)  # Shorter unclassified regions are kept as-is
+    window_tokens: int = Field(6000, ge=100)  # Larger texts are segmented in overlapping windows
+    overlap_tokens: int = Field(400, ge=0)  # Tokens shared by consecutive windows
+    max_concurrent_windows: int = Field(4, ge=1)
+    streaming: bool = False  # Segment page batches while later pages are still being extracted
+    stream_pages_per_batch: int = Field(10, ge=1)  # Pages per segmentation call in streaming mode
+
+class SchedulerConfig(BaseModel):
+    max_concurrency: int = Field(8, ge=1)  # Upper bound on in-flight per-segment LLM calls
+    requests_per_minute: Optional[int] = Field(500, ge=1)  # None disables the request bucket
+    tokens_per_minute: Optional[int] = Field(200000, ge=1)  # None disables the token bucket
+    max_retries: int = Field(5, ge=0)  # Retries for throttled (HTTP 429) calls
+    base_backoff: float = Field(1.0, ge=0.0)  # Seconds; doubled on every retry
+
+class BatchingConfig(BaseModel):
+    enabled: bool = True  # Pack several segments into one analysis / reflection prompt
+    max_batch_tokens: int = Field(3000, ge=1)  # Budget for the packed segment content of one prompt
+    max_batch_size: int = Field(10, ge=1)  # Segments per prompt
+
+class LLMCacheConfig(BaseModel):
+    enabled: bool = True  # Reuse LLM responses for identical (model, prompt, params)
+    path: Optional[str] = None  # SQLite file; defaults to <LDAA_CACHE_DIR>/llm.sqlite
+    ttl_seconds: Optional[float] = Field(7 * 24 * 3600, gt=0)  # None keeps entries until evicted by size
+    max_entries: int = Field(50000, ge=1)  # Least recently used entries are evicted above this
+    seed_variants: bool = True  # Pick prompt variants from a content hash instead of at random
+
+class PipelineConfig(BaseModel):
+    fused_analyze_reflect: bool = False  # Reflect on each segment (or batch) as soon as its analysis is done
+
+class ReflectionConfig(BaseModel):
+    local_rules: bool = True  # Decide clear-cut segment reflections locally, without an LLM call
+    local_comparison_checks: bool = True  # Decide clear-cut comparison reflections from local coverage metrics
+    min_category_coverage: float = Field(0.5, ge=0.0, le=1.0)  # Share of accepted-segment categories the comparison must mention
+
+class LLMPoolConfig(BaseModel):
+    max_connections: int = Field(100, ge=1)  # Per pooled client, across all hosts
+    max_keepalive_connections: int = Field(20, ge=0)  # Idle connections kept open for reuse
+    keepalive_expiry: float = Field(30.0, ge=0.0)  # Seconds an idle connection is kept
+    timeout: float = Field(120.0, gt=0.0)  # Per-request timeout in seconds
+
+class DedupConfig(BaseModel):
+    enabled: bool = True  # Analyze identical / near-identical segments once and share the result
+    near_duplicates: bool = True  # MinHash near-duplicate matching on top of exact content hashes
+    shingle_size: int = Field(5, ge=1)  # Words per shingle
+    num_perm: int = Field(64, ge=8)  # MinHash signature length
+    bands: int = Field(16, ge=1)  # LSH bands; more bands find less similar candidates
+    threshold: float = Field(0.85, ge=0.0, le=1.0)  # Minimum estimated Jaccard similarity
+
+class BudgetConfig(BaseModel):
+    max_prompt_tokens: Optional[int] = Field(100000, ge=1)  # Per call; larger prompts are trimmed or rejected
+    max_run_tokens: Optional[int] = Field(3000000, ge=1)  # Input + output tokens per run; None = unlimited
+    expected_output_tokens: int = Field(800, ge=0)  # Pre-flight estimate when a call does not state its own
+    input_cost_per_1m: float = Field(2.5, ge=0.0)  # USD per million input tokens
+    output_cost_per_1m: float = Field(10.0, ge=0.0)  # USD per million output tokens
+    output_tokens_per_second: float = Field(60.0, gt=0.0)  # Generation speed for latency estimates
+    base_latency_s: float = Field(0.5, ge=0.0)  # Fixed per-call overhead for latency estimates
+
+class ComparisonConfig(BaseModel):
+    mode: Literal["single", "map_reduce"] = "single"  # map_reduce: one call per taxonomy category, merged locally
+    streaming: bool = False  # Single mode: emit fields as they are generated and write the report while it streams
+    report_path: str = "output/verbose_comparison.md"  # Where the streamed verbose report is written
+
+class AlignmentConfig(BaseModel):
+    enabled: bool = True  # Align accepted segments across documents before comparing them (embedder: `embeddings`)
+    method: Literal["hungarian", "greedy", "many_to_one"] = "hungarian"
+    threshold: Optional[float] = Field(None, ge=-1.0, le=1.0)  # Minimum cosine similarity for a pair; None = embedder default
+    max_chars: int = Field(2000, ge=0)  # Segment text embedded per analysis, after its summary
+
+class EmbeddingsConfig(BaseModel):
+    backend: Literal["hashing", "openai"] = "hashing"  # hashing: local scikit-learn HashingVectorizer, no network
+    model: str = "text-embedding-3-small"  # openai backend
+    dimensions: int = Field(1024, ge=8)  # hashing backend: vector size
+    analyzer: Literal["word", "char_wb"] = "word"  # hashing backend: word or character n-grams
+    ngram_range: Tuple[int, int] = (1, 2)  # hashing backend
+    batch_size: int = Field(512, ge=1)  # Texts encoded (or sent) per batch
+
+class VectorStoreConfig(BaseModel):
+    path: str = "vector_db"  # Corpus index directory, shared by all runs
+    chunk_size: int = Field(500, ge=1)  # Characters per chunk
+    chunk_overlap: int = Field(50, ge=0)
+    compact_ratio: float = Field(0.25, gt=0.0, le=1.0)  # Share of tombstoned vectors that triggers compaction
+    keep_generations: int = Field(2, ge=1)  # Saved index generations kept on disk
+
+class AnalysisStoreConfig(BaseModel):
+    enabled: bool = True  # Append each run's analyses and actions to the columnar store
+    path: Optional[str] = None  # Store directory; defaults to <LDAA_CACHE_DIR>/analysis_store
+    hotspot_threshold: float = Field(0.5, ge=0.0, le=1.0)  # Confidence below which a segment counts towards a hotspot
+
 class Config(BaseModel):
     model: str
     confidence_threshold: float = Field(..., ge=0.0, le=1.0)
     taxonomy: List[str]
     output_format: str = "json"
+    max_segment_attempts: int = Field(3, ge=1)  # Analyses per segment before a 'retry' becomes 'mark_review'
+    max_comparison_attempts: int = Field(3, ge=1)  # Comparisons before a 'retry'/'reboot' becomes 'mark_review'
+    ingest: IngestConfig = Field(default_factory=IngestConfig)
+    segmentation: SegmentationConfig = Field(default_factory=SegmentationConfig)
+    scheduler: SchedulerConfig = Field(default_factory=SchedulerConfig)
+    batching: BatchingConfig = Field(default_factory=BatchingConfig)
+    llm_cache: LLMCacheConfig = Field(default_factory=LLMCacheConfig)
+    pipeline: PipelineConfig = Field(default_factory=PipelineConfig)
+    reflection: ReflectionConfig = Field(default_factory=ReflectionConfig)
+    llm_pool: LLMPoolConfig = Field(default_factory=LLMPoolConfig)
+    dedup: DedupConfig = Field(default_factory=DedupConfig)
+    budget: BudgetConfig = Field(default_factory=BudgetConfig)
+    comparison: ComparisonConfig = Field(default_factory=ComparisonConfig)
+    alignment: AlignmentConfig = Field(default_factory=AlignmentConfig)
+    embeddings: EmbeddingsConfig = Field(default_factory=EmbeddingsConfig)
+    vector_store: VectorStoreConfig = Field(default_factory=VectorStoreConfig)
+    analysis_store: AnalysisStoreConfig = Field(default_factory=AnalysisStoreConfig)
+
+# Parsed configs by path, with the mtime they were read at
+_config_cache: Dict[str, Tuple[int, Config]] = {}
+_config_lock = threading.Lock()
+config_stats = {"loads": 0, "hits": 0}
 
 def load_config(path: str = None) -> Config:
+    """
+    Returns the parsed configuration. The result is cached per file and only re-read when
+    the file's mtime changes, so it is cheap to call from every node and LLM call. The
+    returned object is shared: copy it (`model_copy(deep=True)`) before modifying it.
+    """
     config_path = Path(path) if path else Path(__file__).parent / "config.yaml"
+    key = str(config_path.resolve())
+    mtime = os.stat(key).st_mtime_ns
+    with _config_lock:
+        cached = _config_cache.get(key)
+        if cached and cached[0] == mtime:
+            config_stats["hits"] += 1
+            return cached[1]
     with open(config_path, "r") as f:
         data = yaml.safe_load(f)
-    return Config(**data) 
\ No newline at end of file
+    config = Config(**data)
+    with _config_lock:
+        _config_cache[key] = (mtime, config)
+        config_stats["loads"] += 1
+    return config
+
@@ -1,9 +1,28 @@
-from ldaa.agents.llm import get_llm
+from ldaa.agents.llm import get_llm, invoke_llm, variant_seed, llm_cache_stats
+from ldaa.utils.usage import tracks_usage
+from ldaa.agents.config import load_config
+from ldaa.agents.structural_segmentation import presegment
 import asyncio
-from ldaa.utils.logging import log_event, log_error
+import re
+from ldaa.utils.logging import log_event, log_error, log_debug
 from ldaa.utils.json import extract_json_from_llm_output
 from ldaa.schemas import DocumentSegment
 from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.tokens import count_tokens
+
+# Boundary-only prompts: the model returns where each segment starts instead of echoing
+# its text, and the segment text is sliced locally from the document (see enrich_segments).
+BOUNDARY_PROMPT_TEMPLATES = [
+    """
+You are a legal document analysis assistant. Segment the following document into logical sections or paragraphs. Do NOT copy the segment text. For each segment, in document order, return a JSON object with: - 'title': a short title or heading for the segment (or empty if not available) - 'start_anchor': the first 8 to 12 words of the segment, copied exactly as they appear in the document - 'segment_type': the type of segment (choose one of: 'paragraph', 'article', 'section') based on document layout, coherence, and analytical granularity - 'reasoning': a short explanation of your reasoning. Return ONLY a JSON list of segments. Do not include any explanatory text, markdown, or code block formatting.\n\nExample output: [ {{ "title": "TITLE I: GENERAL PROVISIONS - Chapter 1: Definitions and Scope", "start_anchor": "Artículo 1.- La presente Ley es de orden público", "segment_type": "article", "reasoning": "..." }}, ... ]\n\nDocument ({doc_label}):\n{text}
+""",
+    """
+As a legal document segmentation expert, divide the following document into logical sections or paragraphs without repeating their text. For each segment, in order, provide a JSON object with: - 'title': a short heading (or empty) - 'start_anchor': the segment's first 8-12 words, verbatim - 'segment_type': one of 'paragraph', 'article', or 'section' - 'reasoning': a brief explanation for the segmentation. Output ONLY a JSON list of segments, no extra text or markdown.\n\nDocument ({doc_label}):\n{text}
+""",
+    """
+Segment the document below into logical units, in order. For each segment, output a JSON object with: - 'title': heading or empty - 'start_anchor': the first 8-12 words of the segment exactly as written (do not include the rest of the text) - 'segment_type': 'paragraph', 'article', or 'section' - 'reasoning': short explanation. Return a JSON list of segments only, no markdown or extra commentary.\n\nDocument ({doc_label}):\n{text}
+""",
+]
 
 async def segment_with_llm(text, doc_label="doc"):
     llm = get_llm()
@@ -24,9 +43,16 @@ You are tasked with segmenting the following legal document. Each segment must b
 Act as a legal text segmenter. Divide the document below into logical sections or paragraphs. For each, return a JSON object: - 'title': heading or empty - 'text': full text - 'segment_type': 'paragraph', 'article', or 'section' - 'reasoning': short explanation. Output only a JSON list of segments, no markdown or commentary.\n\nDocument ({doc_label}):\n{text}
 """
     ]
-    prompt = get_random_prompt_variant(prompt_templates, {"doc_label": doc_label, "text": text})
+    settings = load_config()
+    # Full-text output echoes the document; boundaries are short anchors, so the
+    # configured per-call estimate (budget.expected_output_tokens) applies
+    expected_output_tokens = count_tokens(text, settings.model)
+    if settings.segmentation.output == "boundaries":
+        prompt_templates = BOUNDARY_PROMPT_TEMPLATES
+        expected_output_tokens = None
+    prompt = get_random_prompt_variant(prompt_templates, {"doc_label": doc_label, "text": text}, seed=variant_seed(text))
     try:
-        response = await llm.ainvoke(prompt)
+        response = await invoke_llm(llm, prompt, expected_output_tokens=expected_output_tokens)
         segments = extract_json_from_llm_output(response.content)
         meta = {
             "num_segments": len(segments),
@@ -45,7 +71,192 @@ Act as a legal text segmenter. Divide the document below into logical sections o
         raise
     return segments, meta
 
-def enrich_segments(segments, document_id):
+def split_into_windows(text, window_tokens, overlap_tokens, model=None):
+    """
+    Splits text into overlapping windows on line boundaries. Each window holds at most
+    `window_tokens` tokens (unless a single line is longer) and starts with roughly
+    `overlap_tokens` tokens of the previous window. Returns a list of (start, end) offsets.
+    """
+    lines, offset = [], 0
+    for line in text.splitlines(keepends=True):
+        lines.append((offset, offset + len(line), count_tokens(line, model)))
+        offset += len(line)
+    windows = []
+    first = 0
+    while first < len(lines):
+        last, tokens = first, lines[first][2]
+        while last + 1 < len(lines) and tokens + lines[last + 1][2] <= window_tokens:
+            last += 1
+            tokens += lines[last][2]
+        windows.append((lines[first][0], lines[last][1]))
+        if last + 1 >= len(lines):
+            break
+        # Step back over trailing lines to build the overlap, always making progress
+        next_first, overlap = last + 1, 0
+        while next_first - 1 > first and overlap + lines[next_first - 1][2] <= overlap_tokens:
+            next_first -= 1
+            overlap += lines[next_first][2]
+        first = next_first
+    return windows
+
+def locate_span(text, snippet, start=0, end=None, anchor_words=12):
+    """
+    Finds where `snippet` (text echoed back by the LLM) occurs in text[start:end].
+    Tries an exact match first, then a whitespace-insensitive match of its first
+    `anchor_words` words. Returns (span_start, span_end) or None.
+    """
+    end = len(text) if end is None else end
+    snippet = (snippet or "").strip()
+    if not snippet:
+        return None
+    position = text.find(snippet, start, end)
+    if position != -1:
+        return position, position + len(snippet)
+    words = snippet.split()[:anchor_words]
+    match = re.compile(r"\s+".join(map(re.escape, words))).search(text, start, end)
+    if match is None:
+        return None
+    return match.start(), min(match.start() + len(snippet), end)
+
+def reconcile_window_segments(text, windows, window_segments):
+    """
+    Merges per-window segment lists into one list with no duplicates or gaps. Every window
+    owns the part of the document up to the middle of its overlaps; a segment is kept only
+    by the window that owns its start, and each kept segment extends to the start of the
+    next one, so segments cut off at a window edge are completed by the neighbouring window.
+    """
+    starts = {}
+    for index, ((window_start, window_end), segments) in enumerate(zip(windows, window_segments)):
+        own_start = 0 if index == 0 else (window_start + windows[index - 1][1]) // 2
+        own_end = len(text) if index == len(windows) - 1 else (windows[index + 1][0] + window_end) // 2
+        cursor = window_start
+        for seg in segments:
+            span = locate_span(text, seg.get("text") or seg.get("start_anchor"), cursor, window_end)
+            if span is None:
+                continue
+            cursor = span[0]
+            if own_start <= span[0] < own_end:
+                starts.setdefault(span[0], seg)
+    ordered = sorted(starts.items())
+    if ordered:
+        ordered[0] = (0, ordered[0][1])  # Leading text belongs to the first segment
+    reconciled = []
+    for i, (start, seg) in enumerate(ordered):
+        end = ordered[i + 1][0] if i + 1 < len(ordered) else len(text)
+        segment_text = text[start:end].strip()
+        if segment_text:
+            reconciled.append({**seg, "text": segment_text})
+    return reconciled
+
+async def segment_with_llm_windowed(text, doc_label="doc"):
+    """
+    Segments a text that is too large for a single call: the text is split into overlapping
+    token windows, the windows are segmented concurrently and the results reconciled.
+    Returns (segments, meta) like segment_with_llm.
+    """
+    settings = load_config()
+    windows = split_into_windows(text, settings.segmentation.window_tokens, settings.segmentation.overlap_tokens, settings.model)
+    semaphore = asyncio.Semaphore(settings.segmentation.max_concurrent_windows)
+    async def segment_window(window):
+        async with semaphore:
+            segments, _ = await segment_with_llm(text[window[0]:window[1]], doc_label=doc_label)
+            return segments
+    window_segments = await asyncio.gather(*(segment_window(window) for window in windows))
+    segments = reconcile_window_segments(text, windows, window_segments)
+    meta = {
+        "num_segments": len(segments),
+        "success": True,
+        "reasoning": [seg.get("reasoning") or "" for seg in segments],
+        "windows": len(windows),
+    }
+    log_event("SEGMENTATION", f"Windowed segmentation over {len(windows)} windows.")
+    return segments, meta
+
+async def segment_text_with_llm(text, doc_label="doc"):
+    """Segments text with the LLM, switching to windowed mode when it exceeds one window."""
+    settings = load_config()
+    if count_tokens(text, settings.model) > settings.segmentation.window_tokens:
+        return await segment_with_llm_windowed(text, doc_label=doc_label)
+    return await segment_with_llm(text, doc_label=doc_label)
+
+async def segment_document(text, doc_label="doc"):
+    """
+    Segments a document with the configured strategy. In "hybrid" mode the structural
+    pre-segmenter classifies articles directly and only the regions it cannot classify
+    are sent to the LLM (concurrently). Returns (segments, meta) like segment_with_llm.
+    """
+    settings = load_config().segmentation
+    if settings.strategy == "llm":
+        return await segment_text_with_llm(text, doc_label=doc_label)
+    pieces = presegment(text, min_articles=settings.min_articles, fallback_min_chars=settings.fallback_min_chars)
+    llm_pieces = [piece for piece in pieces if piece["kind"] == "llm"]
+    llm_results = iter(await asyncio.gather(*(segment_text_with_llm(piece["text"], doc_label=doc_label) for piece in llm_pieces)))
+    segments = []
+    for piece in pieces:
+        if piece["kind"] == "llm":
+            segments.extend(next(llm_results)[0])
+        else:
+            segments.append({k: piece[k] for k in ("title", "text", "segment_type", "reasoning")})
+    meta = {
+        "num_segments": len(segments),
+        "success": True,
+        "reasoning": [seg.get("reasoning") or "" for seg in segments],
+        "strategy": "hybrid",
+        "rule_segments": len(pieces) - len(llm_pieces),
+        "llm_regions": len(llm_pieces),
+    }
+    log_event("SEGMENTATION", f"Hybrid segmentation: {meta['rule_segments']} rule-based segments, {meta['llm_regions']} LLM regions.")
+    return segments, meta
+
+def snap_segment_start(doc_text, seg, cursor=0):
+    """
+    Validates a segment boundary returned by the LLM and snaps it to an exact offset in
+    doc_text at or after `cursor`. Uses the segment text if present, otherwise its
+    `start_anchor`, retrying with a shorter anchor, and finally a `start` character offset
+    if the model supplied one. Returns the offset or None if it cannot be placed.
+    """
+    snippet = seg.get("text") or seg.get("start_anchor")
+    for anchor_words in (12, 5):
+        span = locate_span(doc_text, snippet, cursor, anchor_words=anchor_words)
+        if span is not None:
+            return span[0]
+    offset = seg.get("start")
+    if isinstance(offset, int) and cursor <= offset < len(doc_text):
+        return offset
+    return None
+
+def resolve_segment_boundaries(doc_text, segments):
+    """
+    Turns boundary-only segments into full segments by slicing doc_text: each segment runs
+    from its snapped start to the next segment's start, so the result covers the document
+    without gaps or overlaps. Segments whose boundary cannot be placed are merged into the
+    preceding one.
+    """
+    starts, cursor = [], 0
+    for seg in segments:
+        start = snap_segment_start(doc_text, seg, cursor)
+        if start is None:
+            log_event("SEGMENTATION", f"Could not place segment boundary: {seg.get('title') or seg.get('start_anchor')!r}")
+            continue
+        starts.append((start, seg))
+        cursor = start + 1
+    if starts:
+        starts[0] = (0, starts[0][1])  # Leading text belongs to the first segment
+    resolved = []
+    for i, (start, seg) in enumerate(starts):
+        end = starts[i + 1][0] if i + 1 < len(starts) else len(doc_text)
+        segment_text = doc_text[start:end].strip()
+        if segment_text:
+            resolved.append({**seg, "text": segment_text})
+    return resolved
+
+def enrich_segments(segments, document_id, doc_text=None):
+    """
+    Builds DocumentSegments. When some segments only carry boundaries (no 'text') and
+    doc_text is given, the text is sliced locally from doc_text.
+    """
+    if doc_text and any(not seg.get("text") for seg in segments):
+        segments = resolve_segment_boundaries(doc_text, segments)
     return [
         DocumentSegment(
             id=f"{document_id}_seg_{i}",
@@ -53,28 +264,29 @@ def enrich_segments(segments, document_id):
             document_id=document_id,
             segment_type=seg.get("segment_type", "section"),
             position=i,
-            reasoning=seg.get("reasoning")
+            reasoning=seg.get("reasoning"),
+            title=seg.get("title") or None,
         )
         for i, seg in enumerate(segments)
     ]
 
+@tracks_usage("decide_segmentation")
 async def decide_segmentation(state, config, store):
     """
-    Agentic node: Uses an LLM to segment each document into logical sections/paragraphs.
+    Agentic node: Segments each document into logical sections/paragraphs, using structural
+    rules where the layout allows and an LLM for everything else.
     Updates the state in-place and returns it, as required by LangGraph node conventions.
     """
     log_event("SEGMENTATION", "Starting segmentation.")
     doc1_text = state.doc1_text
     doc2_text = state.doc2_text
-    print("[DEBUG] Segmentation input doc1_text:", repr(doc1_text[:500]) if doc1_text else "None")
-    print("[DEBUG] Segmentation input doc2_text:", repr(doc2_text[:500]) if doc2_text else "None")
-    doc1_segments_raw, meta1 = await segment_with_llm(doc1_text, doc_label="doc1") if doc1_text else ([], {"success": False, "reasoning": "No text provided"})
-    doc2_segments_raw, meta2 = await segment_with_llm(doc2_text, doc_label="doc2") if doc2_text else ([], {"success": False, "reasoning": "No text provided"})
+    log_debug("SEGMENTATION", "Segmentation input", doc1_text=doc1_text, doc2_text=doc2_text)
+    doc1_segments_raw, meta1 = await segment_document(doc1_text, doc_label="doc1") if doc1_text else ([], {"success": False, "reasoning": "No text provided"})
+    doc2_segments_raw, meta2 = await segment_document(doc2_text, doc_label="doc2") if doc2_text else ([], {"success": False, "reasoning": "No text provided"})
     # Enrich with required fields
-    doc1_segments = enrich_segments(doc1_segments_raw, "doc1")
-    doc2_segments = enrich_segments(doc2_segments_raw, "doc2")
-    print("[DEBUG] Segmentation output doc1_segments:", repr(doc1_segments))
-    print("[DEBUG] Segmentation output doc2_segments:", repr(doc2_segments))
+    doc1_segments = enrich_segments(doc1_segments_raw, "doc1", doc1_text)
+    doc2_segments = enrich_segments(doc2_segments_raw, "doc2", doc2_text)
+    log_debug("SEGMENTATION", "Segmentation output", doc1_segments=lambda: doc1_segments, doc2_segments=lambda: doc2_segments)
     meta_log = {
         "doc1": meta1,
         "doc2": meta2,
@@ -82,5 +294,6 @@ async def decide_segmentation(state, config, store):
     state.doc1_segments = doc1_segments
     state.doc2_segments = doc2_segments
     state.meta['segmentation'] = meta_log
+    state.meta['llm_cache'] = llm_cache_stats()
     log_event("SEGMENTATION", "Segmentation successful.")
     return state 
\ No newline at end of file
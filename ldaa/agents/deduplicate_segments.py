@@ -0,0 +1,36 @@
+from ldaa.agents.config import load_config
+from ldaa.utils.logging import log_event
+from ldaa.utils.minhash import cluster_duplicates
+
+def deduplicate_segments(state, config, store):
+    """
+    Groups identical and near-identical segments across (and within) both documents, e.g.
+    boilerplate definitions or transitory articles copied between bills. Each segment id is
+    mapped to its cluster representative in `state.segment_clusters`; analysis then runs
+    once per cluster and the result is shared with every member.
+    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    """
+    settings = load_config().dedup
+    segments = list(state.doc1_segments) + list(state.doc2_segments)
+    labels = cluster_duplicates(
+        [seg.text for seg in segments],
+        near=settings.near_duplicates,
+        shingle_size=settings.shingle_size,
+        num_perm=settings.num_perm,
+        bands=settings.bands,
+        threshold=settings.threshold,
+    )
+    state.segment_clusters = {seg.id: segments[label].id for seg, label in zip(segments, labels)}
+    representatives = set(labels)
+    cross_document = sum(
+        1 for seg, label in zip(segments, labels) if segments[label].document_id != seg.document_id
+    )
+    meta_log = {
+        "segments": len(segments),
+        "clusters": len(representatives),
+        "duplicates": len(segments) - len(representatives),
+        "cross_document": cross_document,
+    }
+    state.meta['dedup'] = meta_log
+    log_event("DEDUP", "Segment deduplication completed.", **meta_log)
+    return state
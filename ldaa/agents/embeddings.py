@@ -0,0 +1,81 @@
+"""
+Pluggable text embedders for the vector store.
+
+`get_embeddings()` returns the backend selected under `embeddings:` in config.yaml:
+    - "hashing": local and offline. Word (or character) n-grams are hashed into a fixed
+      number of dimensions with scikit-learn's HashingVectorizer and L2-normalized, so
+      nothing is fitted or downloaded and every batch is encoded with one sparse transform.
+    - "openai":  the OpenAI embeddings API (network access, per-token cost).
+Every backend implements the LangChain `Embeddings` interface. `embedding_spec()` describes
+an embedder so an index can record how it was built and be queried with the same one.
+"""
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from sklearn.feature_extraction.text import HashingVectorizer
+from ldaa.agents.config import load_config
+
+class HashingEmbeddings(Embeddings):
+    """Stateless local embeddings: hashed n-gram counts, L2-normalized."""
+    def __init__(self, dimensions: int = 1024, analyzer: str = "word", ngram_range=(1, 2), batch_size: int = 512):
+        self.dimensions = dimensions
+        self.analyzer = analyzer
+        self.ngram_range = tuple(ngram_range)
+        self.batch_size = batch_size
+        self.vectorizer = HashingVectorizer(
+            n_features=dimensions,
+            analyzer=analyzer,
+            ngram_range=self.ngram_range,
+            strip_accents="unicode",
+            lowercase=True,
+            norm="l2",
+            dtype=np.float32,
+        )
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """(len(texts), dimensions) float32 matrix, encoded `batch_size` texts at a time."""
+        if not texts:
+            return np.empty((0, self.dimensions), dtype=np.float32)
+        batches = [
+            self.vectorizer.transform(texts[start:start + self.batch_size]).toarray()
+            for start in range(0, len(texts), self.batch_size)
+        ]
+        return np.vstack(batches)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0].tolist()
+
+def _openai_embeddings(settings):
+    from langchain_openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(model=settings.model, chunk_size=settings.batch_size)
+
+def _hashing_embeddings(settings):
+    return HashingEmbeddings(settings.dimensions, settings.analyzer, settings.ngram_range, settings.batch_size)
+
+EMBEDDING_BACKENDS = {
+    "hashing": _hashing_embeddings,
+    "openai": _openai_embeddings,
+}
+
+def embedding_spec(settings=None) -> Dict:
+    """The settings that determine the vectors of a backend (what an index must match)."""
+    settings = settings or load_config().embeddings
+    if settings.backend == "hashing":
+        return {"backend": "hashing", "dimensions": settings.dimensions, "analyzer": settings.analyzer, "ngram_range": list(settings.ngram_range)}
+    return {"backend": settings.backend, "model": settings.model}
+
+def get_embeddings(settings=None) -> Embeddings:
+    """The configured embedder; `settings` defaults to the `embeddings` config section."""
+    settings = settings or load_config().embeddings
+    if settings.backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embeddings backend '{settings.backend}' (expected one of {', '.join(EMBEDDING_BACKENDS)})")
+    return EMBEDDING_BACKENDS[settings.backend](settings)
+
+def embeddings_from_spec(spec: Dict) -> Embeddings:
+    """Rebuilds the embedder an index was built with from its recorded `embedding_spec`."""
+    settings = load_config().embeddings
+    return get_embeddings(settings.model_copy(update=spec))
@@ -1,10 +1,15 @@
 from typing import TypedDict, List, Dict, Any
 from langgraph.graph import StateGraph, END
-from ldaa.agents.ingest_documents import ingest_documents
+from ldaa.agents.ingest_documents import aingest_documents
 from ldaa.agents.decide_segmentation import decide_segmentation
+from ldaa.agents.deduplicate_segments import deduplicate_segments
+from ldaa.agents.streaming_segmentation import ingest_and_segment
+from ldaa.agents.config import load_config
 from ldaa.agents.analyze_segment import analyze_segment
 from ldaa.agents.self_reflect_segment import self_reflect_segment
+from ldaa.agents.analyze_and_reflect import analyze_and_reflect_segment
 from ldaa.agents.aggregate_results import aggregate_results
+from ldaa.agents.align_segments import align_segments
 from ldaa.agents.compare_documents import compare_documents
 from ldaa.agents.self_reflect_comparison import self_reflect_comparison
 from ldaa.agents.final_audit_export import final_audit_export
@@ -17,7 +22,7 @@ from langgraph.checkpoint.memory import MemorySaver
 def segment_reflection_router(state: LegalAnalysisState):
     """
     Route after self_reflect_segment:
-    - If any segment action is 'retry', go back to analyze_segment
+    - If any segment action is 'retry', go back to analyze_segment (only flagged segments are redone)
     - If any is 'mark_review', escalate (here: continue to aggregate_results)
     - Else, continue to aggregate_results
     """
@@ -32,27 +37,57 @@ def segment_reflection_router(state: LegalAnalysisState):
 def comparison_reflection_router(state: LegalAnalysisState):
     """
     Route after self_reflect_comparison:
-    - If action is 'retry', go back to compare_documents
-    - If action is 'reboot', go back to analyze_segment
-    - If 'mark_review', escalate (here: continue to final_audit_export)
+    - If action is 'retry', go back to compare_documents (only the deficient parts are redone)
+    - If action is 'reboot', go back to analyze_segment (only the flagged segments are redone)
+    - If 'mark_review', escalate to human_in_the_loop_comparison
     - Else, continue to final_audit_export
+    self_reflect_comparison turns 'retry'/'reboot' into 'mark_review' after
+    `max_comparison_attempts` comparisons, so these loops are bounded.
     """
-    actions = getattr(state, "comparison_actions", [])
-    if any(a.action == "retry" for a in actions):
-        return "retry_comparison"
-    if any(a.action == "reboot" for a in actions):
+    action = getattr(state, "comparison_action", None)
+    if action is None:
+        return "final_audit_export"
+    if action.action == "retry":
+        return "compare_documents"
+    if action.action == "reboot":
         return "analyze_segment"
-    elif any(a.action == "mark_review" for a in actions):
+    elif action.action == "mark_review":
         return "human_in_the_loop_comparison"
     return "final_audit_export"
 
 # --- Build the agentic graph ---
 graph = StateGraph(LegalAnalysisState)
+settings = load_config()
+
+# Optional dedup stage between segmentation and analysis
+before_analysis = "analyze_segment"
+if settings.dedup.enabled:
+    graph.add_node("deduplicate_segments", deduplicate_segments)
+    graph.add_edge("deduplicate_segments", "analyze_segment")
+    before_analysis = "deduplicate_segments"
 
-graph.add_node("ingest_documents", ingest_documents)
-graph.add_node("decide_segmentation", decide_segmentation)
-graph.add_node("analyze_segment", analyze_segment)
-graph.add_node("self_reflect_segment", self_reflect_segment)
+if settings.segmentation.streaming:
+    # Streaming mode: one node overlaps PDF extraction with segmentation
+    graph.add_node("ingest_and_segment", ingest_and_segment)
+    graph.add_edge("ingest_and_segment", before_analysis)
+    graph.set_entry_point("ingest_and_segment")
+else:
+    graph.add_node("ingest_documents", aingest_documents)
+    graph.add_node("decide_segmentation", decide_segmentation)
+    graph.add_edge("ingest_documents", "decide_segmentation")
+    graph.add_edge("decide_segmentation", before_analysis)
+    graph.set_entry_point("ingest_documents")
+
+if settings.pipeline.fused_analyze_reflect:
+    # Pipelined mode: each segment is reflected on as soon as its analysis finishes. The node
+    # keeps the "analyze_segment" name so retry and reboot routes still point at it.
+    graph.add_node("analyze_segment", analyze_and_reflect_segment)
+    graph.add_conditional_edges("analyze_segment", segment_reflection_router)
+else:
+    graph.add_node("analyze_segment", analyze_segment)
+    graph.add_node("self_reflect_segment", self_reflect_segment)
+    graph.add_edge("analyze_segment", "self_reflect_segment")
+    graph.add_conditional_edges("self_reflect_segment", segment_reflection_router)
 graph.add_node("aggregate_results", aggregate_results)
 graph.add_node("compare_documents", compare_documents)
 graph.add_node("self_reflect_comparison", self_reflect_comparison)
@@ -61,22 +96,23 @@ graph.add_node("human_in_the_loop_segment", human_in_the_loop)
 graph.add_node("human_in_the_loop_comparison", human_in_the_loop)
 graph.add_node("save_segments_to_faiss", save_segments_to_faiss)
 
+# Optional alignment stage between aggregation and comparison
+after_aggregation = "compare_documents"
+if settings.alignment.enabled:
+    graph.add_node("align_segments", align_segments)
+    graph.add_edge("align_segments", "compare_documents")
+    after_aggregation = "align_segments"
+
 # Edges for agentic flow
-graph.add_edge("ingest_documents", "decide_segmentation")
-graph.add_edge("decide_segmentation", "analyze_segment")
-graph.add_edge("analyze_segment", "self_reflect_segment")
-graph.add_conditional_edges("self_reflect_segment", segment_reflection_router)
-graph.add_edge("aggregate_results", "compare_documents")
+graph.add_edge("aggregate_results", after_aggregation)
 graph.add_edge("compare_documents", "self_reflect_comparison")
 graph.add_conditional_edges("self_reflect_comparison", comparison_reflection_router)
 graph.add_edge("human_in_the_loop_segment", "aggregate_results")
-graph.add_edge("aggregate_results", "compare_documents")
+graph.add_edge("aggregate_results", after_aggregation)
 graph.add_edge("compare_documents", "self_reflect_comparison")
 graph.add_edge("human_in_the_loop_comparison", "save_segments_to_faiss")
 graph.add_edge("save_segments_to_faiss", "final_audit_export")
 graph.add_edge("final_audit_export", END)
 
-graph.set_entry_point("ingest_documents")
-
 # The compiled graph is ready for orchestration/testing
 compiled_graph = graph.compile(checkpointer = MemorySaver())
\ No newline at end of file
@@ -1,43 +1,203 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import pdfplumber
-from ldaa.utils.logging import log_event, log_error
+from ldaa.agents.config import load_config
+from ldaa.utils.cache import IngestCache, cache_root
+from ldaa.utils.logging import log_event, log_error, log_debug
 
-def extract_pdf_text(pdf_path):
-    print("[DEBUG] Attempting to read PDF with pdfplumber:", pdf_path)
-    results = []
+# Part of the ingest cache key: bump the suffix whenever extraction output changes.
+EXTRACTOR_VERSION = f"pdfplumber-{pdfplumber.__version__}/1"
+
+def extract_page_texts(pdf_path, start=0, stop=None):
+    """
+    Extracts the text of pages [start, stop) of a PDF, in page order.
+    Top-level (picklable) so it can run inside a process pool worker.
+    """
+    texts = []
     with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
+        for i, page in enumerate(pdf.pages[start:stop], start=start):
             text = page.extract_text() or ""
-            print(f"[DEBUG] Page {i+1} text: ", repr(text[:200]))
-            results.append(text)
-    all_text = "\n".join(results)
+            log_debug("INGEST", "Extracted page", page=i + 1, text=text)
+            texts.append(text)
+    return texts
+
+def count_pdf_pages(pdf_path):
+    with pdfplumber.open(pdf_path) as pdf:
+        return len(pdf.pages)
+
+def build_extraction_result(page_texts, cached=False):
+    all_text = "\n".join(page_texts)
     meta = {
-        "num_pages": len(results),
+        "num_pages": len(page_texts),
         "success": True,
         "error": None,
-        "reasoning": "Successfully extracted PDF text."
+        "reasoning": "Loaded extracted PDF text from the ingest cache." if cached else "Successfully extracted PDF text.",
+        "cached": cached,
     }
-    print(f"***{all_text}***")
     return all_text, meta
 
-def ingest_documents(state, config, store):
+def missing_path_result():
+    return None, {"success": False, "error": "No path provided", "reasoning": "No path provided."}
+
+def extract_pdf_text(pdf_path):
+    log_debug("INGEST", "Reading PDF with pdfplumber", path=pdf_path)
+    all_text, meta = build_extraction_result(extract_page_texts(pdf_path))
+    log_debug("INGEST", "Extracted PDF text", path=pdf_path, num_chars=len(all_text), text=all_text)
+    return all_text, meta
+
+async def extract_pdf_pages_parallel(pdf_path, executor, pages_per_task=8):
     """
-    Ingests two PDF documents, extracts raw text from each, and logs meta information.
-    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    Splits the PDF into page ranges, extracts them concurrently on `executor` without
+    blocking the event loop, and returns the page texts in page order.
     """
-    log_event("INGEST", "Starting document ingestion")
-    doc1_path = state.doc1_path
-    doc2_path = state.doc2_path
-    doc1_text, meta1 = extract_pdf_text(doc1_path) if doc1_path else (None, {"success": False, "error": "No path provided", "reasoning": "No path provided."})
-    doc2_text, meta2 = extract_pdf_text(doc2_path) if doc2_path else (None, {"success": False, "error": "No path provided", "reasoning": "No path provided."})
-    print("[DEBUG] Ingested doc1_text:", repr(doc1_text[:500]) if doc1_text is not None else "None")
-    print("[DEBUG] Ingested doc2_text:", repr(doc2_text[:500]) if doc2_text is not None else "None")
+    loop = asyncio.get_running_loop()
+    num_pages = await loop.run_in_executor(executor, count_pdf_pages, pdf_path)
+    ranges = [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+    chunks = await asyncio.gather(*(
+        loop.run_in_executor(executor, extract_page_texts, pdf_path, start, stop)
+        for start, stop in ranges
+    ))
+    return [text for chunk in chunks for text in chunk]
+
+async def extract_pdf_text_parallel(pdf_path, executor, pages_per_task=8):
+    """
+    Page-parallel variant of extract_pdf_text. Returns the same (text, meta) pair.
+    """
+    return build_extraction_result(await extract_pdf_pages_parallel(pdf_path, executor, pages_per_task))
+
+def get_ingest_cache(ingest_config):
+    if not ingest_config.cache_enabled:
+        return None
+    cache_dir = ingest_config.cache_dir or cache_root() / "ingest"
+    return IngestCache(cache_dir, ingest_config.cache_max_bytes, EXTRACTOR_VERSION)
+
+def load_document(pdf_path, cache=None):
+    """
+    Returns (text, meta) for a PDF, skipping extraction entirely on an ingest cache hit.
+    """
+    if not pdf_path:
+        return missing_path_result()
+    if cache is None:
+        return extract_pdf_text(pdf_path)
+    key = cache.key_for(pdf_path)
+    page_texts = cache.get(key)
+    if page_texts is not None:
+        return build_extraction_result(page_texts, cached=True)
+    page_texts = extract_page_texts(pdf_path)
+    cache.put(key, page_texts)
+    return build_extraction_result(page_texts)
+
+async def aload_document(pdf_path, cache=None, executor=None, pages_per_task=8):
+    """
+    Async counterpart of load_document. Hashing and cache I/O run in a worker thread;
+    extraction runs page-parallel on `executor` when one is given.
+    """
+    if not pdf_path:
+        return missing_path_result()
+    if executor is None:
+        return await asyncio.to_thread(load_document, pdf_path, cache)
+    key = page_texts = None
+    if cache is not None:
+        key = await asyncio.to_thread(cache.key_for, pdf_path)
+        page_texts = await asyncio.to_thread(cache.get, key)
+        if page_texts is not None:
+            return build_extraction_result(page_texts, cached=True)
+    page_texts = await extract_pdf_pages_parallel(pdf_path, executor, pages_per_task)
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, page_texts)
+    return build_extraction_result(page_texts)
+
+class PdfPageStream:
+    """
+    Async iterator over a PDF's page texts, in page order. Page ranges are all submitted
+    to `executor` up front and each page is yielded as soon as its range is extracted, so
+    consumers can start working while later pages are still being read. On an ingest cache
+    hit every page is yielded immediately. After iteration, `result()` returns the same
+    (text, meta) pair as load_document.
+    """
+    def __init__(self, pdf_path, cache=None, executor=None, pages_per_task=8):
+        self.pdf_path = pdf_path
+        self.cache = cache
+        self.executor = executor
+        self.pages_per_task = pages_per_task
+        self.page_texts = []
+        self.cached = False
+
+    async def __aiter__(self):
+        key = None
+        if self.cache is not None:
+            key = await asyncio.to_thread(self.cache.key_for, self.pdf_path)
+            page_texts = await asyncio.to_thread(self.cache.get, key)
+            if page_texts is not None:
+                self.cached = True
+                for text in page_texts:
+                    self.page_texts.append(text)
+                    yield text
+                return
+        loop = asyncio.get_running_loop()
+        num_pages = await loop.run_in_executor(self.executor, count_pdf_pages, self.pdf_path)
+        futures = [
+            loop.run_in_executor(self.executor, extract_page_texts, self.pdf_path, start, min(start + self.pages_per_task, num_pages))
+            for start in range(0, num_pages, self.pages_per_task)
+        ]
+        for future in futures:
+            for text in await future:
+                self.page_texts.append(text)
+                yield text
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.put, key, self.page_texts)
+
+    def result(self):
+        return build_extraction_result(self.page_texts, cached=self.cached)
+
+def apply_ingest_results(state, doc1_result, doc2_result, cache=None):
+    doc1_text, meta1 = doc1_result
+    doc2_text, meta2 = doc2_result
+    log_debug("INGEST", "Ingested documents", doc1_text=doc1_text, doc2_text=doc2_text)
     meta_log = {
         "doc1": meta1,
         "doc2": meta2,
     }
+    if cache is not None:
+        meta_log["cache"] = cache.stats()
     # Update state using attribute access
     state.doc1_text = doc1_text
     state.doc2_text = doc2_text
     state.meta['ingest'] = meta_log
+    return state
+
+def ingest_documents(state, config, store):
+    """
+    Ingests two PDF documents, extracts raw text from each, and logs meta information.
+    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    """
+    log_event("INGEST", "Starting document ingestion")
+    cache = get_ingest_cache(load_config().ingest)
+    doc1_result = load_document(state.doc1_path, cache)
+    doc2_result = load_document(state.doc2_path, cache)
+    apply_ingest_results(state, doc1_result, doc2_result, cache)
+    log_event("INGEST", "Document ingestion successful.")
+    return state
+
+async def aingest_documents(state, config, store):
+    """
+    Async counterpart of ingest_documents used by the graph. Both documents are extracted
+    concurrently and off the event loop; with `ingest.parallel` enabled, pages are spread
+    over a process pool so large PDFs use every core.
+    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    """
+    log_event("INGEST", "Starting document ingestion")
+    ingest_config = load_config().ingest
+    cache = get_ingest_cache(ingest_config)
+    paths = [state.doc1_path, state.doc2_path]
+    executor = ProcessPoolExecutor(max_workers=ingest_config.max_workers) if ingest_config.parallel else None
+    try:
+        results = await asyncio.gather(*(
+            aload_document(path, cache, executor, ingest_config.pages_per_task) for path in paths
+        ))
+    finally:
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown)
+    apply_ingest_results(state, *results, cache=cache)
     log_event("INGEST", "Document ingestion successful.")
-    return state
\ No newline at end of file
+    return state
@@ -1,17 +1,325 @@
 from langchain.chat_models import init_chat_model
 from ldaa.agents.config import load_config
+from ldaa.utils.scheduler import LLMScheduler
+from ldaa.utils.cache import LLMResponseCache, cache_root
+from ldaa.utils.tokens import count_tokens
+from ldaa.utils.usage import TokenBudgetExceeded, check_run_budget, estimate_call, record_call
+from langchain_core.messages import AIMessage, AIMessageChunk
 from dotenv import load_dotenv
+import asyncio
+import atexit
+import hashlib
+import httpx
 import os
+import threading
+import time
+import weakref
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Note: Set LANGFUSE_PUBLIC_KEY and LANGFUSE_SECRET_KEY in your .env file for tracking
 
-def get_llm():
+class CachedChatModel:
+    """
+    Wraps a chat model so `invoke`/`ainvoke` first look the prompt up in the LLM response
+    cache. Hits return an AIMessage with the cached content without calling the provider;
+    other attributes are delegated to the wrapped model.
+    """
+    def __init__(self, llm, cache: LLMResponseCache, model: str, params=None):
+        self.llm = llm
+        self.cache = cache
+        self.model = model
+        self.params = params or {}
+
+    def __getattr__(self, name):
+        return getattr(self.llm, name)
+
+    def _key(self, prompt, kwargs):
+        return self.cache.key_for(self.model, prompt, {**self.params, **kwargs})
+
+    def _store(self, key, response):
+        if isinstance(getattr(response, "content", None), str):
+            self.cache.put(key, response.content, model=self.model)
+
+    def invoke(self, prompt, **kwargs):
+        key = self._key(prompt, kwargs)
+        content = self.cache.get(key)
+        if content is not None:
+            return AIMessage(content=content, response_metadata={"cache_hit": True})
+        response = self.llm.invoke(prompt, **kwargs)
+        self._store(key, response)
+        return response
+
+    async def alookup(self, prompt, **kwargs):
+        """The cached response to `prompt` (an AIMessage marked cache_hit), or None."""
+        content = await asyncio.to_thread(self.cache.get, self._key(prompt, kwargs))
+        if content is None:
+            return None
+        return AIMessage(content=content, response_metadata={"cache_hit": True})
+
+    async def ainvoke(self, prompt, **kwargs):
+        cached = await self.alookup(prompt, **kwargs)
+        if cached is not None:
+            return cached
+        return await self.ainvoke_uncached(prompt, **kwargs)
+
+    async def ainvoke_uncached(self, prompt, **kwargs):
+        """Calls the provider and stores the response, without looking the prompt up first."""
+        response = await self.llm.ainvoke(prompt, **kwargs)
+        await asyncio.to_thread(self._store, self._key(prompt, kwargs), response)
+        return response
+
+    async def astream(self, prompt, **kwargs):
+        """Streams the response; a cache hit is replayed as a single chunk."""
+        cached = await self.alookup(prompt, **kwargs)
+        if cached is not None:
+            yield AIMessageChunk(content=cached.content, response_metadata=cached.response_metadata)
+            return
+        async for chunk in self.astream_uncached(prompt, **kwargs):
+            yield chunk
+
+    async def astream_uncached(self, prompt, **kwargs):
+        response = None
+        async for chunk in self.llm.astream(prompt, **kwargs):
+            response = chunk if response is None else response + chunk
+            yield chunk
+        if response is not None:
+            await asyncio.to_thread(self._store, self._key(prompt, kwargs), response)
+
+# Shared per database path so hit-rate statistics accumulate over the whole run
+_llm_caches = {}
+
+def get_llm_cache():
+    settings = load_config().llm_cache
+    if not settings.enabled:
+        return None
+    path = str(settings.path or cache_root() / "llm.sqlite")
+    if path not in _llm_caches:
+        _llm_caches[path] = LLMResponseCache(path, settings.ttl_seconds, settings.max_entries)
+    return _llm_caches[path]
+
+def llm_cache_stats():
+    """Hit/miss/eviction counts of the LLM response cache, or None when it is disabled."""
+    cache = get_llm_cache()
+    return cache.stats() if cache else None
+
+def variant_seed(*parts):
+    """
+    Seed for `get_random_prompt_variant` derived from the content a prompt is about, so
+    reruns over the same input pick the same template (and can hit the response cache).
+    Returns None, i.e. random selection, when seeded variants are disabled.
+    """
+    if not load_config().llm_cache.seed_variants:
+        return None
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+OPENAI_PROVIDERS = ("openai", "azure_openai")
+
+def uses_openai_client(model: str) -> bool:
+    """True if `model` is served through the OpenAI SDK, which accepts pooled httpx clients."""
+    if ":" in model:
+        return model.split(":", 1)[0] in OPENAI_PROVIDERS
+    return model.startswith(("gpt-", "chatgpt", "o1", "o3", "o4"))
+
+class ClientPool:
+    """
+    Process-wide pool of chat model clients, one per (model, pool settings). OpenAI-backed
+    clients get shared httpx clients with keep-alive limits, so connections (and TLS
+    sessions) are reused across calls and nodes. Async HTTP connections cannot move between
+    event loops, so clients are kept per running loop; `aclose()` releases the clients of
+    the running loop before it shuts down, and `close()` (registered with atexit) the rest.
+    """
+    def __init__(self):
+        self._by_loop = weakref.WeakKeyDictionary()
+        self._no_loop = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def _clients(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return self._no_loop
+        return self._by_loop.setdefault(loop, {})
+
+    def get(self, model: str, settings):
+        key = (model, settings.model_dump_json())
+        with self._lock:
+            clients = self._clients()
+            entry = clients.get(key)
+            if entry is not None:
+                self.reused += 1
+                return entry[0]
+            http_clients = []
+            kwargs = {}
+            if uses_openai_client(model):
+                limits = httpx.Limits(
+                    max_connections=settings.max_connections,
+                    max_keepalive_connections=settings.max_keepalive_connections,
+                    keepalive_expiry=settings.keepalive_expiry,
+                )
+                http_clients = [
+                    httpx.Client(limits=limits, timeout=settings.timeout),
+                    httpx.AsyncClient(limits=limits, timeout=settings.timeout),
+                ]
+                kwargs = {"http_client": http_clients[0], "http_async_client": http_clients[1]}
+            llm = init_chat_model(model, **kwargs)
+            clients[key] = (llm, http_clients, settings.max_connections)
+            self.created += 1
+            return llm
+
+    async def aclose(self):
+        """Closes and forgets the clients created on the running event loop."""
+        with self._lock:
+            clients = self._by_loop.pop(asyncio.get_running_loop(), {})
+        for _, http_clients, _ in clients.values():
+            for client in http_clients:
+                if isinstance(client, httpx.AsyncClient):
+                    await client.aclose()
+                else:
+                    client.close()
+
+    def close(self):
+        """
+        Closes every client that does not need a running loop: all sync clients, and the
+        async ones of loops that are gone (whose connections can only be dropped).
+        """
+        with self._lock:
+            entries = list(self._no_loop.values()) + [entry for clients in list(self._by_loop.values()) for entry in clients.values()]
+            self._no_loop, self._by_loop = {}, weakref.WeakKeyDictionary()
+        for _, http_clients, _ in entries:
+            for client in http_clients:
+                if isinstance(client, httpx.Client):
+                    client.close()
+
+    def stats(self):
+        entries = list(self._no_loop.values()) + [entry for clients in list(self._by_loop.values()) for entry in clients.values()]
+        open_connections, capacity = 0, 0
+        for _, http_clients, max_connections in entries:
+            for client in http_clients:
+                pool = getattr(getattr(client, "_transport", None), "_pool", None)
+                open_connections += len(getattr(pool, "connections", []))
+                capacity += max_connections
+        return {
+            "clients": len(entries),
+            "created": self.created,
+            "reused": self.reused,
+            "open_connections": open_connections,
+            "utilization": round(open_connections / capacity, 4) if capacity else 0.0,
+        }
+
+_client_pool = ClientPool()
+atexit.register(_client_pool.close)
+
+async def aclose_llm_clients():
+    """Closes the pooled HTTP clients of the running event loop; call it before the loop ends."""
+    await _client_pool.aclose()
+
+def llm_pool_stats():
+    """Pooled client counts and HTTP connection utilization for the current process."""
+    return _client_pool.stats()
+
+def get_llm(cache: bool = True):
+    """
+    Returns the configured chat model from the process-wide client pool, wrapped by the
+    response cache when it is enabled. Pass cache=False for calls that must reach the
+    provider, e.g. retries of an answer that was rejected.
+    """
     config = load_config()
     model = getattr(config, "model", None) or os.getenv("OPENAI_MODEL", "openai:gpt-4o")
-    return init_chat_model(model)
+    llm = _client_pool.get(model, config.llm_pool)
+    cache = get_llm_cache() if cache else None
+    return CachedChatModel(llm, cache, model) if cache else llm
+
+# One scheduler per event loop: its asyncio primitives cannot be shared across loops
+_schedulers = weakref.WeakKeyDictionary()
+
+def get_scheduler() -> LLMScheduler:
+    """
+    Returns the scheduler shared by all per-segment LLM calls running on the current event
+    loop, so analysis and reflection of both documents draw from the same limits.
+    """
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        settings = load_config().scheduler
+        scheduler = LLMScheduler(
+            max_concurrency=settings.max_concurrency,
+            requests_per_minute=settings.requests_per_minute,
+            tokens_per_minute=settings.tokens_per_minute,
+            max_retries=settings.max_retries,
+            base_backoff=settings.base_backoff,
+        )
+        _schedulers[loop] = scheduler
+    return scheduler
+
+async def _stream_response(chunks, on_chunk):
+    """Consumes the `chunks` stream, passing each text chunk to `on_chunk`; returns the merged message."""
+    response = None
+    async for chunk in chunks:
+        response = chunk if response is None else response + chunk
+        if isinstance(chunk.content, str) and chunk.content:
+            on_chunk(chunk.content)
+    return response if response is not None else AIMessage(content="")
+
+async def invoke_llm(llm, prompt, expected_output_tokens=None, on_chunk=None, on_retry=None):
+    """
+    Runs one LLM call through the shared scheduler with token accounting: the prompt is
+    checked against the per-call and per-run budgets (raising TokenBudgetExceeded before
+    anything is sent), and the pre-flight estimate and actual usage are recorded for the
+    node being tracked (see ldaa.utils.usage). Response-cache hits are answered before the
+    scheduler, so they take no concurrency slot and no rate-limit budget.
+    With `on_chunk`, the response is streamed and each text chunk is passed to it as it
+    arrives; the merged message is returned as usual. When the scheduler retries a
+    throttled call, `on_retry()` is called first so the consumer can discard the chunks of
+    the failed attempt.
+    """
+    budget = load_config().budget
+    model = load_config().model
+    input_tokens = count_tokens(prompt, model)
+    expected_output = budget.expected_output_tokens if expected_output_tokens is None else expected_output_tokens
+    if budget.max_prompt_tokens and input_tokens > budget.max_prompt_tokens:
+        raise TokenBudgetExceeded(f"Prompt of {input_tokens} tokens exceeds the per-call budget of {budget.max_prompt_tokens}")
+    check_run_budget(input_tokens + expected_output, budget.max_run_tokens)
+    estimate = estimate_call(input_tokens, expected_output, budget)
+    started = time.monotonic()
+    cached_llm = llm if isinstance(llm, CachedChatModel) else None
+    response = await cached_llm.alookup(prompt) if cached_llm else None
+    if response is not None:
+        if on_chunk and response.content:
+            on_chunk(response.content)
+    else:
+        attempts = 0
+
+        async def make_call():
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1 and on_retry:
+                on_retry()
+            if on_chunk:
+                chunks = cached_llm.astream_uncached(prompt) if cached_llm else llm.astream(prompt)
+                return await _stream_response(chunks, on_chunk)
+            return await (cached_llm.ainvoke_uncached(prompt) if cached_llm else llm.ainvoke(prompt))
+
+        response = await get_scheduler().submit(make_call, tokens=input_tokens)
+    usage = getattr(response, "usage_metadata", None) or {}
+    content = getattr(response, "content", "")
+    input_used = usage.get("input_tokens", input_tokens)
+    output_used = usage.get("output_tokens") or count_tokens(content if isinstance(content, str) else str(content), model)
+    cached = bool((getattr(response, "response_metadata", None) or {}).get("cache_hit"))
+    record_call(
+        input_used, output_used, estimate,
+        latency_s=time.monotonic() - started,
+        cost_usd=estimate_call(input_used, output_used, budget)["cost_usd"],
+        cached=cached,
+    )
+    return response
 
 # Utility for prompt construction (can be expanded for few-shot, etc.)
 def build_prompt(task: str, segment_text: str, examples=None):
@@ -0,0 +1,181 @@
+"""
+Partial comparison re-runs driven by reflection feedback.
+
+`self_reflect_comparison` may name the deficient parts of a DocumentComparison: top-level
+fields ('similarities', 'differences', 'focus_areas', 'gaps', 'comparative_summary',
+'verbose_report') and/or taxonomy categories ('category:<name>'). On a 'retry',
+compare_documents regenerates only those parts and merges them into the existing result
+instead of redoing the whole comparison. On a 'reboot', only the segments of the deficient
+categories are sent back to analysis; every other analysis is kept.
+"""
+from ldaa.agents.compare_by_category import merge_category_partials, recompute_categories
+from ldaa.agents.llm import get_llm, invoke_llm, variant_seed
+from ldaa.schemas import DocumentComparison, SegmentAction
+from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.json import extract_json_from_llm_output
+from ldaa.utils.logging import log_event, log_error
+from ldaa.utils.prompt_format import format_analyses, format_comparison
+
+DEFICIENT_FIELDS = ("similarities", "differences", "focus_areas", "gaps", "comparative_summary", "verbose_report")
+CATEGORY_PREFIX = "category:"
+EXPECTED_OUTPUT_TOKENS = 1500
+PROMPT_FIELDS = ("segment_id", "category", "confidence", "summary", "pros", "cons", "reasoning")
+PROMPT_MAX_CHARS = 300
+
+REFINE_PROMPT_TEMPLATES = [
+    """
+You are a legal document analysis assistant. A comparison of two documents was reviewed and these parts were found deficient: {parts}. Reviewer feedback: {feedback}\n\nRegenerate ONLY the deficient parts from the segment analyses below, keeping them consistent with the rest of the current comparison. Return a JSON object with only these keys: {keys} - 'similarities' / 'differences': lists of dictionaries with 'topic' (str, as per the taxonomy) and 'explanation' (str) - 'focus_areas': {{'doc1': [...], 'doc2': [...]}} - 'gaps': a list of strings - 'comparative_summary': a concise summary - 'verbose_report': the complete markdown report - 'categories': {{category: {{'similarities': [...], 'differences': [...]}}}} for the listed categories only - 'confidence': 0-1 for the regenerated parts - 'reasoning': a short explanation.\n\nCurrent comparison:\n{comparison}\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}
+""",
+    """
+As a comparative legal analyst, fix the weak parts of the comparison below: {parts}. Reviewer feedback: {feedback}\n\nOutput only a JSON object with the keys {keys}. Use lists of {{'topic', 'explanation'}} for 'similarities' and 'differences', {{'doc1': [...], 'doc2': [...]}} for 'focus_areas', a list of strings for 'gaps', markdown for 'verbose_report', and {{category: {{'similarities': [...], 'differences': [...]}}}} under 'categories' for the listed categories. Include 'confidence' (0-1) and 'reasoning'.\n\nCurrent comparison:\n{comparison}\n\nDocument 1 Segments:\n{doc1_segments}\n\nDocument 2 Segments:\n{doc2_segments}
+""",
+]
+
+def normalize_deficient_parts(parts, taxonomy):
+    """Keeps known fields and taxonomy categories, in order and without duplicates."""
+    normalized = []
+    for part in parts or []:
+        part = str(part).strip()
+        if part == "verbose_comparison":
+            part = "verbose_report"
+        if part.startswith(CATEGORY_PREFIX):
+            category = part[len(CATEGORY_PREFIX):].strip()
+            part = CATEGORY_PREFIX + category if category in taxonomy else None
+        elif part in taxonomy:
+            part = CATEGORY_PREFIX + part
+        elif part not in DEFICIENT_FIELDS:
+            part = None
+        if part and part not in normalized:
+            normalized.append(part)
+    return normalized
+
+def split_parts(parts):
+    """(fields, categories) named by normalized deficient parts."""
+    fields = [part for part in parts if not part.startswith(CATEGORY_PREFIX)]
+    categories = [part[len(CATEGORY_PREFIX):] for part in parts if part.startswith(CATEGORY_PREFIX)]
+    return fields, categories
+
+def _topic_items(items, default_topic=None):
+    return [
+        {"topic": str(item.get("topic") or default_topic or ""), "explanation": str(item["explanation"])}
+        for item in items or [] if isinstance(item, dict) and item.get("explanation")
+    ]
+
+def merge_refinement(comparison, update, fields, categories):
+    """
+    Returns a copy of `comparison` with the regenerated fields replaced and, for each
+    category, its similarities and differences swapped for the regenerated ones.
+    """
+    merged = comparison.model_dump()
+    if "similarities" in fields and "similarities" in update:
+        merged["similarities"] = _topic_items(update["similarities"])
+    if "differences" in fields and "differences" in update:
+        merged["differences"] = _topic_items(update["differences"])
+    if "focus_areas" in fields and isinstance(update.get("focus_areas"), dict):
+        merged["focus_areas"] = {doc: [str(area) for area in areas or []] for doc, areas in update["focus_areas"].items()}
+    if "gaps" in fields and isinstance(update.get("gaps"), list):
+        merged["gaps"] = [gap if isinstance(gap, str) else str(gap) for gap in update["gaps"]]
+    if "comparative_summary" in fields and update.get("comparative_summary"):
+        merged["comparative_summary"] = str(update["comparative_summary"])
+    if "verbose_report" in fields and update.get("verbose_report"):
+        merged["verbose_comparison"] = str(update["verbose_report"])
+    by_category = update.get("categories") if isinstance(update.get("categories"), dict) else {}
+    for category in categories:
+        if category not in by_category:
+            continue
+        for key in ("similarities", "differences"):
+            kept = [item for item in merged[key] if item.get("topic") != category]
+            merged[key] = kept + _topic_items(by_category[category].get(key), category)
+    if update.get("confidence") is not None:
+        merged["confidence"] = float(update["confidence"])
+    merged["meta"] = {**(merged.get("meta") or {}), "refined": fields + [CATEGORY_PREFIX + c for c in categories]}
+    merged["reasoning"] = str(update.get("reasoning") or merged.get("reasoning") or "")
+    return DocumentComparison(**merged)
+
+async def refine_comparison(comparison, doc1_segments, doc2_segments, fields, categories, feedback=""):
+    """
+    Regenerates the deficient parts of `comparison` in one focused LLM call. When only
+    categories are deficient, only their analyses are sent. Returns (comparison, meta log).
+    """
+    if categories and not fields:
+        doc1_segments = [a for a in doc1_segments if a.category in categories]
+        doc2_segments = [a for a in doc2_segments if a.category in categories]
+    parts = fields + [CATEGORY_PREFIX + category for category in categories]
+    keys = fields + (["categories"] if categories else []) + ["confidence", "reasoning"]
+    doc1_text = format_analyses(doc1_segments, PROMPT_FIELDS, PROMPT_MAX_CHARS)
+    doc2_text = format_analyses(doc2_segments, PROMPT_FIELDS, PROMPT_MAX_CHARS)
+    prompt = get_random_prompt_variant(
+        REFINE_PROMPT_TEMPLATES,
+        {
+            "parts": ", ".join(parts),
+            "feedback": feedback or "-",
+            "keys": ", ".join(f"'{key}'" for key in keys),
+            "comparison": format_comparison(comparison),
+            "doc1_segments": doc1_text,
+            "doc2_segments": doc2_text,
+        },
+        seed=variant_seed(parts, doc1_text, doc2_text),
+    )
+    try:
+        response = await invoke_llm(get_llm(cache=False), prompt, expected_output_tokens=EXPECTED_OUTPUT_TOKENS)
+        update = extract_json_from_llm_output(response.content)
+        if not isinstance(update, dict):
+            raise ValueError(f"Expected a JSON object, got {type(update).__name__}")
+        refined = merge_refinement(comparison, update, fields, categories)
+        log_event("COMPARE", "Deficient comparison parts regenerated.", parts=parts)
+        return refined, {"success": True, "reasoning": refined.reasoning, "mode": "refine", "refined": parts}
+    except Exception as e:
+        log_error(str(e), context="refine_comparison")
+        # Keep the previous comparison; reflection decides again on it
+        return comparison, {"success": False, "reasoning": f"Comparison refinement failed: {str(e)}", "mode": "refine", "refined": []}
+
+async def rerun_deficient_parts(state, action, mode):
+    """
+    Retry path of compare_documents: regenerates the parts named in `action.deficient_parts`
+    and merges them into `state.comparison_result`. In map-reduce mode only the deficient
+    categories are recomputed and swapped into the existing comparison, so earlier field
+    refinements are kept; deficient fields get one refinement call.
+    Returns (comparison, meta log).
+    """
+    fields, categories = split_parts(action.deficient_parts)
+    comparison, meta = state.comparison_result, {}
+    if mode == "map_reduce" and categories:
+        old_partials, new_partials, meta = await recompute_categories(state, categories)
+        comparison = merge_category_partials(comparison, old_partials, new_partials)
+        meta["reasoning"] = f"Recomputed categories: {', '.join(new_partials) or 'none'}."
+        categories = []
+    if fields or categories:
+        comparison, meta = await refine_comparison(
+            comparison, state.doc1_accepted_segments, state.doc2_accepted_segments, fields, categories, action.reasoning
+        )
+    meta["deficient_parts"] = list(action.deficient_parts)
+    return comparison, meta
+
+def flag_segments_for_reboot(state, categories, taxonomy, max_attempts):
+    """
+    Marks the segments behind a rebooted comparison for re-analysis: those in the deficient
+    categories or, with none named, those not accepted. Segments out of attempts and all
+    other analyses are kept. Returns the number of flagged segments per document.
+    """
+    flagged = {}
+    for doc in ("doc1", "doc2"):
+        analyses = getattr(state, f"{doc}_analysis")
+        actions = list(getattr(state, f"{doc}_segment_actions"))
+        attempts = getattr(state, f"{doc}_segment_attempts")
+        count = 0
+        for i, (analysis, action) in enumerate(zip(analyses, actions)):
+            implicated = (
+                analysis.category in categories if categories
+                else action.action != "accept" or analysis.category not in taxonomy
+            )
+            if implicated and (attempts[i] if i < len(attempts) else 0) < max_attempts:
+                actions[i] = SegmentAction(
+                    segment_index=action.segment_index,
+                    action="retry",
+                    confidence=action.confidence,
+                    reasoning="Comparison reboot: segment re-analyzed.",
+                )
+                count += 1
+        setattr(state, f"{doc}_segment_actions", actions)
+        flagged[doc] = count
+    return flagged
@@ -0,0 +1,70 @@
+"""
+Local pre-reflection rules for segment analyses.
+
+Many reflection verdicts are already fixed by the analysis itself: a failed call must be
+retried, an analysis with missing fields or an off-taxonomy category is unusable, and the
+prompts force 'accept' above the confidence threshold anyway. `pre_reflect` applies these
+rules in order and returns the reflection for the first one that fires, so no LLM round
+trip is spent on it. It returns None when the verdict needs the LLM.
+"""
+from ldaa.agents.analyze_segment import FAILURE_MARKER, INVALID_MARKER
+
+REQUIRED_TEXT_FIELDS = ("summary", "category", "reasoning")
+
+def _field(analysis, name, default=None):
+    if isinstance(analysis, dict):
+        return analysis.get(name, default)
+    return getattr(analysis, name, default)
+
+def rule_analysis_failed(analysis, threshold, taxonomy):
+    reasoning = _field(analysis, "reasoning") or ""
+    if _field(analysis, "success", True) is False or reasoning.startswith((FAILURE_MARKER, INVALID_MARKER)):
+        return "retry", "The analysis call failed or returned an invalid analysis."
+
+def rule_incomplete_schema(analysis, threshold, taxonomy):
+    missing = [name for name in REQUIRED_TEXT_FIELDS if not str(_field(analysis, name) or "").strip()]
+    if missing:
+        return "retry", f"The analysis is missing: {', '.join(missing)}."
+
+def rule_pros_cons_cardinality(analysis, threshold, taxonomy):
+    empty = [name for name in ("pros", "cons") if not _field(analysis, name)]
+    if empty:
+        return "retry", f"The analysis lists no {' or '.join(empty)}."
+
+def rule_category_in_taxonomy(analysis, threshold, taxonomy):
+    category = str(_field(analysis, "category") or "").strip()
+    if taxonomy and category not in taxonomy:
+        return "retry", f"Category '{category}' is not in the taxonomy."
+
+def rule_confidence_above_threshold(analysis, threshold, taxonomy):
+    confidence = _field(analysis, "confidence", 0.0) or 0.0
+    if confidence > threshold:
+        return "accept", f"Confidence {confidence} is above the threshold {threshold}."
+
+# Evaluated in order: quality failures first, so a confident but unusable analysis is retried
+RULES = [
+    ("analysis_failed", rule_analysis_failed),
+    ("incomplete_schema", rule_incomplete_schema),
+    ("pros_cons_cardinality", rule_pros_cons_cardinality),
+    ("category_in_taxonomy", rule_category_in_taxonomy),
+    ("confidence_above_threshold", rule_confidence_above_threshold),
+]
+
+def pre_reflect(analysis, segment_index, threshold, taxonomy):
+    """
+    Returns a reflection dict (as produced by `reflect_on_segment`, plus the name of the
+    rule that fired) when a local rule decides the action, or None to defer to the LLM.
+    """
+    for name, rule in RULES:
+        verdict = rule(analysis, threshold, taxonomy)
+        if verdict:
+            action, reasoning = verdict
+            return {
+                "action": action,
+                "confidence": _field(analysis, "confidence", 0.0) or 0.0,
+                "reasoning": f"Rule '{name}': {reasoning}",
+                "success": True,
+                "segment_index": segment_index,
+                "rule": name,
+            }
+    return None
@@ -1,11 +1,23 @@
-from ldaa.agents.llm import get_llm
+from ldaa.agents.llm import get_llm, invoke_llm, variant_seed, llm_cache_stats
+from ldaa.utils.usage import tracks_usage
 from ldaa.agents.config import load_config
 from ldaa.utils.json import extract_json_from_llm_output
 import asyncio
 from ldaa.utils.logging import log_event, log_error
 from ldaa.schemas import ComparisonAction
 from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.prompt_format import format_comparison, serialization_savings
+from ldaa.agents.refine_comparison import normalize_deficient_parts, split_parts, flag_segments_for_reboot
+from ldaa.agents.comparison_checks import check_comparison, metrics_prompt_section
 
+# Comparison fields the reflection needs; the markdown report is only sampled
+PROMPT_FIELDS = (
+    "comparative_summary", "similarities", "differences", "focus_areas", "gaps",
+    "confidence", "reasoning", "verbose_comparison",
+)
+PROMPT_MAX_CHARS = 600
+
+@tracks_usage("self_reflect_comparison")
 async def self_reflect_comparison(state, config, store):
     """
     Agentic node: Uses an LLM to self-reflect on the document comparison and recommend an action.
@@ -13,47 +25,90 @@ async def self_reflect_comparison(state, config, store):
     Inputs (from state):
         - comparison_result: Dict with comparative summary, confidence, reasoning, verbose_report, etc.
     Outputs (to state):
-        - comparison_action: Dict with {action, reboot, confidence, reasoning}
+        - comparison_action: Dict with {action, confidence, reasoning, deficient_parts}
+        - docN_segment_actions: on a reboot, the segments to re-analyze are flagged 'retry'
         - meta_log: Reflection meta information (success, errors, etc)
     """
     log_event("REFLECT_COMPARISON", "Starting self-reflection on comparison.")
     comparison = state.comparison_result
-    llm = get_llm()
     config_obj = load_config()
     threshold = config_obj.confidence_threshold
+    taxonomy = config_obj.taxonomy
     prompt_templates = [
         """
-You are a legal document analysis assistant. Review the following document comparison and recommend an action. Return a JSON object with: - 'action': one of 'accept', 'retry', 'mark_review', or 'reboot' (if confidence > {threshold}, force accept; if confidence < 0.2, consider reboot) - 'confidence': the confidence score from 0 to 1 that represents consistency, completeness, and confidence from the comparison - 'reasoning': a short explanation for your decision\n\nComparison Result:\n{comparison}
+You are a legal document analysis assistant. Review the following document comparison and recommend an action. Return a JSON object with: - 'action': one of 'accept', 'retry', 'mark_review', or 'reboot' (if confidence > {threshold}, force accept; if confidence < 0.2, consider reboot) - 'confidence': the confidence score from 0 to 1 that represents consistency, completeness, and confidence from the comparison - 'reasoning': a short explanation for your decision - 'deficient_parts': for 'retry' or 'reboot', the weak parts to redo: any of 'similarities', 'differences', 'focus_areas', 'gaps', 'comparative_summary', 'verbose_report', or 'category:<topic>' for a poorly covered topic of the taxonomy ({taxonomy}); an empty list means everything.\n\nComparison Result:\n{comparison}
 """,
         """
-As a comparison reflection expert, review the analysis below and provide a JSON object with: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 score - 'reasoning': brief explanation.\n\nComparison Result:\n{comparison}
+As a comparison reflection expert, review the analysis below and provide a JSON object with: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 score - 'reasoning': brief explanation. - 'deficient_parts': for 'retry' or 'reboot', the weak parts to redo: any of 'similarities', 'differences', 'focus_areas', 'gaps', 'comparative_summary', 'verbose_report', or 'category:<topic>' for a poorly covered topic of the taxonomy ({taxonomy}); an empty list means everything.\n\nComparison Result:\n{comparison}
 """,
         """
-Reflect on the following document comparison and recommend an action. Output a JSON object: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 - 'reasoning': explanation.\n\nComparison Result:\n{comparison}
+Reflect on the following document comparison and recommend an action. Output a JSON object: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 - 'reasoning': explanation. - 'deficient_parts': for 'retry' or 'reboot', the weak parts to redo: any of 'similarities', 'differences', 'focus_areas', 'gaps', 'comparative_summary', 'verbose_report', or 'category:<topic>' for a poorly covered topic of the taxonomy ({taxonomy}); an empty list means everything.\n\nComparison Result:\n{comparison}
 """,
         """
-You are tasked with reviewing a document comparison. Return a JSON object: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 - 'reasoning': explanation.\n\nComparison Result:\n{comparison}
+You are tasked with reviewing a document comparison. Return a JSON object: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 - 'reasoning': explanation. - 'deficient_parts': for 'retry' or 'reboot', the weak parts to redo: any of 'similarities', 'differences', 'focus_areas', 'gaps', 'comparative_summary', 'verbose_report', or 'category:<topic>' for a poorly covered topic of the taxonomy ({taxonomy}); an empty list means everything.\n\nComparison Result:\n{comparison}
 """,
         """
-Act as a comparison review specialist. For the analysis below, provide a JSON object: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 - 'reasoning': explanation.\n\nComparison Result:\n{comparison}
+Act as a comparison review specialist. For the analysis below, provide a JSON object: - 'action': 'accept', 'retry', 'mark_review', or 'reboot' (force accept if confidence > {threshold}; consider reboot if confidence < 0.2) - 'confidence': 0-1 - 'reasoning': explanation. - 'deficient_parts': for 'retry' or 'reboot', the weak parts to redo: any of 'similarities', 'differences', 'focus_areas', 'gaps', 'comparative_summary', 'verbose_report', or 'category:<topic>' for a poorly covered topic of the taxonomy ({taxonomy}); an empty list means everything.\n\nComparison Result:\n{comparison}
 """
     ]
-    prompt = get_random_prompt_variant(prompt_templates, {"threshold": threshold, "comparison": comparison})
+    seed = variant_seed(comparison)
+    render = lambda rendered: get_random_prompt_variant(prompt_templates, {"threshold": threshold, "taxonomy": taxonomy, "comparison": rendered}, seed=seed)
+    prompt = render(format_comparison(comparison, PROMPT_FIELDS, PROMPT_MAX_CHARS))
+    serialization = serialization_savings(prompt, render(comparison))
+    checks = None
+    if config_obj.reflection.local_comparison_checks:
+        verdict, parts, issues, metrics = check_comparison(
+            comparison, state.doc1_accepted_segments, state.doc2_accepted_segments,
+            taxonomy, threshold, config_obj.reflection.min_category_coverage,
+        )
+        checks = {"verdict": verdict, "issues": issues, "metrics": metrics}
     try:
-        response = await llm.ainvoke(prompt)
-        reflection = extract_json_from_llm_output(response.content)
-        reflection["success"] = True
-        log_event("REFLECT_COMPARISON", "Self-reflection on comparison successful.")
+        if checks and checks["verdict"]:
+            # Clear-cut: decided locally, no LLM round trip
+            reflection = {
+                "action": checks["verdict"],
+                "confidence": checks["metrics"]["confidence"],
+                "reasoning": f"Local checks: {'; '.join(checks['issues']) or 'no issues found'}.",
+                "success": True,
+                "deficient_parts": parts,
+            }
+            log_event("REFLECT_COMPARISON", "Comparison reflection decided by local checks.", action=checks["verdict"])
+        else:
+            if checks:
+                prompt += metrics_prompt_section(checks["metrics"], checks["issues"])
+            response = await invoke_llm(get_llm(), prompt)
+            reflection = extract_json_from_llm_output(response.content)
+            reflection["success"] = True
+            parts = reflection.get("deficient_parts") or []
+            reflection["deficient_parts"] = normalize_deficient_parts([parts] if isinstance(parts, str) else parts, taxonomy)
+            log_event("REFLECT_COMPARISON", "Self-reflection on comparison successful.")
         reflection = ComparisonAction(**reflection)
+        if reflection.action in ("retry", "reboot") and state.comparison_attempts >= config_obj.max_comparison_attempts:
+            reflection.reasoning = f"{reflection.reasoning} ({reflection.action} limit of {config_obj.max_comparison_attempts} comparisons reached)"
+            reflection.action = "mark_review"
     except Exception as e:
         log_error(str(e), context="self_reflect_comparison")
-        reflection = {
-            "action": "mark_review",
-            "confidence": getattr(comparison, "confidence", 0.0) if hasattr(comparison, "confidence") else 0.0,
-            "reasoning": f"LLM reflection failed: {str(e)}",
-            "success": False,
-        }
-    meta_log = {"success": reflection.success if hasattr(reflection, "success") else reflection["success"], "reasoning": getattr(reflection, "reasoning", "") if hasattr(reflection, "reasoning") else reflection.get("reasoning", "")}
+        reflection = ComparisonAction(
+            action="mark_review",
+            confidence=getattr(comparison, "confidence", None) or 0.0,
+            reasoning=f"LLM reflection failed: {str(e)}",
+            success=False,
+        )
+    meta_log = {"success": reflection.success, "reasoning": reflection.reasoning}
+    meta_log["serialization"] = serialization
+    if checks:
+        meta_log["checks"] = checks
+    meta_log["deficient_parts"] = reflection.deficient_parts
+    if reflection.action == "reboot":
+        # Only the segments behind the deficient categories are analyzed again
+        _, categories = split_parts(reflection.deficient_parts)
+        flagged = flag_segments_for_reboot(state, categories, taxonomy, config_obj.max_segment_attempts)
+        meta_log["reboot"] = flagged
+        if not any(flagged.values()):
+            # Nothing can be re-analyzed; analyze_segment would otherwise redo every segment
+            reflection.action = "retry"
+            reflection.reasoning = f"{reflection.reasoning} (reboot flagged no segments; retrying the comparison)"
     state.comparison_action = reflection
     state.meta['reflect_comparison'] = meta_log
+    state.meta['llm_cache'] = llm_cache_stats()
     return state 
\ No newline at end of file
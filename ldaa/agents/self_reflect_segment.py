@@ -1,10 +1,18 @@
-from ldaa.agents.llm import get_llm
+from ldaa.agents.llm import get_llm, get_scheduler, invoke_llm, variant_seed, llm_cache_stats, llm_pool_stats
 from ldaa.agents.config import load_config
 import asyncio
 from ldaa.utils.logging import log_event, log_error
 from ldaa.utils.json import extract_json_from_llm_output
 from ldaa.schemas import SegmentAction
+from ldaa.agents.analyze_segment import pending_segment_indices
+from ldaa.agents.reflection_rules import pre_reflect
+from ldaa.utils.usage import tracks_usage
 from ldaa.utils import get_random_prompt_variant
+from ldaa.utils.tokens import count_tokens
+from ldaa.utils.batching import pack_batches, index_batch_response
+from ldaa.utils.json import to_serializable
+from pydantic import ValidationError
+import json
 
 async def reflect_on_segment(analysis, segment_index, doc_label="doc"):
     llm = get_llm()
@@ -27,9 +35,9 @@ You are tasked with reviewing a segment analysis. Return a JSON object: - 'actio
 Act as a segment review specialist. For the analysis below, provide a JSON object: - 'action': 'accept', 'retry', or 'mark_review' (force accept if confidence > {threshold}) - 'confidence': 0-1 - 'reasoning': explanation.\n\nSegment index: {segment_index}\nDocument: {doc_label}\nAnalysis:\n{analysis}
 """
     ]
-    prompt = get_random_prompt_variant(prompt_templates, {"threshold": threshold, "segment_index": segment_index, "doc_label": doc_label, "analysis": analysis})
+    prompt = get_random_prompt_variant(prompt_templates, {"threshold": threshold, "segment_index": segment_index, "doc_label": doc_label, "analysis": analysis}, seed=variant_seed(analysis))
     try:
-        response = await llm.ainvoke(prompt)
+        response = await invoke_llm(llm, prompt)
         reflection = extract_json_from_llm_output(response.content)
         reflection["success"] = True
         reflection["segment_index"] = segment_index
@@ -43,30 +51,137 @@ Act as a segment review specialist. For the analysis below, provide a JSON objec
         }
     return reflection
 
+BATCH_PROMPT_TEMPLATES = [
+    """
+You are a legal document analysis assistant. Review each of the segment analyses below independently and recommend an action for each. Return a JSON array with exactly one object per analysis, each with: - 'segment_id': the id of the analysis, copied exactly - 'action': one of 'accept', 'retry', or 'mark_review' (if confidence > {threshold}, force accept) - 'confidence': the confidence score from 0 to 1 that represents consistency, completeness, and confidence from the segmentation - 'reasoning': a short explanation for your decision\n\nAnalyses (JSON):\n{analyses}
+""",
+    """
+As a segment reflection expert, review every analysis below on its own and output a JSON array with one object per analysis: - 'segment_id': copied exactly - 'action': 'accept', 'retry', or 'mark_review' (force accept if confidence > {threshold}) - 'confidence': 0-1 score - 'reasoning': brief explanation.\n\nAnalyses (JSON):\n{analyses}
+""",
+    """
+Reflect on the following segment analyses one by one. Output a JSON array, one object per analysis: - 'segment_id': exact id - 'action': 'accept', 'retry', or 'mark_review' (force accept if confidence > {threshold}) - 'confidence': 0-1 - 'reasoning': explanation.\n\nAnalyses (JSON):\n{analyses}
+""",
+]
+
+async def reflect_on_segment_batch(items, threshold):
+    """
+    Reflects on several (key, segment_index, analysis) items with a single LLM call.
+    Returns one entry per item, in order: the reflection dict, or None if the item was
+    missing or malformed in the response (the caller re-queues those individually).
+    """
+    llm = get_llm()
+    payload = json.dumps(
+        [{"segment_id": key, "analysis": to_serializable(analysis)} for key, _, analysis in items],
+        ensure_ascii=False,
+    )
+    prompt = get_random_prompt_variant(BATCH_PROMPT_TEMPLATES, {"threshold": threshold, "analyses": payload}, seed=variant_seed(payload))
+    try:
+        response = await invoke_llm(llm, prompt)
+        entries = index_batch_response(extract_json_from_llm_output(response.content))
+    except Exception as e:
+        log_error(str(e), context="reflect_on_segment_batch")
+        return [None] * len(items)
+    results = []
+    for key, segment_index, _ in items:
+        entry = entries.get(key)
+        reflection = None
+        if entry is not None:
+            reflection = {k: v for k, v in entry.items() if k != "segment_id"}
+            reflection.update({"success": True, "segment_index": segment_index})
+            try:
+                SegmentAction(**reflection)
+            except (ValidationError, TypeError):
+                reflection = None
+        results.append(reflection)
+    return results
+
+async def reflect_on_segments_batched(jobs, batching):
+    """
+    Runs the (doc, index, analysis) `jobs` as packed multi-analysis prompts and returns the
+    reflections in job order, plus batching stats. Analyses the batch answers miss or
+    garble are reflected on again with `reflect_on_segment`.
+    """
+    threshold = load_config().confidence_threshold
+    items = [(f"{doc}_seg_{i}", i, analysis) for doc, i, analysis in jobs]
+    batches = pack_batches(
+        items,
+        cost=lambda item: count_tokens(str(item[2])),
+        max_tokens=batching.max_batch_tokens,
+        max_items=batching.max_batch_size,
+    )
+    batch_results = await asyncio.gather(*(reflect_on_segment_batch(batch, threshold) for batch in batches))
+    results = [reflection for batch in batch_results for reflection in batch]
+    requeued = [k for k, reflection in enumerate(results) if reflection is None]
+    retried = await asyncio.gather(*(reflect_on_segment(jobs[k][2], jobs[k][1], doc_label=jobs[k][0]) for k in requeued))
+    for k, reflection in zip(requeued, retried):
+        results[k] = reflection
+    return results, {"batches": len(batches), "segments": len(jobs), "requeued": len(requeued)}
+
+async def run_reflection_jobs(jobs, batching):
+    """
+    Reflects on (doc, index, analysis) `jobs`. Local pre-reflection rules settle what they
+    can; the rest go to the LLM, batched when enabled. Returns (reflection dicts in job
+    order, stats) where stats counts the rules that fired and, if used, batching.
+    """
+    settings = load_config()
+    results = [None] * len(jobs)
+    stats = {"rules": {}}
+    if settings.reflection.local_rules:
+        for k, (_, i, analysis) in enumerate(jobs):
+            results[k] = pre_reflect(analysis, i, settings.confidence_threshold, settings.taxonomy)
+            if results[k]:
+                stats["rules"][results[k]["rule"]] = stats["rules"].get(results[k]["rule"], 0) + 1
+    remaining = [k for k, reflection in enumerate(results) if reflection is None]
+    llm_jobs = [jobs[k] for k in remaining]
+    if batching.enabled and len(llm_jobs) > 1:
+        reflections, stats["batching"] = await reflect_on_segments_batched(llm_jobs, batching)
+    else:
+        reflections = await asyncio.gather(*(reflect_on_segment(analysis, i, doc_label=doc) for doc, i, analysis in llm_jobs))
+    for k, reflection in zip(remaining, reflections):
+        results[k] = reflection
+    stats["llm"] = len(llm_jobs)
+    return results, stats
+
+def to_segment_action(reflection, attempt, max_attempts):
+    """Validates a reflection dict; a 'retry' on a segment out of attempts becomes 'mark_review'."""
+    reflection = SegmentAction(**reflection)
+    if reflection.action == "retry" and attempt >= max_attempts:
+        reflection.action = "mark_review"
+        reflection.reasoning = f"{reflection.reasoning} (retry limit of {max_attempts} attempts reached)"
+    return reflection
+
+@tracks_usage("self_reflect_segment")
 async def self_reflect_segment(state, config, store):
     """
     Agentic node: Uses an LLM to self-reflect on each segment analysis and recommend an action.
+    After a segment retry only the re-analyzed segments are reflected on again. A segment
+    still flagged 'retry' after `max_segment_attempts` analyses is marked for review.
     Updates the state in-place and returns it, as required by LangGraph node conventions.
     """
     log_event("REFLECT_SEGMENT", "Starting self-reflection on segments.")
-    doc1_analysis = state.doc1_analysis
-    doc2_analysis = state.doc2_analysis
-    doc1_segment_actions, doc2_segment_actions = [], []
+    analyses = {"doc1": state.doc1_analysis, "doc2": state.doc2_analysis}
+    previous = {"doc1": state.doc1_segment_actions, "doc2": state.doc2_segment_actions}
+    attempts = {"doc1": state.doc1_segment_attempts, "doc2": state.doc2_segment_attempts}
+    pending = pending_segment_indices(analyses, previous)
+    actions = {}
+    for doc in analyses:
+        count = len(analyses[doc])
+        actions[doc] = list(previous[doc][:count]) + [None] * (count - len(previous[doc][:count]))
+    max_attempts = load_config().max_segment_attempts
     meta_log = {"doc1": [], "doc2": []}
-    # Reflect on doc1 segments
-    for i, analysis in enumerate(doc1_analysis):
-        reflection = await reflect_on_segment(analysis, i, doc_label="doc1")
-        reflection = SegmentAction(**reflection)
-        doc1_segment_actions.append(reflection)
-        meta_log["doc1"].append({"segment": i, "success": reflection.success, "reasoning": reflection.reasoning})
-    # Reflect on doc2 segments
-    for i, analysis in enumerate(doc2_analysis):
-        reflection = await reflect_on_segment(analysis, i, doc_label="doc2")
-        reflection = SegmentAction(**reflection)
-        doc2_segment_actions.append(reflection)
-        meta_log["doc2"].append({"segment": i, "success": reflection.success, "reasoning": reflection.reasoning})
-    state.doc1_segment_actions = doc1_segment_actions
-    state.doc2_segment_actions = doc2_segment_actions
+    # Reflections for both documents share one scheduler queue; gather keeps results in order
+    jobs = [(doc, i, analyses[doc][i]) for doc in ("doc1", "doc2") for i in pending[doc]]
+    results, stats = await run_reflection_jobs(jobs, load_config().batching)
+    meta_log.update(stats)
+    for (doc, i, _), reflection in zip(jobs, results):
+        reflection = to_segment_action(reflection, attempts[doc][i] if i < len(attempts[doc]) else 1, max_attempts)
+        actions[doc][i] = reflection
+        meta_log[doc].append({"segment": i, "success": reflection.success, "reasoning": reflection.reasoning, "rule": reflection.rule})
+    state.doc1_segment_actions = actions["doc1"]
+    state.doc2_segment_actions = actions["doc2"]
+    meta_log["scheduler"] = get_scheduler().stats()
     state.meta['reflect_segment'] = meta_log
+    state.meta['llm_cache'] = llm_cache_stats()
+    state.meta['llm_pool'] = llm_pool_stats()
     log_event("REFLECT_SEGMENT", "Self-reflection on segments successful.")
     return state 
\ No newline at end of file
@@ -0,0 +1,99 @@
+import asyncio
+import re
+from concurrent.futures import ProcessPoolExecutor
+from ldaa.agents.config import load_config
+from ldaa.agents.ingest_documents import PdfPageStream, get_ingest_cache, missing_path_result
+from ldaa.agents.decide_segmentation import segment_document, enrich_segments
+from ldaa.utils.logging import log_event, log_error
+from ldaa.utils.usage import tracks_usage
+
+# A line ending in sentence/clause punctuation is a safe place to cut a batch
+BATCH_BOUNDARY = re.compile(r"[.;:]\s*(?:\n|\Z)")
+
+def split_at_boundary(buffer):
+    """
+    Splits buffered text at its last safe boundary, so a paragraph or article that
+    continues on the next page is carried over instead of being cut in two.
+    Returns (batch_text, carry_over).
+    """
+    last = None
+    for last in BATCH_BOUNDARY.finditer(buffer):
+        pass
+    if last is None:
+        return buffer, ""
+    return buffer[:last.end()], buffer[last.end():]
+
+async def segment_page_stream(pages, doc_label="doc", pages_per_batch=10):
+    """
+    Consumes an async iterator of page texts and starts a segmentation call for every
+    `pages_per_batch` completed pages, while later pages are still arriving.
+    Returns (raw_segments, meta) with segments in document order.
+    """
+    tasks = []
+    buffer = ""
+    buffered_pages = 0
+    first_page = True
+    async for page in pages:
+        buffer += page if first_page else "\n" + page
+        first_page = False
+        buffered_pages += 1
+        if buffered_pages >= pages_per_batch:
+            batch, buffer = split_at_boundary(buffer)
+            if batch.strip():
+                tasks.append(asyncio.create_task(segment_document(batch, doc_label=doc_label)))
+            buffered_pages = 0
+    if buffer.strip():
+        tasks.append(asyncio.create_task(segment_document(buffer, doc_label=doc_label)))
+    if not tasks:
+        return [], {"success": False, "reasoning": "No text provided"}
+    results = await asyncio.gather(*tasks)
+    segments = [seg for batch_segments, _ in results for seg in batch_segments]
+    meta = {
+        "num_segments": len(segments),
+        "success": all(batch_meta["success"] for _, batch_meta in results),
+        "reasoning": [reason for _, batch_meta in results for reason in batch_meta["reasoning"]],
+        "batches": len(results),
+    }
+    return segments, meta
+
+async def ingest_and_segment_document(pdf_path, doc_label, cache, executor, ingest_config, segmentation_config):
+    if not pdf_path:
+        text, meta = missing_path_result()
+        return text, meta, [], {"success": False, "reasoning": "No text provided"}
+    stream = PdfPageStream(pdf_path, cache, executor, ingest_config.pages_per_task)
+    segments_raw, segmentation_meta = await segment_page_stream(stream, doc_label, segmentation_config.stream_pages_per_batch)
+    text, ingest_meta = stream.result()
+    return text, ingest_meta, enrich_segments(segments_raw, doc_label, text), segmentation_meta
+
+@tracks_usage("ingest_and_segment")
+async def ingest_and_segment(state, config, store):
+    """
+    Agentic node: streaming replacement for ingest_documents + decide_segmentation.
+    Pages of both documents are extracted concurrently and segmented in page batches as
+    they complete, so extraction and LLM latency overlap. Produces the same state fields,
+    segment ordering and `position` numbering as the batch path.
+    Updates the state in-place and returns it, as required by LangGraph node conventions.
+    """
+    log_event("INGEST", "Starting streaming ingestion and segmentation.")
+    settings = load_config()
+    cache = get_ingest_cache(settings.ingest)
+    executor = ProcessPoolExecutor(max_workers=settings.ingest.max_workers) if settings.ingest.parallel else None
+    try:
+        doc1, doc2 = await asyncio.gather(
+            ingest_and_segment_document(state.doc1_path, "doc1", cache, executor, settings.ingest, settings.segmentation),
+            ingest_and_segment_document(state.doc2_path, "doc2", cache, executor, settings.ingest, settings.segmentation),
+        )
+    except Exception as e:
+        log_error(str(e), context="ingest_and_segment")
+        raise
+    finally:
+        if executor is not None:
+            await asyncio.to_thread(executor.shutdown)
+    state.doc1_text, ingest_meta1, state.doc1_segments, segmentation_meta1 = doc1
+    state.doc2_text, ingest_meta2, state.doc2_segments, segmentation_meta2 = doc2
+    state.meta['ingest'] = {"doc1": ingest_meta1, "doc2": ingest_meta2}
+    if cache is not None:
+        state.meta['ingest']["cache"] = cache.stats()
+    state.meta['segmentation'] = {"doc1": segmentation_meta1, "doc2": segmentation_meta2}
+    log_event("SEGMENTATION", "Streaming ingestion and segmentation successful.")
+    return state
@@ -0,0 +1,126 @@
+"""
+Deterministic pre-segmentation for Mexican legislative texts.
+
+Laws and decrees follow a regular layout: TÍTULO / CAPÍTULO / SECCIÓN headings group
+numbered articles ("Artículo 12.-", "Artículo Único."), and the transitory regime lists
+ordinal articles ("Primero.", "Segundo.-") under a TRANSITORIOS heading. `presegment`
+detects these markers and turns each article into a segment directly. Stretches it cannot
+classify (e.g. a long EXPOSICIÓN DE MOTIVOS) are returned as regions for the LLM.
+"""
+import re
+
+ROMAN = r"[IVXLCDM]+"
+ORDINALS = (
+    r"PRIMERO|SEGUNDO|TERCERO|CUARTO|QUINTO|SEXTO|S[EÉ]PTIMO|OCTAVO|NOVENO|D[EÉ]CIMO"
+    r"(?:\s+(?:PRIMERO|SEGUNDO|TERCERO|CUARTO|QUINTO|SEXTO|S[EÉ]PTIMO|OCTAVO|NOVENO))?|[ÚU]NICO"
+)
+NUMBER = rf"(?:\d+[º°o]?(?:\s*(?:bis|ter|qu[aá]ter))?|{ROMAN}|{ORDINALS})"
+
+# Container headings: TÍTULO I, CAPÍTULO II, SECCIÓN PRIMERA... on a line of their own
+CONTAINER_HEADING = re.compile(
+    rf"^(?P<label>T[IÍ]TULO|CAP[IÍ]TULO|SECCI[OÓ]N)\s+(?P<number>{NUMBER}|PRIMERA|SEGUNDA|TERCERA|CUARTA|QUINTA|[ÚU]NICA)\b[^\n]{{0,100}}$",
+    re.IGNORECASE,
+)
+# Document-level section breaks written in capitals
+SECTION_BREAK = re.compile(
+    r"^(?P<label>EXPOSICI[OÓ]N DE MOTIVOS|CONSIDERANDOS?|ANTECEDENTES|PROYECTO DE DECRETO|DECRETO|TRANSITORIOS?|ART[IÍ]CULOS TRANSITORIOS)\b[^\n]{0,100}$"
+)
+ARTICLE_HEADING = re.compile(
+    rf"^(?P<label>Art[ií]culo|ART[IÍ]CULO|Art\.)\s+(?P<number>{NUMBER})\s*(?:\.\s*-|\.-|\.|-|–|:)",
+    re.IGNORECASE,
+)
+# Ordinal articles ("Primero.-") only count as headings inside a transitory regime
+TRANSITORY_ARTICLE = re.compile(rf"^(?P<number>{ORDINALS})\s*(?:\.\s*-|\.-|\.|-|–|:)", re.IGNORECASE)
+
+def _detect_headings(text):
+    """Returns (offset, kind, label) for every heading line, in document order."""
+    headings = []
+    in_transitory = False
+    offset = 0
+    for line in text.splitlines(keepends=True):
+        stripped = line.strip()
+        start = offset + (len(line) - len(line.lstrip()))
+        offset += len(line)
+        if not stripped:
+            continue
+        match = SECTION_BREAK.match(stripped)
+        if match:
+            in_transitory = "TRANSITORI" in match.group("label").upper()
+            headings.append((start, "section", stripped))
+            continue
+        match = CONTAINER_HEADING.match(stripped)
+        if match:
+            headings.append((start, match.group("label").upper(), stripped))
+            continue
+        match = ARTICLE_HEADING.match(stripped)
+        if match:
+            headings.append((start, "article", f"Artículo {match.group('number')}"))
+            continue
+        if in_transitory:
+            match = TRANSITORY_ARTICLE.match(stripped)
+            if match:
+                headings.append((start, "article", f"Transitorio {match.group('number').capitalize()}"))
+    return headings
+
+def presegment(text, min_articles=3, fallback_min_chars=400):
+    """
+    Splits a legal document along its structural markers.
+    Returns an ordered list of pieces covering the whole text, each either
+      {"kind": "segment", "title", "text", "segment_type", "reasoning"} for units the rules
+      classified, or
+      {"kind": "llm", "title", "text"} for regions that should be segmented by the LLM.
+    When fewer than `min_articles` articles are found the document is not considered
+    well-formed and is returned as a single LLM region.
+    """
+    headings = _detect_headings(text)
+    if sum(1 for _, kind, _ in headings if kind == "article") < min_articles:
+        return [{"kind": "llm", "title": "", "text": text}] if text.strip() else []
+    context = {}  # Current TÍTULO / CAPÍTULO / SECCIÓN / document section
+    pieces = []
+    pending_start = 0  # Heading-only units are folded into the unit that follows
+    boundaries = headings + [(len(text), "end", "")]
+    if boundaries[0][0] > 0:
+        boundaries.insert(0, (0, "preamble", ""))
+    for (start, kind, label), (end, _, _) in zip(boundaries, boundaries[1:]):
+        if kind == "section":
+            context = {"section": label}
+        elif kind in ("TÍTULO", "TITULO"):
+            context = {k: v for k, v in context.items() if k == "section"}
+            context["title"] = label
+        elif kind in ("CAPÍTULO", "CAPITULO"):
+            context.pop("chapter_section", None)
+            context["chapter"] = label
+        elif kind in ("SECCIÓN", "SECCION"):
+            context["chapter_section"] = label
+        path = " > ".join(context[k] for k in ("section", "title", "chapter", "chapter_section") if k in context)
+        unit = text[pending_start:end].strip()
+        if kind == "preamble":
+            body = unit
+        else:
+            body = text[start:end].split("\n", 1)[1].strip() if "\n" in text[start:end] else ""
+        if kind == "article":
+            pieces.append({
+                "kind": "segment",
+                "title": f"{path} > {label}" if path else label,
+                "text": unit,
+                "segment_type": "article",
+                "reasoning": "Rule-based: article heading detected.",
+            })
+        elif len(body) < fallback_min_chars and end < len(text):
+            continue  # Heading or short preamble: keep it with the next unit
+        elif not unit:
+            pass
+        elif len(unit) < fallback_min_chars:
+            pieces.append({
+                "kind": "segment",
+                "title": path or label,
+                "text": unit,
+                "segment_type": "section",
+                "reasoning": "Rule-based: short unstructured region kept as a single segment.",
+            })
+        elif pieces and pieces[-1]["kind"] == "llm":
+            pieces[-1]["text"] += "\n" + unit  # Adjacent unclassified regions share one LLM call
+        else:
+            pieces.append({"kind": "llm", "title": path or label, "text": unit})
+        pending_start = end
+    return pieces
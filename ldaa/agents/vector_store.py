@@ -1,53 +1,62 @@
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import OpenAIEmbeddings  # or your preferred embedding model
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-import os
+from ldaa.agents.config import load_config
+from ldaa.agents.embeddings import embedding_spec, embeddings_from_spec, get_embeddings
 from ldaa.schemas import DocumentSegment  # Add this import
+from ldaa.utils.corpus_index import CorpusIndex
+from ldaa.utils.logging import log_event
 
-# Agent node: Save all segments from both documents into a FAISS vector store
+def document_source(state, doc_num, segments):
+    """Key a document's chunks are filed under: its path, so re-runs of a file replace its chunks."""
+    path = getattr(state, f"doc{doc_num}_path", None)
+    if path:
+        return str(path)
+    return segments[0].document_id if segments else f"doc{doc_num}"
+
+# Agent node: Save all segments from both documents into the persistent corpus index
 def save_segments_to_faiss(state):
     """
-    Agent node: Save all segments from both documents into a FAISS vector store.
+    Agent node: Save all segments from both documents into the FAISS corpus index.
     Expects state.doc1_segments and state.doc2_segments to be lists of DocumentSegment objects.
+    The index persists across runs (see ldaa.utils.corpus_index): only chunks never seen
+    before are embedded, chunks a document no longer contains are tombstoned, and the
+    result is saved as a new generation atomically. Chunks are embedded with the backend
+    selected under `embeddings:` in config.yaml.
     """
-    embeddings = OpenAIEmbeddings()  # configure as needed
+    settings = load_config().vector_store
+    splitter = RecursiveCharacterTextSplitter(chunk_size=settings.chunk_size, chunk_overlap=settings.chunk_overlap)
 
-    all_segments = []
-    metadatas = []
+    sources = {}
+    segment_count = 0
     for doc_num, doc_segments in enumerate([getattr(state, "doc1_segments", []), getattr(state, "doc2_segments", [])], start=1):
+        chunks = []
         for i, seg in enumerate(doc_segments):
             # seg is a DocumentSegment instance
-            all_segments.append(seg.text)
-            metadatas.append({
+            meta = {
                 "doc": doc_num,
                 "segment_id": seg.id,
-                "title": getattr(seg, "title", f"Doc{doc_num} Segment {i}"),
+                "title": seg.title or f"Doc{doc_num} Segment {i}",
                 "document_id": seg.document_id,
                 "segment_type": seg.segment_type,
                 "position": seg.position,
-            })
-
-    splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    docs = []
-    doc_metas = []
-    for text, meta in zip(all_segments, metadatas):
-        for chunk in splitter.split_text(text):
-            docs.append(chunk)
-            doc_metas.append(meta)
+            }
+            chunks += [(chunk, meta) for chunk in splitter.split_text(seg.text)]
+        segment_count += len(doc_segments)
+        if doc_segments:
+            sources[document_source(state, doc_num, doc_segments)] = chunks
 
-    persist_dir = "vector_db"
-    os.makedirs(persist_dir, exist_ok=True)
-    vectorstore = FAISS.from_texts(docs, embeddings, metadatas=doc_metas)
-    vectorstore.save_local(persist_dir)
+    index = CorpusIndex(settings.path, settings.compact_ratio, settings.keep_generations)
+    sync_stats = index.sync(sources, get_embeddings(), embedding_spec())
+    index.save()
+    log_event("VECTOR_STORE", "Corpus index updated.", **sync_stats)
 
-    # Save only the count of segments in the output
-    state.vector_db_path = persist_dir
-    state.vector_store_output = {"segment_count": len(all_segments)}
+    # Save only the counts in the output
+    state.vector_db_path = settings.path
+    state.vector_store_output = {"segment_count": segment_count, **sync_stats, **index.stats()}
     return state
 
 # Function to query the vector database
 def query_vector_db(query, db_path="vector_db", k=3):
-    embeddings = OpenAIEmbeddings()
-    vectorstore = FAISS.load_local(db_path, embeddings)
-    results = vectorstore.similarity_search(query, k=k)
-    return results 
\ No newline at end of file
+    index = CorpusIndex(db_path)
+    # Query with the embedder the index was built with
+    embeddings = embeddings_from_spec(index.spec) if index.spec else get_embeddings()
+    return index.search(query, embeddings, k=k)
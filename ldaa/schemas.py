@@ -9,6 +9,7 @@ class DocumentSegment(BaseModel):
     segment_type: Literal["paragraph", "article", "section"]
     position: int
     reasoning: Optional[str] = None  # A short explanation of the reasoning for the chosen segment_type
+    title: Optional[str] = None  # Heading or structural path (e.g. "TÍTULO I > Artículo 3"), if known
 
 class SegmentAnalysis(BaseModel):
     """Analysis of a single document segment."""
@@ -48,6 +49,7 @@ class SegmentAction(BaseModel):
     confidence: float
     reasoning: str
     success: bool = True
+    rule: Optional[str] = None  # Local pre-reflection rule that decided the action, if any
     # Add other fields as needed
 
 class ComparisonAction(BaseModel):
@@ -55,6 +57,7 @@ class ComparisonAction(BaseModel):
     confidence: float
     reasoning: str
     success: bool = True
+    deficient_parts: List[str] = []  # Fields ('gaps', 'focus_areas', ...) or 'category:<name>' to redo on retry/reboot
     # Add other fields as needed
 
 class LegalAnalysisState(BaseModel):
@@ -68,9 +71,15 @@ class LegalAnalysisState(BaseModel):
     doc2_analysis: List[SegmentAnalysis] = Field(default_factory=list)
     doc1_segment_actions: List[SegmentAction] = Field(default_factory=list)
     doc2_segment_actions: List[SegmentAction] = Field(default_factory=list)
+    doc1_segment_attempts: List[int] = Field(default_factory=list)  # Analyses run per segment index
+    doc2_segment_attempts: List[int] = Field(default_factory=list)
+    segment_clusters: Dict[str, str] = Field(default_factory=dict)  # segment_id -> id of its duplicate-cluster representative
     doc1_accepted_segments: List[SegmentAnalysis] = Field(default_factory=list)
     doc2_accepted_segments: List[SegmentAnalysis] = Field(default_factory=list)
+    segment_alignment: Dict[str, Any] = Field(default_factory=dict)  # {"pairs": [{doc1, doc2, score}], "unmatched": {doc1, doc2}}
+    comparison_partials: Dict[str, Dict[str, Any]] = Field(default_factory=dict)  # category -> map-reduce partial comparison
     comparison_result: Optional[DocumentComparison] = None
+    comparison_attempts: int = 0  # compare_documents runs so far
     comparison_action: Optional[ComparisonAction] = None
     output_path: Optional[str] = None
     meta: Dict[str, Any] = Field(default_factory=dict)
@@ -0,0 +1,69 @@
+"""
+Segment alignment between two documents from their embeddings.
+
+`cosine_similarity_matrix` builds the doc1 x doc2 similarity matrix in one vectorized step;
+`align` then picks pairs from it:
+    - "hungarian": one-to-one assignment maximizing total similarity (scipy's
+      linear_sum_assignment), keeping only pairs at or above the threshold
+    - "greedy": one-to-one, best remaining pair first, until no pair reaches the threshold
+    - "many_to_one": every doc1 row goes to its best doc2 column at or above the threshold
+Rows and columns left without a pair are returned as unmatched (candidate gaps).
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+METHODS = ("hungarian", "greedy", "many_to_one")
+
+def cosine_similarity_matrix(a, b) -> np.ndarray:
+    """(len(a), len(b)) cosine similarities between the rows of two embedding matrices."""
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    if a.size == 0 or b.size == 0:
+        return np.zeros((len(a), len(b)), dtype=np.float32)
+    a = a / np.maximum(np.linalg.norm(a, axis=1, keepdims=True), 1e-12)
+    b = b / np.maximum(np.linalg.norm(b, axis=1, keepdims=True), 1e-12)
+    return a @ b.T
+
+def _hungarian(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    rows, cols = linear_sum_assignment(similarity, maximize=True)
+    return [(int(i), int(j)) for i, j in zip(rows, cols) if similarity[i, j] >= threshold]
+
+def _greedy(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    order = np.argsort(similarity, axis=None)[::-1]
+    used_rows, used_cols, pairs = set(), set(), []
+    for flat in order:
+        i, j = np.unravel_index(flat, similarity.shape)
+        if similarity[i, j] < threshold:
+            break
+        if i not in used_rows and j not in used_cols:
+            used_rows.add(i)
+            used_cols.add(j)
+            pairs.append((int(i), int(j)))
+    return sorted(pairs)
+
+def _many_to_one(similarity: np.ndarray, threshold: float) -> List[Tuple[int, int]]:
+    best = similarity.argmax(axis=1)
+    scores = similarity[np.arange(len(best)), best]
+    return [(int(i), int(best[i])) for i in np.flatnonzero(scores >= threshold)]
+
+def align(similarity: np.ndarray, method: str = "hungarian", threshold: float = 0.75) -> Dict[str, list]:
+    """
+    Returns {"pairs": [(i, j, score)], "unmatched_rows": [i], "unmatched_cols": [j]} for a
+    doc1 x doc2 similarity matrix, using one of METHODS.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown alignment method '{method}', expected one of {METHODS}")
+    similarity = np.asarray(similarity, dtype=np.float32)
+    pairs = []
+    if similarity.size:
+        solver = {"hungarian": _hungarian, "greedy": _greedy, "many_to_one": _many_to_one}[method]
+        pairs = solver(similarity, threshold)
+    matched_rows = {i for i, _ in pairs}
+    matched_cols = {j for _, j in pairs}
+    return {
+        "pairs": [(i, j, round(float(similarity[i, j]), 4)) for i, j in pairs],
+        "unmatched_rows": [i for i in range(similarity.shape[0]) if i not in matched_rows],
+        "unmatched_cols": [j for j in range(similarity.shape[1]) if j not in matched_cols],
+    }
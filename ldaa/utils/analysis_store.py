@@ -0,0 +1,219 @@
+"""
+Columnar store for segment analyses and their actions.
+
+Each run is one NumPy structured array (one row per analyzed segment) saved as
+`<root>/runs/<run_id>.npy`, written atomically, so runs append without rewriting earlier
+data. `compact()` merges run files into larger partitions for fleet-level queries over
+thousands of runs. Everything downstream works on whole columns:
+
+    table = store.load()
+    low = filter_rows(table, max_confidence=0.5, action="mark_review")
+    by_category = group_stats(table, "category")
+"""
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+RUN_ID_CHARS = 64
+
+ANALYSIS_DTYPE = np.dtype([
+    ("run_id", f"U{RUN_ID_CHARS}"),
+    ("timestamp", "f8"),
+    ("doc", "U8"),
+    ("segment_index", "i4"),
+    ("segment_id", "U64"),
+    ("category", "U48"),
+    ("confidence", "f4"),
+    ("action", "U16"),
+    ("action_confidence", "f4"),
+    ("attempts", "i2"),
+    ("success", "?"),
+    ("rule", "U32"),
+])
+ACTIONS = ("accept", "retry", "mark_review")
+
+def run_key(run_id: str) -> str:
+    """
+    The run id as stored (column value and file name). Ids that fit the column, e.g.
+    LangGraph thread UUIDs, are kept as is; longer ones are replaced by their SHA-256, so
+    NumPy never silently truncates them.
+    """
+    run_id = str(run_id)
+    if len(run_id) <= RUN_ID_CHARS:
+        return run_id
+    return hashlib.sha256(run_id.encode("utf-8")).hexdigest()
+
+def build_table(run_id: str, docs: Dict[str, tuple], timestamp: float = None) -> np.ndarray:
+    """
+    One row per analysis. `docs` maps doc label -> (analyses, actions, attempts); rows
+    without an action yet get action "".
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    run_id = run_key(run_id)
+    rows = []
+    for doc, (analyses, actions, attempts) in docs.items():
+        for i, analysis in enumerate(analyses):
+            if analysis is None:
+                continue
+            action = actions[i] if i < len(actions) else None
+            rows.append((
+                run_id, timestamp, doc, i, analysis.segment_id, analysis.category,
+                analysis.confidence or 0.0,
+                action.action if action else "",
+                action.confidence if action else 0.0,
+                attempts[i] if i < len(attempts) else 0,
+                bool(getattr(analysis, "success", True)),
+                (action.rule or "") if action else "",
+            ))
+    return np.array(rows, dtype=ANALYSIS_DTYPE)
+
+def filter_rows(
+    table: np.ndarray,
+    category: Optional[str] = None,
+    action: Optional[str] = None,
+    doc: Optional[str] = None,
+    min_confidence: Optional[float] = None,
+    max_confidence: Optional[float] = None,
+    runs: Optional[Iterable[str]] = None,
+) -> np.ndarray:
+    """Rows matching every given condition (a boolean mask over whole columns)."""
+    mask = np.ones(len(table), dtype=bool)
+    if category is not None:
+        mask &= table["category"] == category
+    if action is not None:
+        mask &= table["action"] == action
+    if doc is not None:
+        mask &= table["doc"] == doc
+    if min_confidence is not None:
+        mask &= table["confidence"] >= min_confidence
+    if max_confidence is not None:
+        mask &= table["confidence"] <= max_confidence
+    if runs is not None:
+        mask &= np.isin(table["run_id"], [run_key(run) for run in runs])
+    return table[mask]
+
+def count_by(table: np.ndarray, column: str) -> Dict[str, int]:
+    keys, counts = np.unique(table[column], return_counts=True)
+    return {str(key): int(count) for key, count in zip(keys, counts)}
+
+def group_stats(table: np.ndarray, by: str = "category") -> Dict[str, dict]:
+    """
+    Per-group statistics: row count, confidence mean/min/max, and the rate of each action.
+    Grouping is one np.unique pass plus bincounts, independent of the number of runs.
+    """
+    if len(table) == 0:
+        return {}
+    keys, inverse, counts = np.unique(table[by], return_inverse=True, return_counts=True)
+    confidence = table["confidence"].astype(np.float64)
+    sums = np.bincount(inverse, weights=confidence, minlength=len(keys))
+    minimums = np.full(len(keys), np.inf)
+    maximums = np.full(len(keys), -np.inf)
+    np.minimum.at(minimums, inverse, confidence)
+    np.maximum.at(maximums, inverse, confidence)
+    rates = {
+        action: np.bincount(inverse, weights=table["action"] == action, minlength=len(keys)) / counts
+        for action in ACTIONS
+    }
+    return {
+        str(key): {
+            "count": int(counts[k]),
+            "mean_confidence": round(float(sums[k] / counts[k]), 4),
+            "min_confidence": round(float(minimums[k]), 4),
+            "max_confidence": round(float(maximums[k]), 4),
+            **{f"{action}_rate": round(float(rates[action][k]), 4) for action in ACTIONS},
+        }
+        for k, key in enumerate(keys)
+    }
+
+def confidence_histogram(table: np.ndarray, bins: int = 10) -> Dict[str, List]:
+    counts, edges = np.histogram(table["confidence"], bins=bins, range=(0.0, 1.0))
+    return {"edges": [round(float(edge), 4) for edge in edges], "counts": counts.tolist()}
+
+def low_confidence_hotspots(table: np.ndarray, threshold: float, by: str = "category", min_count: int = 1) -> List[dict]:
+    """Groups ranked by their share of rows below `threshold` (most affected first)."""
+    if len(table) == 0:
+        return []
+    keys, inverse, counts = np.unique(table[by], return_inverse=True, return_counts=True)
+    low = np.bincount(inverse, weights=table["confidence"] < threshold, minlength=len(keys))
+    share = low / counts
+    order = np.argsort(-share, kind="stable")
+    return [
+        {by: str(keys[k]), "count": int(counts[k]), "low_confidence": int(low[k]), "share": round(float(share[k]), 4)}
+        for k in order if counts[k] >= min_count and low[k] > 0
+    ]
+
+def _read(path) -> np.ndarray:
+    # Files written with an older column layout are widened to the current one
+    return np.load(path, allow_pickle=False).astype(ANALYSIS_DTYPE, copy=False)
+
+class AnalysisStore:
+    """Append-only directory of per-run structured arrays, with a query API over all runs."""
+    def __init__(self, root):
+        self.root = Path(root)
+        self.runs_dir = self.root / "runs"
+        self.parts_dir = self.root / "parts"
+
+    def append(self, run_id: str, table: np.ndarray) -> Path:
+        """Writes (or replaces) the table of one run; the file appears atomically."""
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        path = self.runs_dir / f"{run_key(run_id)}.npy"
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, table.astype(ANALYSIS_DTYPE, copy=False), allow_pickle=False)
+        os.replace(tmp, path)
+        return path
+
+    def load(self, runs: Optional[Iterable[str]] = None) -> np.ndarray:
+        """All rows (optionally only `runs`) as one structured array; later writes of a run win."""
+        run_files = sorted(self.runs_dir.glob("*.npy")) if self.runs_dir.exists() else []
+        part_files = sorted(self.parts_dir.glob("*.npy")) if self.parts_dir.exists() else []
+        rewritten = [path.stem for path in run_files]
+        tables = []
+        for path in part_files:
+            part = _read(path)
+            tables.append(part[~np.isin(part["run_id"], rewritten)] if rewritten else part)
+        tables += [_read(path) for path in run_files]
+        if not tables:
+            return np.empty(0, dtype=ANALYSIS_DTYPE)
+        table = np.concatenate(tables)
+        if runs is not None:
+            table = table[np.isin(table["run_id"], [run_key(run) for run in runs])]
+        return table
+
+    def run_ids(self) -> List[str]:
+        return [str(run) for run in np.unique(self.load()["run_id"])]
+
+    def compact(self) -> Optional[Path]:
+        """Merges the per-run files into one partition, so loading stays a few large reads."""
+        run_files = sorted(self.runs_dir.glob("*.npy")) if self.runs_dir.exists() else []
+        if not run_files:
+            return None
+        merged_runs = {path.stem for path in run_files}
+        table = np.concatenate([_read(path) for path in run_files])
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        # Rows of re-written runs in older partitions are superseded by the new partition
+        for part in sorted(self.parts_dir.glob("*.npy")):
+            old = _read(part)
+            keep = ~np.isin(old["run_id"], list(merged_runs))
+            if not keep.all():
+                self._write_part(part, old[keep])
+        index = len(list(self.parts_dir.glob("*.npy")))
+        path = self._write_part(self.parts_dir / f"part-{index:05d}.npy", table)
+        for run_file in run_files:
+            run_file.unlink()
+        return path
+
+    def _write_part(self, path: Path, table: np.ndarray) -> Path:
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, table, allow_pickle=False)
+        os.replace(tmp, path)
+        return path
+
+    def stats(self, by: str = "category", **filters) -> Dict[str, dict]:
+        """Fleet-level `group_stats` over every stored run, after `filter_rows(**filters)`."""
+        return group_stats(filter_rows(self.load(), **filters), by)
@@ -0,0 +1,61 @@
+"""
+Helpers for packing several segments into one LLM prompt and reading the answers back.
+
+A batched response is a JSON array with one object per segment, keyed by an id field.
+Entries that are missing, duplicated or not objects are left out of the index so the
+caller can re-queue those segments on their own.
+"""
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence
+
+def pack_batches(
+    items: Sequence[Any],
+    cost: Callable[[Any], int],
+    max_tokens: int,
+    max_items: int,
+    key: Optional[Callable[[Any], Hashable]] = None,
+) -> List[List[Any]]:
+    """
+    Greedily groups `items`, in order, into batches whose summed `cost` stays within
+    `max_tokens` and that hold at most `max_items` items. An item costing more than the
+    budget gets a batch of its own. If `key` is given, a batch never holds two items with
+    the same key, since the response could not tell them apart.
+    """
+    batches, current, current_cost, keys = [], [], 0, set()
+    for item in items:
+        item_cost = cost(item)
+        item_key = key(item) if key else None
+        if current and (
+            current_cost + item_cost > max_tokens
+            or len(current) >= max_items
+            or (key and item_key in keys)
+        ):
+            batches.append(current)
+            current, current_cost, keys = [], 0, set()
+        current.append(item)
+        current_cost += item_cost
+        keys.add(item_key)
+    if current:
+        batches.append(current)
+    return batches
+
+def index_batch_response(parsed: Any, id_field: str = "segment_id") -> Dict[str, Dict[str, Any]]:
+    """
+    Maps `id_field` -> entry for a parsed batched response. Accepts a bare array or an
+    object wrapping one (e.g. {"results": [...]}). Ids that appear more than once are
+    dropped as ambiguous.
+    """
+    if isinstance(parsed, dict):
+        parsed = next((v for v in parsed.values() if isinstance(v, list)), [parsed])
+    if not isinstance(parsed, list):
+        return {}
+    index, duplicates = {}, set()
+    for entry in parsed:
+        if not isinstance(entry, dict) or entry.get(id_field) is None:
+            continue
+        entry_id = str(entry[id_field])
+        if entry_id in index:
+            duplicates.add(entry_id)
+        index[entry_id] = entry
+    for entry_id in duplicates:
+        del index[entry_id]
+    return index
@@ -0,0 +1,201 @@
+"""
+On-disk caches shared by the workflow nodes.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+def cache_root() -> Path:
+    """Root directory for all LDAA caches (override with the LDAA_CACHE_DIR env var)."""
+    return Path(os.getenv("LDAA_CACHE_DIR", ".cache/ldaa"))
+
+def file_sha256(path, salt: str = "", chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, optionally salted (e.g. with an extractor version)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    digest.update(salt.encode("utf-8"))
+    return digest.hexdigest()
+
+class IngestCache:
+    """
+    Content-addressed cache of extracted PDF text.
+    Entries are keyed by SHA-256 of the PDF bytes plus the extractor version and store the
+    joined text with per-page (start, end) character offsets. The cache directory is kept
+    under `max_bytes` by evicting the least recently used entries (tracked via mtime).
+    """
+    def __init__(self, cache_dir, max_bytes: int, version: str):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key_for(self, pdf_path) -> str:
+        return file_sha256(pdf_path, salt=self.version)
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    @staticmethod
+    def _touch(path: Path) -> None:
+        # Explicit ns timestamps: filesystem mtimes can be too coarse to order accesses
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """Returns the cached page texts for `key`, or None on a miss."""
+        path = self._entry_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            self._touch(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        if entry.get("version") != self.version:
+            self.misses += 1
+            return None
+        self.hits += 1
+        text = entry["text"]
+        return [text[start:end] for start, end in entry["page_offsets"]]
+
+    def put(self, key: str, page_texts: List[str]) -> None:
+        offsets, cursor = [], 0
+        for page in page_texts:
+            offsets.append((cursor, cursor + len(page)))
+            cursor += len(page) + 1  # Pages are joined with "\n"
+        entry = {"version": self.version, "text": "\n".join(page_texts), "page_offsets": offsets}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._entry_path(key)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}-{threading.get_ident()}")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._touch(path)
+        self.evict()
+
+    def evict(self) -> None:
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda e: e[0]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+def normalize_prompt(prompt) -> str:
+    """Canonical form of a prompt for cache keys: trailing spaces and blank-line runs removed."""
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, default=str, sort_keys=True, ensure_ascii=False)
+    lines = [line.rstrip() for line in prompt.strip().splitlines()]
+    normalized = []
+    for line in lines:
+        if line or (normalized and normalized[-1]):
+            normalized.append(line)
+    return "\n".join(normalized)
+
+class LLMResponseCache:
+    """
+    SQLite-backed cache of LLM response texts, keyed by SHA-256 of the model name, the
+    normalized prompt and the call parameters. Entries older than `ttl_seconds` are treated
+    as misses and dropped; above `max_entries` the least recently used entries are evicted.
+    Every operation opens its own connection, so one instance can be shared across threads.
+    """
+    def __init__(self, path, ttl_seconds: Optional[float] = None, max_entries: int = 50000):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, content TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:  # Commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key_for(model: str, prompt, params: Optional[Dict] = None) -> str:
+        payload = json.dumps(
+            {"model": model, "prompt": normalize_prompt(prompt), "params": params or {}},
+            sort_keys=True, default=str, ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT content, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, content: str, model: str = "") -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now),
+            )
+            self._evict(conn, now)
+
+    def _evict(self, conn, now: float) -> None:
+        if self.ttl_seconds is not None:
+            self.evictions += conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        excess = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.evictions += conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)", (excess,)
+            ).rowcount
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
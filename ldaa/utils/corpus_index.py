@@ -0,0 +1,218 @@
+"""
+Incremental, persistent FAISS index over document chunks.
+
+Chunks are keyed by the SHA-256 of their text, so the same text is embedded once no matter
+how many runs or documents contain it. Each source (a document) owns a set of chunk keys:
+`sync` replaces that set, embeds only chunks the index has never seen, and tombstones
+chunks no source refers to any more. Tombstoned vectors stay in the FAISS index (and are
+filtered from results) until `compact()` removes them, which happens automatically once
+they make up `compact_ratio` of the index; a tombstoned chunk that reappears is revived
+without re-embedding.
+
+On disk every save is a new generation directory, written under a temporary name,
+renamed, and only then published by atomically replacing the `CURRENT` pointer file:
+
+    <root>/CURRENT                  name of the live generation
+    <root>/gen-000042/index.faiss   IndexIDMap2(IndexFlatIP) over L2-normalized vectors
+    <root>/gen-000042/manifest.json chunk texts, sources, ids, tombstones, embedder spec
+
+A crash at any point leaves the previous generation live. Older generations beyond
+`keep_generations` are deleted after a successful save. One writer per root is assumed.
+"""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+CURRENT_FILE = "CURRENT"
+INDEX_FILE = "index.faiss"
+MANIFEST_FILE = "manifest.json"
+MANIFEST_VERSION = 1
+
+def chunk_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _vectors(embeddings, texts: List[str]) -> np.ndarray:
+    vectors = np.ascontiguousarray(np.asarray(embeddings.embed_documents(texts), dtype=np.float32))
+    faiss.normalize_L2(vectors)
+    return vectors
+
+class CorpusIndex:
+    """Content-addressed chunk index that is updated in place and saved as generations."""
+    def __init__(self, root, compact_ratio: float = 0.25, keep_generations: int = 2):
+        self.root = Path(root)
+        self.compact_ratio = compact_ratio
+        self.keep_generations = keep_generations
+        self.generation = 0
+        self.spec: Optional[dict] = None
+        self.next_id = 0
+        self.chunks: Dict[str, dict] = {}  # key -> {"id", "text", "sources": {source: metadata}}
+        self.tombstones: Dict[str, int] = {}  # key -> vector id still in the index
+        self.index = None
+        self._load()
+
+    # Persistence
+
+    def _load(self):
+        pointer = self.root / CURRENT_FILE
+        if not pointer.exists():
+            return
+        directory = self.root / pointer.read_text().strip()
+        with open(directory / MANIFEST_FILE) as f:
+            manifest = json.load(f)
+        self.generation = manifest["generation"]
+        self.spec = manifest["embeddings"]
+        self.next_id = manifest["next_id"]
+        self.chunks = manifest["chunks"]
+        self.tombstones = manifest["tombstones"]
+        if (directory / INDEX_FILE).exists():
+            self.index = faiss.read_index(str(directory / INDEX_FILE))
+
+    def save(self) -> Path:
+        """Writes a new generation and publishes it atomically; returns its directory."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        generation = self.generation + 1
+        name = f"gen-{generation:06d}"
+        tmp = self.root / f".{name}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        if self.index is not None:
+            faiss.write_index(self.index, str(tmp / INDEX_FILE))
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "generation": generation,
+            "embeddings": self.spec,
+            "next_id": self.next_id,
+            "chunks": self.chunks,
+            "tombstones": self.tombstones,
+        }
+        with open(tmp / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        directory = self.root / name
+        shutil.rmtree(directory, ignore_errors=True)  # Left over by a save that crashed before publishing
+        os.replace(tmp, directory)
+        pointer_tmp = self.root / f".{CURRENT_FILE}.{os.getpid()}.tmp"
+        pointer_tmp.write_text(name)
+        os.replace(pointer_tmp, self.root / CURRENT_FILE)
+        self.generation = generation
+        self._prune()
+        return directory
+
+    def _prune(self):
+        generations = sorted(self.root.glob("gen-*"))
+        for directory in generations[:-self.keep_generations]:
+            shutil.rmtree(directory, ignore_errors=True)
+        for tmp in self.root.glob(".gen-*.tmp"):
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    # Updates
+
+    def _reset(self, embeddings, spec):
+        """Re-embeds every live chunk with a different embedder (its vectors are incomparable)."""
+        live = list(self.chunks.items())
+        self.index, self.tombstones, self.next_id = None, {}, 0
+        self.spec = spec
+        if live:
+            for key, chunk in live:
+                chunk["id"] = self._next_id()
+            self._add(_vectors(embeddings, [chunk["text"] for _, chunk in live]), [chunk["id"] for _, chunk in live])
+
+    def _next_id(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def _add(self, vectors: np.ndarray, ids: List[int]):
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(vectors.shape[1]))
+        self.index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+
+    def sync(self, sources: Dict[str, List[Tuple[str, dict]]], embeddings, spec: dict) -> dict:
+        """
+        Makes each given source own exactly the given (text, metadata) chunks. Sources not
+        given are left untouched. Only chunks the index has never seen are embedded.
+        Returns counts of added, revived, kept and tombstoned chunks.
+        """
+        stats = {"added": 0, "revived": 0, "kept": 0, "tombstoned": 0, "reembedded": 0, "compacted": 0}
+        if self.spec is not None and self.spec != spec:
+            stats["reembedded"] = len(self.chunks)
+            self._reset(embeddings, spec)
+        self.spec = spec
+        new_texts, new_keys = [], []
+        for source, chunks in sources.items():
+            wanted = {}
+            for text, metadata in chunks:
+                wanted.setdefault(chunk_key(text), (text, metadata))
+            # Release the chunks this source no longer contains
+            for key, chunk in list(self.chunks.items()):
+                if source in chunk["sources"] and key not in wanted:
+                    del chunk["sources"][source]
+                    if not chunk["sources"]:
+                        self.tombstones[key] = chunk["id"]
+                        del self.chunks[key]
+                        stats["tombstoned"] += 1
+            for key, (text, metadata) in wanted.items():
+                if key in self.chunks:
+                    self.chunks[key]["sources"][source] = metadata
+                    stats["kept"] += 1
+                elif key in self.tombstones:
+                    self.chunks[key] = {"id": self.tombstones.pop(key), "text": text, "sources": {source: metadata}}
+                    stats["revived"] += 1
+                else:
+                    self.chunks[key] = {"id": self._next_id(), "text": text, "sources": {source: metadata}}
+                    new_keys.append(key)
+                    new_texts.append(text)
+        if new_texts:
+            self._add(_vectors(embeddings, new_texts), [self.chunks[key]["id"] for key in new_keys])
+            stats["added"] = len(new_texts)
+        if self.index is not None and self.tombstones and len(self.tombstones) >= self.compact_ratio * self.index.ntotal:
+            stats["compacted"] = self.compact()
+        return stats
+
+    def compact(self) -> int:
+        """Physically removes tombstoned vectors; returns how many were removed."""
+        if self.index is None or not self.tombstones:
+            return 0
+        removed = self.index.remove_ids(np.asarray(list(self.tombstones.values()), dtype=np.int64))
+        self.tombstones = {}
+        return int(removed)
+
+    # Queries
+
+    def search(self, query: str, embeddings, k: int = 3) -> List[Document]:
+        """The k live chunks most similar to `query` (cosine), with a 'score' in their metadata."""
+        if self.index is None or not self.chunks:
+            return []
+        by_id = {chunk["id"]: key for key, chunk in self.chunks.items()}
+        # Over-fetch so tombstoned vectors cannot crowd out live results
+        fetch = min(k + len(self.tombstones), self.index.ntotal)
+        scores, ids = self.index.search(_vectors(embeddings, [query]), fetch)
+        results = []
+        for score, vector_id in zip(scores[0], ids[0]):
+            key = by_id.get(int(vector_id))
+            if key is None:
+                continue
+            chunk = self.chunks[key]
+            metadata = next(iter(chunk["sources"].values()))
+            results.append(Document(
+                page_content=chunk["text"],
+                metadata={**metadata, "chunk_key": key, "sources": sorted(chunk["sources"]), "score": float(score)},
+            ))
+            if len(results) == k:
+                break
+        return results
+
+    def stats(self) -> dict:
+        return {
+            "generation": self.generation,
+            "live_chunks": len(self.chunks),
+            "tombstones": len(self.tombstones),
+            "vectors": self.index.ntotal if self.index is not None else 0,
+        }
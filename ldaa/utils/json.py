@@ -28,4 +28,150 @@ def to_serializable(obj):
         # Try to convert to string as a last resort
         return str(obj)
     except Exception:
-        return f"<non-serializable: {type(obj).__name__}>" 
\ No newline at end of file
+        return f"<non-serializable: {type(obj).__name__}>" 
+
+def _split_complete_escapes(text):
+    """Splits JSON string content into (decodable prefix, incomplete trailing escape)."""
+    i = 0
+    while i < len(text):
+        if text[i] == "\\":
+            need = 6 if text[i + 1:i + 2] == "u" else 2
+            # A high surrogate (\ud800-\udbff) is only decodable together with the low one after it
+            if i + need > len(text) or (need == 6 and text[i + 2:i + 4].lower() in ("d8", "d9", "da", "db") and i + 12 > len(text)):
+                return text[:i], text[i:]
+            i += need
+        else:
+            i += 1
+    return text, ""
+
+class IncrementalJSONParser:
+    """
+    Parses a top-level JSON object as it streams in, chunk by chunk.
+
+    `feed(chunk)` returns the events completed by that chunk:
+        ("field", key, value)  when a top-level field's value is complete
+        ("delta", key, text)   decoded text of the string fields listed in `stream_fields`,
+                               as it arrives (the full value is still reported as a field)
+    Anything before the first '{' (e.g. a ```json fence) and after the closing '}' is
+    ignored. `result()` returns the fields parsed so far.
+    """
+    def __init__(self, stream_fields=()):
+        self.stream_fields = set(stream_fields)
+        self.fields = {}
+        self.done = False
+        self._state = "start"  # start -> key -> colon -> value -> after_value -> key ...
+        self._raw = []         # Raw characters of the key or value being read
+        self._key = None
+        self._depth = 0        # Bracket depth inside an object/array value
+        self._in_string = False
+        self._escape = False
+        self._streamed = []    # Raw string content of a streamed field not yet emitted
+        self._pending = ""     # Incomplete escape sequence held back from the last delta
+
+    def feed(self, chunk):
+        events = []
+        for char in chunk:
+            if self.done:
+                break
+            if self._state == "start":
+                if char == "{":
+                    self._state = "key"
+            elif self._state == "key":
+                self._read_key(char)
+            elif self._state == "colon":
+                if char == ":":
+                    self._state = "value"
+            elif self._state == "value":
+                self._read_value(char, events)
+            elif self._state == "after_value":
+                self._after_value(char)
+        events.extend(self._delta())
+        return events
+
+    def _read_key(self, char):
+        if not self._in_string:
+            if char == '"':
+                self._in_string = True
+            elif char == "}":
+                self.done = True
+            return
+        if self._read_string_char(char):
+            self._key = json.loads('"' + "".join(self._raw) + '"')
+            self._raw = []
+            self._state = "colon"
+        else:
+            self._raw.append(char)
+
+    def _read_string_char(self, char):
+        """Tracks escapes inside a string; returns True on the closing quote."""
+        if self._escape:
+            self._escape = False
+        elif char == "\\":
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            return True
+        return False
+
+    def _read_value(self, char, events):
+        raw = self._raw
+        if not raw:
+            if char.isspace():
+                return
+            raw.append(char)
+            self._in_string = char == '"'
+            self._depth = 1 if char in "{[" else 0
+            return
+        first = raw[0]
+        if first == '"':
+            if self._read_string_char(char):
+                raw.append(char)
+                self._finish_value(events)
+                self._state = "after_value"
+                return
+            raw.append(char)
+            if self._key in self.stream_fields:
+                self._streamed.append(char)
+        elif first in "{[":
+            raw.append(char)
+            if self._in_string:
+                self._read_string_char(char)
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._finish_value(events)
+                    self._state = "after_value"
+        elif char in ",}" or char.isspace():
+            # Numbers, true, false and null end at a delimiter
+            self._finish_value(events)
+            self._state = "after_value"
+            self._after_value(char)
+        else:
+            raw.append(char)
+
+    def _after_value(self, char):
+        if char == ",":
+            self._state = "key"
+        elif char == "}":
+            self.done = True
+
+    def _delta(self):
+        if not self._streamed:
+            return []
+        text, self._pending = _split_complete_escapes(self._pending + "".join(self._streamed))
+        self._streamed = []
+        return [("delta", self._key, json.loads('"' + text + '"'))] if text else []
+
+    def _finish_value(self, events):
+        events.extend(self._delta())
+        key, value = self._key, json.loads("".join(self._raw))
+        self._raw, self._key, self._pending = [], None, ""
+        self.fields[key] = value
+        events.append(("field", key, value))
+
+    def result(self):
+        return dict(self.fields)
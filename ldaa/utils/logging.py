@@ -1,21 +1,101 @@
 """
 Meta-logging utilities for workflow events, decisions, and errors.
+
+Debug output goes through `log_debug`, which is gated on the logger level before any
+formatting happens and truncates large payloads (document text, prompts, LLM responses)
+when it is emitted. Set LDAA_LOG_LEVEL=DEBUG to see it on the console, or enable the
+bounded ring buffer (LDAA_LOG_RING_BUFFER=<capacity> or `enable_ring_buffer`) to keep
+the most recent debug records in memory without printing them.
 """
 import logging
+import os
+from collections import deque
 
 logger = logging.getLogger("ldaa")
 
 # Configure logger (can be expanded for file/console handlers)
 logging.basicConfig(level=logging.INFO)
+logger.setLevel(os.getenv("LDAA_LOG_LEVEL", "INFO").upper())
+
+# Maximum characters of any single payload value in debug records
+MAX_PAYLOAD_CHARS = int(os.getenv("LDAA_LOG_PAYLOAD_CHARS", "300"))
+
+def truncate(value, limit=None):
+    """Render a payload value for logging, cut to `limit` characters."""
+    limit = MAX_PAYLOAD_CHARS if limit is None else limit
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return repr(text) if isinstance(value, str) else text
+    head = text[:limit]
+    return f"{repr(head) if isinstance(value, str) else head}... [+{len(text) - limit} chars]"
+
+class _Payload:
+    """Deferred rendering of keyword payloads; only formatted if the record is emitted."""
+    __slots__ = ("items", "limit")
+
+    def __init__(self, items, limit):
+        self.items = items
+        self.limit = limit
+
+    def __str__(self):
+        return ", ".join(
+            f"{key}={truncate(value() if callable(value) else value, self.limit)}"
+            for key, value in self.items.items()
+        )
 
 def log_event(event_type, message, **kwargs):
     """Log a workflow event with optional metadata."""
     logger.info(f"[{event_type}] {message} | {kwargs}")
 
+def log_debug(event_type, message, limit=None, **payload):
+    """
+    Log a debug record with a lazily formatted, truncated payload. Payload values may be
+    zero-argument callables for expensive renderings; they are never called when debug
+    logging is disabled.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug("[%s] %s | %s", event_type, message, _Payload(payload, limit))
+
 def log_decision(node, decision, confidence=None, meta=None):
     """Log a decision made at a workflow node."""
     logger.info(f"[DECISION] Node: {node}, Decision: {decision}, Confidence: {confidence}, Meta: {meta}")
 
 def log_error(error, context=None):
     """Log an error with optional context."""
-    logger.error(f"[ERROR] {error} | Context: {context}") 
\ No newline at end of file
+    logger.error(f"[ERROR] {error} | Context: {context}")
+
+class RingBufferHandler(logging.Handler):
+    """Keeps the last `capacity` formatted records in memory."""
+    def __init__(self, capacity=1000, level=logging.DEBUG):
+        super().__init__(level)
+        self.records = deque(maxlen=capacity)
+
+    def emit(self, record):
+        try:
+            self.records.append(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+    def dump(self):
+        return list(self.records)
+
+def enable_ring_buffer(capacity=1000, level=logging.DEBUG):
+    """
+    Attach a bounded in-memory sink for recent records at `level`. If that is below the
+    current console level, console output keeps its previous level.
+    """
+    handler = RingBufferHandler(capacity, level)
+    console_level = logger.getEffectiveLevel()
+    if level < console_level:
+        console = logging.StreamHandler()
+        console.setLevel(console_level)
+        console.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        logger.addHandler(console)
+        logger.propagate = False
+        logger.setLevel(level)
+    logger.addHandler(handler)
+    return handler
+
+if os.getenv("LDAA_LOG_RING_BUFFER"):
+    enable_ring_buffer(int(os.getenv("LDAA_LOG_RING_BUFFER")))
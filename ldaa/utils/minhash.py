@@ -0,0 +1,107 @@
+"""
+Exact and near-duplicate detection for segment texts.
+
+Texts are normalized (case, accents kept, whitespace and punctuation collapsed) and hashed
+for exact matches. Near duplicates are found with MinHash signatures over word shingles and
+locality-sensitive hashing (LSH): signatures are cut into bands, texts sharing any band are
+candidates, and candidates whose estimated Jaccard similarity reaches the threshold are
+merged into one cluster.
+"""
+import hashlib
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+PRIME = (1 << 31) - 1  # Hash family (a * x + b) mod PRIME; products stay below 2**63
+WORD = re.compile(r"\w+", re.UNICODE)
+
+def normalize_for_dedup(text: str) -> str:
+    return " ".join(WORD.findall((text or "").lower()))
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_for_dedup(text).encode("utf-8")).hexdigest()
+
+def shingle_hashes(text: str, shingle_size: int = 5) -> np.ndarray:
+    """32-bit hashes of the distinct word `shingle_size`-grams of `text`."""
+    tokens = normalize_for_dedup(text).split()
+    if len(tokens) <= shingle_size:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "big") for s in shingles],
+        dtype=np.uint64,
+    )
+
+def minhash_signatures(texts: Sequence[str], shingle_size: int = 5, num_perm: int = 64, seed: int = 1) -> np.ndarray:
+    """Returns an (len(texts), num_perm) array of MinHash signatures."""
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, PRIME, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(texts), num_perm), dtype=np.uint64)
+    for row, text in enumerate(texts):
+        hashes = shingle_hashes(text, shingle_size)
+        signatures[row] = ((np.outer(hashes, a) + b) % PRIME).min(axis=0)
+    return signatures
+
+def near_duplicate_pairs(signatures: np.ndarray, bands: int = 16, threshold: float = 0.85) -> List[Tuple[int, int, float]]:
+    """(i, j, estimated Jaccard) for LSH candidate pairs at or above `threshold`, with i < j."""
+    num_perm = signatures.shape[1]
+    rows = max(1, num_perm // bands)
+    candidates = set()
+    for start in range(0, rows * bands, rows):
+        buckets: Dict[bytes, List[int]] = {}
+        for i, band in enumerate(signatures[:, start:start + rows]):
+            buckets.setdefault(band.tobytes(), []).append(i)
+        for members in buckets.values():
+            candidates.update((i, j) for k, i in enumerate(members) for j in members[k + 1:])
+    pairs = []
+    for i, j in sorted(candidates):
+        similarity = float(np.mean(signatures[i] == signatures[j]))
+        if similarity >= threshold:
+            pairs.append((i, j, similarity))
+    return pairs
+
+def cluster_duplicates(
+    texts: Sequence[str],
+    near: bool = True,
+    shingle_size: int = 5,
+    num_perm: int = 64,
+    bands: int = 16,
+    threshold: float = 0.85,
+) -> List[int]:
+    """
+    Labels each text with the index of its cluster representative (the first member in
+    order). Identical normalized texts always share a cluster; with `near`, MinHash near
+    duplicates are merged too. Empty texts stay on their own.
+    """
+    parent = list(range(len(texts)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    by_hash: Dict[str, int] = {}
+    candidates = []
+    for i, text in enumerate(texts):
+        if not normalize_for_dedup(text):
+            continue
+        digest = content_hash(text)
+        if digest in by_hash:
+            union(by_hash[digest], i)
+        else:
+            by_hash[digest] = i
+            candidates.append(i)
+    if near and len(candidates) > 1:
+        signatures = minhash_signatures([texts[i] for i in candidates], shingle_size, num_perm)
+        for i, j, _ in near_duplicate_pairs(signatures, bands, threshold):
+            union(candidates[i], candidates[j])
+    return [find(i) for i in range(len(texts))]
@@ -0,0 +1,98 @@
+"""
+Compact prompt serialization for analyses and comparisons.
+
+Interpolating pydantic objects into prompts uses their repr, which repeats every field
+name, the full segment text, meta dicts and quoting noise. These helpers render only the
+fields a node declares, in a stable line-based layout:
+
+    [seg-12] ethics | conf 0.85
+      summary: ...
+      pros: first; second
+      cons: ...
+
+Text longer than `max_chars` is cut at a word boundary and marked with "…"; segments are
+referenced by their id, so the quoted source text can be left out entirely.
+"""
+from typing import Any, Iterable, Sequence
+
+from ldaa.utils.tokens import count_tokens
+
+ANALYSIS_FIELDS = ("segment_id", "category", "confidence", "summary", "pros", "cons", "reasoning", "segment")
+COMPARISON_FIELDS = (
+    "comparative_summary", "similarities", "differences", "focus_areas", "gaps",
+    "confidence", "reasoning", "verbose_comparison",
+)
+ELLIPSIS = "…"
+
+def truncate(text: Any, max_chars: int = None) -> str:
+    text = " ".join(str(text or "").split())
+    if max_chars is None or len(text) <= max_chars:
+        return text
+    if max_chars <= 0:
+        return ""
+    cut = text[:max_chars]
+    if text[max_chars] != " ":  # Do not end in the middle of a word
+        cut = cut.rsplit(" ", 1)[0] or cut
+    return cut + ELLIPSIS
+
+def _get(obj, name, default=None):
+    if isinstance(obj, dict):
+        return obj.get(name, default)
+    return getattr(obj, name, default)
+
+def _join(items, max_chars):
+    return "; ".join(truncate(item, max_chars) for item in items or [])
+
+def format_analysis(analysis, fields: Sequence[str] = ANALYSIS_FIELDS, max_chars: int = 400) -> str:
+    """One analysis as a header line plus one indented line per requested text field."""
+    header = f"[{_get(analysis, 'segment_id')}]" if "segment_id" in fields else "-"
+    if "category" in fields:
+        header += f" {_get(analysis, 'category')}"
+    if "confidence" in fields:
+        header += f" | conf {float(_get(analysis, 'confidence') or 0.0):.2f}"
+    lines = [header]
+    for name in fields:
+        if name in ("segment_id", "category", "confidence"):
+            continue
+        value = _get(analysis, name)
+        rendered = _join(value, max_chars) if isinstance(value, (list, tuple)) else truncate(value, max_chars)
+        if rendered:
+            lines.append(f"  {'text' if name == 'segment' else name}: {rendered}")
+    return "\n".join(lines)
+
+def format_analyses(analyses: Iterable, fields: Sequence[str] = ANALYSIS_FIELDS, max_chars: int = 400) -> str:
+    rendered = [format_analysis(analysis, fields, max_chars) for analysis in analyses]
+    return "\n".join(rendered) if rendered else "(none)"
+
+def _format_topics(items, max_chars):
+    return [f"  - {_get(item, 'topic', '')}: {truncate(_get(item, 'explanation', item), max_chars)}" if isinstance(item, dict)
+            else f"  - {truncate(item, max_chars)}" for item in items or []]
+
+def format_comparison(comparison, fields: Sequence[str] = COMPARISON_FIELDS, max_chars: int = 600) -> str:
+    """A DocumentComparison (or its dict) with one section per requested field."""
+    if comparison is None:
+        return "(no comparison)"
+    lines = []
+    for name in fields:
+        value = _get(comparison, name)
+        if name in ("similarities", "differences", "gaps"):
+            lines.append(f"{name} ({len(value or [])}):")
+            lines += _format_topics(value, max_chars)
+        elif name == "focus_areas":
+            lines.append("focus_areas:")
+            lines += [f"  {doc}: {_join(areas, max_chars)}" for doc, areas in (value or {}).items()]
+        elif name == "confidence":
+            lines.append(f"confidence: {float(value or 0.0):.2f}")
+        else:
+            lines.append(f"{name}: {truncate(value, max_chars) or '-'}")
+    return "\n".join(lines)
+
+def serialization_savings(compact_prompt: str, verbose_prompt: str) -> dict:
+    """Token counts of a compact prompt against the repr-based prompt it replaces."""
+    compact, verbose = count_tokens(compact_prompt), count_tokens(verbose_prompt)
+    return {
+        "prompt_tokens": compact,
+        "repr_tokens": verbose,
+        "saved_tokens": verbose - compact,
+        "saved_ratio": round(1 - compact / verbose, 4) if verbose else 0.0,
+    }
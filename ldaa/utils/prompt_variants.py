@@ -1,16 +1,23 @@
+import hashlib
 import random
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
-def get_random_prompt_variant(prompt_templates: List[str], params: Dict[str, Any]) -> str:
+def get_random_prompt_variant(prompt_templates: List[str], params: Dict[str, Any], seed: Optional[Any] = None) -> str:
     """
     Selects a random prompt template from the provided list and formats it with the given parameters.
     Args:
         prompt_templates: List of prompt templates (as f-strings or format strings).
         params: Dictionary of parameters to fill into the prompt template.
+        seed: Optional value (e.g. a segment content hash) that fixes the choice, so identical
+            inputs always get the same template. Unseeded selection stays random.
     Returns:
         A formatted prompt string with the parameters applied.
     """
     if not prompt_templates:
         raise ValueError("No prompt templates provided.")
-    template = random.choice(prompt_templates)
-    return template.format(**params) 
\ No newline at end of file
+    if seed is None:
+        template = random.choice(prompt_templates)
+    else:
+        digest = hashlib.sha256(str(seed).encode("utf-8")).digest()
+        template = prompt_templates[int.from_bytes(digest[:8], "big") % len(prompt_templates)]
+    return template.format(**params)
@@ -0,0 +1,116 @@
+"""
+Async scheduling for many small LLM calls.
+
+`LLMScheduler.submit` runs one call under a shared concurrency limit and token-bucket
+limits for requests and tokens per minute. When the provider throttles, the call is
+retried with exponential backoff and the concurrency limit is halved, then grown back one
+slot at a time as calls succeed (AIMD).
+"""
+import asyncio
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True if `error` looks like a provider throttling response (HTTP 429 / rate limit)."""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429 or type(error).__name__ == "RateLimitError":
+        return True
+    message = str(error).lower()
+    return "rate limit" in message or "too many requests" in message
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate_per_minute`; a None rate never blocks."""
+    def __init__(self, rate_per_minute: Optional[float], capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0 if rate_per_minute else None
+        self.capacity = capacity or rate_per_minute or 0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount: float = 1) -> None:
+        if self.rate is None:
+            return
+        amount = min(amount, self.capacity)  # Oversized requests wait for a full bucket
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 5,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+    ):
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._active = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+        self.stats_counters = {"calls": 0, "retries": 0, "throttled": 0, "peak_concurrency": 0}
+
+    async def _acquire_slot(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+            self.stats_counters["peak_concurrency"] = max(self.stats_counters["peak_concurrency"], self._active)
+
+    async def _release_slot(self, outcome: str) -> None:
+        async with self._condition:
+            self._active -= 1
+            if outcome == "throttled":
+                self.limit = max(1, self.limit // 2)
+                self._successes = 0
+            elif outcome == "ok":
+                self._successes += 1
+                if self.limit < self.max_concurrency and self._successes >= self.limit:
+                    self.limit += 1
+                    self._successes = 0
+            self._condition.notify_all()
+
+    async def submit(self, make_call: Callable[[], Awaitable[Any]], tokens: int = 0) -> Any:
+        """
+        Runs `make_call()` (a zero-argument coroutine factory, so it can be retried) once a
+        concurrency slot and the rate budgets allow it. Throttling errors are retried up to
+        `max_retries` times; any other error is raised to the caller.
+        """
+        attempt = 0
+        while True:
+            await self.requests.acquire(1)
+            await self.tokens.acquire(tokens)
+            await self._acquire_slot()
+            outcome = "error"
+            try:
+                self.stats_counters["calls"] += 1
+                result = await make_call()
+                outcome = "ok"
+                return result
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                outcome = "throttled"
+                self.stats_counters["throttled"] += 1
+            finally:
+                await self._release_slot(outcome)
+            attempt += 1
+            self.stats_counters["retries"] += 1
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (attempt - 1))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "concurrency_limit": self.limit, "max_concurrency": self.max_concurrency}
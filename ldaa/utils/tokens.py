@@ -0,0 +1,50 @@
+"""
+Token counting helpers.
+Uses tiktoken when it is installed and its encoding files are available; otherwise falls
+back to a character-based estimate so callers never need network access.
+"""
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:  # Optional dependency
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+DEFAULT_MODEL = "gpt-4o"
+
+@lru_cache(maxsize=16)
+def _encoding_for(model: str):
+    if tiktoken is None:
+        return None
+    name = model.split(":")[-1]
+    try:
+        return tiktoken.encoding_for_model(name)
+    except KeyError:
+        try:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            return None
+    except Exception:  # e.g. encoding files cannot be downloaded in an air-gapped environment
+        return None
+
+@lru_cache(maxsize=8192)
+def _count_tokens_cached(text: str, model: str) -> int:
+    encoding = _encoding_for(model)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+def count_tokens(text: str, model: str = None) -> int:
+    """
+    Number of tokens `text` takes for `model` (estimated if no tokenizer is available).
+    Counts are memoized, since the same segment and prompt texts are counted repeatedly
+    for batching, scheduling and budget checks.
+    """
+    if not text:
+        return 0
+    return _count_tokens_cached(text, model or DEFAULT_MODEL)
+
+def token_count_cache_stats() -> dict:
+    info = _count_tokens_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize}
@@ -0,0 +1,92 @@
+"""
+Token accounting for LLM calls.
+
+Nodes decorated with `tracks_usage(name)` get a usage ledger in `state.meta['usage']`:
+    {"nodes": {name: {calls, cached_calls, input_tokens, output_tokens, cost_usd,
+                      latency_s, estimated_cost_usd, estimated_latency_s}},
+     "total": {same keys, summed over nodes}}
+LLM calls made while such a node runs (including from tasks it spawns) record their
+pre-flight estimate and actual usage through `record_call`, and `check_run_budget` compares
+the run's spending so far with the per-run token budget.
+"""
+import functools
+import inspect
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+USAGE_KEYS = (
+    "calls", "cached_calls", "input_tokens", "output_tokens", "cost_usd",
+    "latency_s", "estimated_cost_usd", "estimated_latency_s",
+)
+
+# (ledger, node name) for the node currently running in this context
+_current: ContextVar = ContextVar("ldaa_usage", default=None)
+
+class TokenBudgetExceeded(Exception):
+    """Raised before an LLM call that would exceed the per-call or per-run token budget."""
+
+def _empty_usage() -> Dict[str, float]:
+    return {key: 0 for key in USAGE_KEYS}
+
+@contextmanager
+def usage_context(meta: Dict[str, Any], node: str):
+    ledger = meta.setdefault("usage", {"nodes": {}, "total": _empty_usage()})
+    ledger["nodes"].setdefault(node, _empty_usage())
+    token = _current.set((ledger, node))
+    try:
+        yield ledger
+    finally:
+        _current.reset(token)
+
+def tracks_usage(node: str):
+    """Decorator for (state, config, store) nodes that records their LLM usage in state.meta."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(state, *args, **kwargs):
+                with usage_context(state.meta, node):
+                    return await fn(state, *args, **kwargs)
+        else:
+            @functools.wraps(fn)
+            def wrapper(state, *args, **kwargs):
+                with usage_context(state.meta, node):
+                    return fn(state, *args, **kwargs)
+        return wrapper
+    return decorator
+
+def estimate_call(input_tokens: int, output_tokens: int, budget) -> Dict[str, float]:
+    """Pre-flight cost (USD) and latency (seconds) estimate from the budget's price and speed settings."""
+    cost = (input_tokens * budget.input_cost_per_1m + output_tokens * budget.output_cost_per_1m) / 1_000_000
+    latency = budget.base_latency_s + output_tokens / budget.output_tokens_per_second
+    return {"cost_usd": cost, "latency_s": latency}
+
+def run_tokens_used() -> Optional[int]:
+    """Tokens spent on provider calls so far in this run, or None outside a tracked node."""
+    current = _current.get()
+    if current is None:
+        return None
+    total = current[0]["total"]
+    return total["input_tokens"] + total["output_tokens"]
+
+def check_run_budget(tokens: int, max_run_tokens: Optional[int]) -> None:
+    used = run_tokens_used()
+    if max_run_tokens and used is not None and used + tokens > max_run_tokens:
+        raise TokenBudgetExceeded(f"Run token budget of {max_run_tokens} exhausted ({used} used, {tokens} requested)")
+
+def record_call(input_tokens: int, output_tokens: int, estimate: Dict[str, float], latency_s: float, cost_usd: float, cached: bool = False) -> None:
+    current = _current.get()
+    if current is None:
+        return
+    ledger, node = current
+    for usage in (ledger["nodes"][node], ledger["total"]):
+        usage["calls"] += 1
+        usage["estimated_cost_usd"] = round(usage["estimated_cost_usd"] + estimate["cost_usd"], 6)
+        usage["estimated_latency_s"] = round(usage["estimated_latency_s"] + estimate["latency_s"], 3)
+        usage["latency_s"] = round(usage["latency_s"] + latency_s, 3)
+        if cached:
+            usage["cached_calls"] += 1  # Served from the response cache: no tokens billed
+            continue
+        usage["input_tokens"] += input_tokens
+        usage["output_tokens"] += output_tokens
+        usage["cost_usd"] = round(usage["cost_usd"] + cost_usd, 6)
@@ -7,6 +7,7 @@ import asyncio
 import threading
 import queue
 from ldaa.agents.graph import compiled_graph
+from ldaa.agents.llm import aclose_llm_clients
 from ldaa.utils.json import to_serializable
 from ldaa.utils.session import generate_session_id
 
@@ -43,10 +44,21 @@ def analysis_worker(doc1_path, doc2_path, log_queue, result_queue):
         sys.stdout = LogWriter()
         try:
             print(f"Running agentic graph on: {doc1_path} and {doc2_path} (thread_id={thread_id})")
-            result = await compiled_graph.ainvoke(state, config={"configurable": {"thread_id": thread_id}})
+            result = None
+            # "custom" events carry comparison fields as they are generated; "values" the latest state
+            async for mode, chunk in compiled_graph.astream(state, config={"configurable": {"thread_id": thread_id}}, stream_mode=["custom", "values"]):
+                if mode == "values":
+                    result = chunk
+                elif chunk.get("restart"):
+                    log_queue.put(f"\n[{chunk.get('node')}] call retried, output restarts:\n")
+                elif "delta" in chunk:
+                    log_queue.put(chunk["delta"])
+                elif chunk.get("field") != "verbose_report":
+                    log_queue.put(f"\n[{chunk.get('node')}] {chunk.get('field')}: {json.dumps(to_serializable(chunk.get('value')), ensure_ascii=False)}\n")
             result_queue.put(result)
         finally:
             sys.stdout = old_stdout
+            await aclose_llm_clients()
     asyncio.run(run())
 
 if run_btn:
@@ -2,6 +2,7 @@
 import sys
 from pathlib import Path
 from ldaa.agents.graph import compiled_graph
+from ldaa.agents.llm import aclose_llm_clients
 import asyncio
 import json
 from ldaa.utils.json import to_serializable
@@ -15,6 +16,17 @@ def print_result(result):
     print(f"Meta-log: {meta}")
     comp = result.get('comparison_result', {})
 
+def print_stream_event(event):
+    """Prints comparison output as it is generated: fields when complete, the report as it streams."""
+    if event.get("restart"):
+        print(f"\n[{event.get('node')}] call retried, output restarts:")
+    elif "delta" in event:
+        sys.stdout.write(event["delta"])
+        sys.stdout.flush()
+    elif event.get("field") != "verbose_report":
+        print(f"\n[{event.get('node')}] {event.get('field')}:")
+        print(json.dumps(to_serializable(event.get("value")), indent=2, ensure_ascii=False))
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Run the LDAA agentic graph on two PDF documents.")
     parser.add_argument("doc1", type=str, nargs="?", default="input/ley1.pdf", help="Path to the first PDF document.")
@@ -31,10 +43,15 @@ async def main():
     }
     thread_id = generate_session_id()
     print(f"Running agentic graph on: {doc1} and {doc2} (thread_id={thread_id})")
-    await compiled_graph.ainvoke(
-        state,
-        config={"configurable": {"thread_id": thread_id}}
-    )
+    try:
+        async for event in compiled_graph.astream(
+            state,
+            config={"configurable": {"thread_id": thread_id}},
+            stream_mode="custom",
+        ):
+            print_stream_event(event)
+    finally:
+        await aclose_llm_clients()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,12 @@ import pytest
 from unittest.mock import MagicMock, AsyncMock
 from ldaa.schemas import DocumentSegment, SegmentAnalysis, SegmentAction, DocumentComparison, ComparisonAction, LegalAnalysisState
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path, monkeypatch):
+    # Keep on-disk caches out of the working tree and independent between tests
+    monkeypatch.setenv("LDAA_CACHE_DIR", str(tmp_path / "ldaa_cache"))
+    return tmp_path / "ldaa_cache"
+
 @pytest.fixture
 def dummy_state():
     return LegalAnalysisState(
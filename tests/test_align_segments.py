@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from ldaa.agents import align_segments as align_module
+from ldaa.agents.align_segments import align_segments, alignment_prompt_section
+from ldaa.schemas import LegalAnalysisState, SegmentAnalysis
+from ldaa.utils.alignment import align, cosine_similarity_matrix
+
+SIMILARITY = np.array([
+    [0.90, 0.85, 0.10],
+    [0.88, 0.20, 0.10],
+    [0.10, 0.10, 0.30],
+])
+
+def test_alignment_methods():
+    # Greedy takes (0, 0) first and leaves row 1 unmatched; Hungarian maximizes the total
+    assert [(i, j) for i, j, _ in align(SIMILARITY, "greedy", 0.5)["pairs"]] == [(0, 0)]
+    hungarian = align(SIMILARITY, "hungarian", 0.5)
+    assert [(i, j) for i, j, _ in hungarian["pairs"]] == [(0, 1), (1, 0)]
+    assert hungarian["unmatched_rows"] == [2] and hungarian["unmatched_cols"] == [2]
+    assert [(i, j) for i, j, _ in align(SIMILARITY, "many_to_one", 0.5)["pairs"]] == [(0, 0), (1, 0)]
+    assert align(np.zeros((0, 2)))["unmatched_cols"] == [0, 1]
+
+def test_cosine_similarity_matrix():
+    similarity = cosine_similarity_matrix([[1, 0], [0, 2]], [[3, 0], [1, 1]])
+    assert similarity.shape == (2, 2)
+    assert similarity[0, 0] == pytest.approx(1.0)
+    assert similarity[1, 1] == pytest.approx(np.sqrt(0.5))
+
+@pytest.mark.asyncio
+async def test_align_segments_node(dummy_config, dummy_store, monkeypatch):
+    def analysis(segment_id):
+        return SegmentAnalysis(segment=f"Text {segment_id}", segment_id=segment_id, summary="S", category="ethics", pros=["p"], cons=["c"], confidence=0.9, reasoning="R")
+    vectors = {"a1": [1, 0, 0], "a2": [0, 1, 0], "b1": [0, 0.9, 0.1], "b2": [0.95, 0, 0.05], "b3": [0, 0, 1]}
+
+    async def fake_embed(texts, settings):
+        return [vectors[text.split()[-1]] for text in texts]
+
+    monkeypatch.setattr(align_module, "embed_texts", fake_embed)
+    state = LegalAnalysisState(
+        doc1_accepted_segments=[analysis("a1"), analysis("a2")],
+        doc2_accepted_segments=[analysis("b1"), analysis("b2"), analysis("b3")],
+    )
+    state = await align_segments(state, dummy_config, dummy_store)
+    pairs = {(p["doc1"], p["doc2"]) for p in state.segment_alignment["pairs"]}
+    assert pairs == {("a1", "b2"), ("a2", "b1")}
+    assert state.segment_alignment["unmatched"] == {"doc1": [], "doc2": ["b3"]}
+    assert state.meta["alignment"]["pairs"] == 2
+    section = alignment_prompt_section(state.segment_alignment, doc1_ids={"a1"}, doc2_ids={"b2", "b3"})
+    assert "a1 <-> b2" in section and "a2" not in section and "b3" in section
+
+@pytest.mark.asyncio
+async def test_alignment_precedes_output_instruction(dummy_state, dummy_config, dummy_store, monkeypatch):
+    from langchain_core.messages import AIMessage
+    from ldaa.agents import compare_documents as compare_module
+    prompts = []
+
+    class PromptLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            return AIMessage(content="{}")
+
+    monkeypatch.setattr(compare_module, "get_llm", lambda cache=True: PromptLLM())
+    state = dummy_state.model_copy(deep=True)
+    state.comparison_action = None
+    state.segment_alignment = {"method": "hungarian", "pairs": [{"doc1": "1", "doc2": "2", "score": 0.9}], "unmatched": {"doc1": [], "doc2": []}}
+    await compare_module.compare_documents(state, dummy_config, dummy_store)
+    prompt = prompts[0]
+    assert prompt.index("Document 2 Segments:") < prompt.index("1 <-> 2") < prompt.index("Now, output the required JSON object.")
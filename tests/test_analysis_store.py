@@ -0,0 +1,68 @@
+import numpy as np
+from ldaa.agents.aggregate_results import aggregate_results
+from ldaa.utils.analysis_store import AnalysisStore, build_table, filter_rows, group_stats, low_confidence_hotspots
+from ldaa.schemas import SegmentAction, SegmentAnalysis
+
+def analysis(segment_id, category, confidence):
+    return SegmentAnalysis(segment="T", segment_id=segment_id, summary="S", category=category, pros=["p"], cons=["c"], confidence=confidence, reasoning="R")
+
+def action(i, name, confidence=0.9):
+    return SegmentAction(segment_index=i, action=name, confidence=confidence, reasoning="R")
+
+def run_table(run_id):
+    doc1 = [analysis("a1", "ethics", 0.9), analysis("a2", "ethics", 0.3), analysis("a3", "governance", 0.8)]
+    doc2 = [analysis("b1", "governance", 0.4)]
+    return build_table(run_id, {
+        "doc1": (doc1, [action(0, "accept"), action(1, "mark_review"), action(2, "accept")], [1, 3, 1]),
+        "doc2": (doc2, [action(0, "retry")], [1]),
+    }, timestamp=0.0)
+
+def test_group_stats_and_filters():
+    table = run_table("r1")
+    stats = group_stats(table, "category")
+    assert stats["ethics"]["count"] == 2 and stats["ethics"]["mean_confidence"] == 0.6
+    assert stats["ethics"]["accept_rate"] == 0.5 and stats["ethics"]["mark_review_rate"] == 0.5
+    assert stats["governance"]["min_confidence"] == 0.4 and stats["governance"]["retry_rate"] == 0.5
+    assert filter_rows(table, doc="doc1", max_confidence=0.5)["segment_id"].tolist() == ["a2"]
+    assert low_confidence_hotspots(table, 0.5) == [
+        {"category": "ethics", "count": 2, "low_confidence": 1, "share": 0.5},
+        {"category": "governance", "count": 2, "low_confidence": 1, "share": 0.5},
+    ]
+
+def test_store_appends_and_compacts_runs(tmp_path):
+    store = AnalysisStore(tmp_path)
+    store.append("r1", run_table("r1"))
+    store.append("r2", run_table("r2"))
+    assert store.run_ids() == ["r1", "r2"] and len(store.load()) == 8
+    store.compact()
+    assert not list(store.runs_dir.glob("*.npy")) and len(store.load(runs=["r2"])) == 4
+    # A run written again after compaction replaces its compacted rows
+    store.append("r1", run_table("r1")[:1])
+    assert len(store.load()) == 5
+    store.compact()
+    assert len(store.load()) == 5
+    assert store.stats("doc", action="accept")["doc1"]["count"] == 3
+
+def test_aggregate_results_writes_run_to_store(dummy_state, dummy_store):
+    state = dummy_state.model_copy(deep=True)
+    state.doc1_analysis = [analysis("a1", "ethics", 0.9), analysis("a2", "ethics", 0.3)]
+    state.doc1_segment_actions = [action(0, "accept"), action(1, "mark_review")]
+    state = aggregate_results(state, {"configurable": {"thread_id": "run42"}}, dummy_store)
+    meta = state.meta["aggregate"]
+    assert meta["doc1"] == {"accept": 1, "retry": 0, "mark_review": 1}
+    assert [a.segment_id for a in state.doc1_accepted_segments] == ["a1"]
+    assert meta["store"]["run_id"] == "run42"
+    stored = np.load(meta["store"]["path"])
+    assert len(stored) == meta["store"]["rows"] and set(stored["run_id"]) == {"run42"}
+
+def test_uuid_run_ids_survive_compaction(tmp_path):
+    run_id = "0f8fad5b-d9cb-469f-a165-70867728950e"
+    store = AnalysisStore(tmp_path)
+    store.append(run_id, run_table(run_id))
+    store.compact()
+    store.append(run_id, run_table(run_id)[:1])
+    assert len(store.load()) == 1 and store.run_ids() == [run_id]
+    assert len(store.load(runs=[run_id])) == 1
+    long_id = "run-" + "x" * 100
+    store.append(long_id, run_table(long_id))
+    assert len(store.load(runs=[long_id])) == 4
@@ -0,0 +1,40 @@
+import asyncio
+import json
+import pytest
+from ldaa.agents import analyze_and_reflect, analyze_segment, self_reflect_segment
+from ldaa.agents.config import load_config
+from ldaa.schemas import DocumentSegment, LegalAnalysisState
+
+@pytest.mark.asyncio
+async def test_fused_node_reflects_without_waiting_for_all_analyses(dummy_config, dummy_store, monkeypatch):
+    events = []
+
+    class PipelineLLM:
+        async def ainvoke(self, prompt):
+            class Response:
+                pass
+            if "Analysis:" in prompt:
+                doc = "doc1" if "Document: doc1" in prompt else "doc2"
+                events.append(f"reflect {doc}")
+                Response.content = '{"action": "accept", "confidence": 0.9, "reasoning": "Fine"}'
+            else:
+                doc = "doc1" if "doc1_seg_0" in prompt else "doc2"
+                await asyncio.sleep(0.2 if doc == "doc1" else 0.0)  # doc1's analysis is slow
+                events.append(f"analyze {doc}")
+                Response.content = json.dumps({"summary": doc, "category": "ethics", "pros": ["a"], "cons": ["b"], "confidence": 0.5, "reasoning": "R"})
+            return Response()
+
+    settings = load_config().model_copy(deep=True)
+    settings.batching.enabled = False
+    monkeypatch.setattr(analyze_and_reflect, "load_config", lambda: settings)
+    monkeypatch.setattr(analyze_segment, "get_llm", lambda cache=True: PipelineLLM())
+    monkeypatch.setattr(self_reflect_segment, "get_llm", lambda cache=True: PipelineLLM())
+    state = LegalAnalysisState(
+        doc1_segments=[DocumentSegment(id='doc1_seg_0', text='Foo', document_id='doc1', segment_type='section', position=0)],
+        doc2_segments=[DocumentSegment(id='doc2_seg_0', text='Baz', document_id='doc2', segment_type='section', position=0)],
+    )
+    result = await analyze_and_reflect.analyze_and_reflect_segment(state, dummy_config, dummy_store)
+    assert events.index("reflect doc2") < events.index("analyze doc1")
+    assert [a.summary for a in result.doc1_analysis + result.doc2_analysis] == ["doc1", "doc2"]
+    assert [a.segment_index for a in result.doc1_segment_actions + result.doc2_segment_actions] == [0, 0]
+    assert result.doc1_segment_attempts == [1] and result.meta['pipeline']['units'] == 2
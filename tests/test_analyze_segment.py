@@ -1,3 +1,4 @@
+import json
 import pytest
 from ldaa.agents.analyze_segment import analyze_segment
 from ldaa.schemas import DocumentSegment
@@ -24,4 +25,65 @@ async def test_analyze_segment_empty(dummy_state, dummy_config, dummy_store, moc
     state.doc2_segments = []
     result = await analyze_segment(state, dummy_config, dummy_store)
     assert result.doc1_analysis == []
-    assert result.doc2_analysis == [] 
\ No newline at end of file
+    assert result.doc2_analysis == [] 
+@pytest.mark.asyncio
+async def test_analyze_segment_batched_requeues_missing(dummy_state, dummy_config, dummy_store, monkeypatch):
+    from ldaa.agents import analyze_segment as module
+    prompts = []
+
+    def answer(segment_id):
+        return {"segment_id": segment_id, "summary": "S", "category": "ethics", "pros": ["a", "b"], "cons": ["c", "d"], "confidence": 0.9, "reasoning": "R"}
+
+    class BatchLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            class Response:
+                pass
+            if "Segments (JSON)" in prompt:
+                # The batched answer covers doc1 only; doc2's entry is malformed
+                Response.content = json.dumps([answer("doc1_seg_0"), {"segment_id": "doc2_seg_0", "summary": "S"}])
+            else:
+                Response.content = json.dumps(answer("doc2_seg_0"))
+            return Response()
+
+    monkeypatch.setattr(module, "get_llm", lambda: BatchLLM())
+    state = dummy_state.model_copy()
+    state.doc1_segments = [DocumentSegment(id='doc1_seg_0', text='Foo', document_id='doc1', segment_type='section', position=0)]
+    state.doc2_segments = [DocumentSegment(id='doc2_seg_0', text='Baz', document_id='doc2', segment_type='section', position=0)]
+    result = await analyze_segment(state, dummy_config, dummy_store)
+    assert len(prompts) == 2  # One batch plus one individual retry
+    assert [a.segment_id for a in result.doc1_analysis + result.doc2_analysis] == ['doc1_seg_0', 'doc2_seg_0']
+    assert result.doc2_analysis[0].segment == 'Baz'
+    assert result.meta['analysis']['batching'] == {"batches": 1, "segments": 2, "requeued": 1}
+
+@pytest.mark.asyncio
+async def test_analyze_segment_retries_only_flagged_segments(dummy_state, dummy_config, dummy_store, monkeypatch):
+    from ldaa.agents import analyze_segment as module
+    from ldaa.schemas import SegmentAction
+    prompts = []
+
+    class RetryLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            class Response:
+                content = json.dumps({"summary": "New", "category": "ethics", "pros": ["a"], "cons": ["b"], "confidence": 0.9, "reasoning": "R"})
+            return Response()
+
+    monkeypatch.setattr(module, "get_llm", lambda cache=True: RetryLLM())
+    state = dummy_state.model_copy()
+    kept = state.doc1_analysis[0]
+    state.doc1_segments = [DocumentSegment(id=f'doc1_seg_{i}', text=f'Foo {i}', document_id='doc1', segment_type='section', position=i) for i in range(2)]
+    state.doc1_analysis = [kept, kept.model_copy(update={"segment_id": "doc1_seg_1"})]
+    state.doc1_segment_actions = [
+        SegmentAction(segment_index=0, action='accept', confidence=0.9, reasoning='Ok'),
+        SegmentAction(segment_index=1, action='retry', confidence=0.2, reasoning='Weak'),
+    ]
+    state.doc1_segment_attempts = [1, 1]
+    state.doc2_segment_attempts = [1]
+    result = await analyze_segment(state, dummy_config, dummy_store)
+    assert len(prompts) == 1 and "Foo 1" in prompts[0]
+    assert result.doc1_analysis[0] is kept
+    assert result.doc1_analysis[1].summary == "New"
+    assert result.doc2_analysis == dummy_state.doc2_analysis
+    assert result.doc1_segment_attempts == [1, 2] and result.doc2_segment_attempts == [1]
+    assert result.meta['analysis']['pending'] == {"doc1": 1, "doc2": 0}
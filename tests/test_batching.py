@@ -0,0 +1,10 @@
+from ldaa.utils.batching import pack_batches, index_batch_response
+
+def test_pack_batches_respects_budget_size_and_keys():
+    items = [("a", 40), ("b", 40), ("c", 40), ("d", 200), ("a", 1), ("e", 1)]
+    batches = pack_batches(items, cost=lambda item: item[1], max_tokens=100, max_items=5, key=lambda item: item[0])
+    assert [[name for name, _ in batch] for batch in batches] == [["a", "b"], ["c"], ["d"], ["a", "e"]]
+
+def test_index_batch_response_drops_malformed_and_duplicate_entries():
+    parsed = {"results": [{"segment_id": "1", "x": 1}, "junk", {"x": 2}, {"segment_id": 2}, {"segment_id": 2}]}
+    assert index_batch_response(parsed) == {"1": {"segment_id": "1", "x": 1}}
@@ -0,0 +1,90 @@
+import json
+import pytest
+from langchain_core.messages import AIMessage
+from ldaa.agents import compare_by_category as module
+from ldaa.agents.compare_by_category import compare_documents_by_category, group_by_category
+from ldaa.schemas import LegalAnalysisState, SegmentAnalysis
+
+def analysis(segment_id, category, confidence=0.9):
+    return SegmentAnalysis(segment=f"Text {segment_id}", segment_id=segment_id, summary=f"Summary {segment_id}", category=category, pros=["p"], cons=["c"], confidence=confidence, reasoning="R")
+
+class CategoryLLM:
+    """Answers per category; categories in `failing` return invalid output."""
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+
+    async def ainvoke(self, prompt):
+        category = prompt.split("'")[1]
+        self.calls.append(category)
+        if category in self.failing:
+            return AIMessage(content="not json")
+        return AIMessage(content=json.dumps({
+            "comparative_summary": f"{category} compared",
+            "similarities": [{"topic": category, "explanation": "both regulate it"}],
+            "differences": [],
+            "focus_areas": {"doc1": ["scope"], "doc2": ["scope"]},
+            "gaps": [f"{category} gap"],
+            "confidence": 0.8,
+            "reasoning": "ok",
+            "verbose_report": f"### {category}",
+        }))
+
+@pytest.fixture
+def state():
+    return LegalAnalysisState(
+        doc1_accepted_segments=[analysis("a1", "ethics"), analysis("a2", "governance"), analysis("a3", "made_up")],
+        doc2_accepted_segments=[analysis("b1", "ethics"), analysis("b2", "governance")],
+    )
+
+def test_group_by_category_follows_taxonomy(state):
+    groups = group_by_category(state.doc1_accepted_segments, state.doc2_accepted_segments, ["governance", "ethics"])
+    assert list(groups) == ["governance", "ethics", "other"]
+    assert [a.segment_id for a in groups["ethics"][0]] == ["a1"]
+    assert groups["other"][1] == []
+
+@pytest.mark.asyncio
+async def test_failed_category_is_recomputed_alone(state, monkeypatch):
+    llm = CategoryLLM(failing={"governance"})
+    monkeypatch.setattr(module, "get_llm", lambda cache=True: llm)
+    comparison, meta = await compare_documents_by_category(state)
+    assert sorted(llm.calls) == ["ethics", "governance", "other"]
+    assert comparison.success and "governance" in comparison.reasoning
+    assert comparison.meta["categories"]["governance"]["success"] is False
+    assert {"topic": "ethics", "explanation": "both regulate it"} in comparison.similarities
+    assert comparison.focus_areas["doc1"][:2] == ["ethics", "scope"]
+
+    llm.failing.clear()
+    llm.calls.clear()
+    comparison, meta = await compare_documents_by_category(state)
+    assert llm.calls == ["governance"]
+    assert meta["recomputed"] == ["governance"]
+    assert all(status["success"] for status in comparison.meta["categories"].values())
+    assert comparison.confidence == pytest.approx(0.8)
+    assert "## governance" in comparison.verbose_comparison
+
+@pytest.mark.asyncio
+async def test_deficient_category_rerun_keeps_other_parts(state, monkeypatch):
+    from ldaa.agents.refine_comparison import rerun_deficient_parts
+    from ldaa.schemas import ComparisonAction
+    llm = CategoryLLM()
+    monkeypatch.setattr(module, "get_llm", lambda cache=True: llm)
+    comparison, _ = await compare_documents_by_category(state)
+    # A later refinement pass rewrote the gaps
+    state.comparison_result = comparison.model_copy(update={"gaps": comparison.gaps + ["refined gap"]})
+
+    class RevisedLLM(CategoryLLM):
+        async def ainvoke(self, prompt):
+            response = await super().ainvoke(prompt)
+            return AIMessage(content=response.content.replace("both regulate it", "revised").replace("ethics gap", "new ethics gap"))
+
+    llm = RevisedLLM()
+    action = ComparisonAction(action="retry", confidence=0.5, reasoning="weak", deficient_parts=["category:ethics"])
+    result, meta = await rerun_deficient_parts(state, action, "map_reduce")
+    assert llm.calls == ["ethics"] and meta["recomputed"] == ["ethics"]
+    assert {"topic": "ethics", "explanation": "revised"} in result.similarities
+    assert {"topic": "ethics", "explanation": "both regulate it"} not in result.similarities
+    assert {"topic": "governance", "explanation": "both regulate it"} in result.similarities
+    assert "refined gap" in result.gaps and "new ethics gap" in result.gaps and "ethics gap" not in result.gaps
+    assert result.verbose_comparison.split("\n\n").count("## ethics") == 1
+    assert state.comparison_partials["ethics"]["gaps"] == ["new ethics gap"]
@@ -0,0 +1,87 @@
+import json
+import pytest
+from langchain_core.messages import AIMessageChunk
+from ldaa.agents import compare_documents as compare_module
+from ldaa.agents.compare_documents import compare_documents
+from ldaa.agents.config import load_config
+from ldaa.utils.json import IncrementalJSONParser
+
+COMPARISON = {
+    "comparative_summary": "Both bills regulate \"high-risk\" systems.",
+    "similarities": [{"topic": "risk_management", "explanation": "Impact assessments {ex ante}"}],
+    "differences": [],
+    "focus_areas": {"doc1": ["ethics"], "doc2": ["governance"]},
+    "gaps": ["No sanctions"],
+    "confidence": 0.8,
+    "reasoning": "ok",
+    "verbose_report": "# Report\nSección 1 \\ ü 😀\n| a | b |",
+}
+RESPONSE = "```json\n" + json.dumps(COMPARISON, indent=2) + "\n```"
+
+def feed_in_chunks(parser, text, size):
+    return [event for i in range(0, len(text), size) for event in parser.feed(text[i:i + size])]
+
+@pytest.mark.parametrize("size", [1, 3, 7, 64])
+def test_incremental_parser_matches_full_parse(size):
+    parser = IncrementalJSONParser(stream_fields={"verbose_report"})
+    events = feed_in_chunks(parser, RESPONSE, size)
+    assert parser.done and parser.result() == COMPARISON
+    assert [key for kind, key, _ in events if kind == "field"] == list(COMPARISON)
+    assert "".join(text for kind, _, text in events if kind == "delta") == COMPARISON["verbose_report"]
+
+def test_incremental_parser_emits_fields_before_the_end():
+    parser = IncrementalJSONParser()
+    events = parser.feed('{"comparative_summary": "Short", "confidence": 0.5, "verbose_report": "# Lo')
+    assert events == [("field", "comparative_summary", "Short"), ("field", "confidence", 0.5)]
+    assert not parser.done
+
+@pytest.mark.asyncio
+async def test_compare_documents_streams_report(dummy_state, dummy_config, dummy_store, monkeypatch, tmp_path):
+    class StreamingLLM:
+        async def astream(self, prompt):
+            for i in range(0, len(RESPONSE), 5):
+                yield AIMessageChunk(content=RESPONSE[i:i + 5])
+
+    settings = load_config().model_copy(deep=True)
+    settings.comparison.streaming = True
+    settings.comparison.report_path = str(tmp_path / "report.md")
+    monkeypatch.setattr(compare_module, "load_config", lambda: settings)
+    monkeypatch.setattr(compare_module, "get_llm", lambda cache=True: StreamingLLM())
+    state = await compare_documents(dummy_state.model_copy(), dummy_config, dummy_store)
+    assert state.comparison_result.success
+    assert state.comparison_result.verbose_comparison == COMPARISON["verbose_report"]
+    assert (tmp_path / "report.md").read_text(encoding="utf-8") == COMPARISON["verbose_report"]
+    stream = state.meta["compare"]["stream"]
+    assert stream["fields"] == list(COMPARISON)
+    assert stream["first_output_s"] is not None
+
+@pytest.mark.asyncio
+async def test_throttled_stream_restarts_cleanly(dummy_state, dummy_config, dummy_store, monkeypatch, tmp_path):
+    from ldaa.agents import llm as llm_module
+
+    class RateLimitError(Exception):
+        pass
+
+    class ThrottledOnceLLM:
+        attempts = 0
+
+        async def astream(self, prompt):
+            ThrottledOnceLLM.attempts += 1
+            for i in range(0, len(RESPONSE), 5):
+                if ThrottledOnceLLM.attempts == 1 and i >= len(RESPONSE) * 3 // 4:
+                    raise RateLimitError("429 Too Many Requests")
+                yield AIMessageChunk(content=RESPONSE[i:i + 5])
+
+    settings = load_config().model_copy(deep=True)
+    settings.comparison.streaming = True
+    settings.comparison.report_path = str(tmp_path / "report.md")
+    settings.scheduler.base_backoff = 0.001
+    monkeypatch.setattr(compare_module, "load_config", lambda: settings)
+    monkeypatch.setattr(llm_module, "load_config", lambda: settings)
+    monkeypatch.setattr(compare_module, "get_llm", lambda cache=True: ThrottledOnceLLM())
+    state = await compare_documents(dummy_state.model_copy(), dummy_config, dummy_store)
+    assert ThrottledOnceLLM.attempts == 2 and state.comparison_result.success
+    assert (tmp_path / "report.md").read_text(encoding="utf-8") == COMPARISON["verbose_report"]
+    stream = state.meta["compare"]["stream"]
+    assert stream["fields"] == list(COMPARISON) and stream["restarts"] == 1
+    assert not list(tmp_path.glob(".report.md.*"))
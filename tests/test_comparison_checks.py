@@ -0,0 +1,69 @@
+import json
+import pytest
+from langchain_core.messages import AIMessage
+from ldaa.agents import self_reflect_comparison as reflect_module
+from ldaa.agents.comparison_checks import check_comparison
+from ldaa.agents.self_reflect_comparison import self_reflect_comparison
+from ldaa.schemas import DocumentComparison, SegmentAnalysis
+
+TAXONOMY = ["ethics", "governance", "compliance"]
+
+def analysis(segment_id, category):
+    return SegmentAnalysis(segment="T", segment_id=segment_id, summary="S", category=category, pros=["p"], cons=["c"], confidence=0.9, reasoning="R")
+
+def comparison(**overrides):
+    fields = dict(
+        similarities=[{"topic": "ethics", "explanation": "Both"}],
+        differences=[{"topic": "governance", "explanation": "Only doc1"}],
+        focus_areas={"doc1": ["ethics"], "doc2": ["governance"]},
+        gaps=[], meta={}, verbose_comparison="# Report", comparative_summary="S",
+        confidence=0.9, reasoning="R", success=True,
+    )
+    fields.update(overrides)
+    return DocumentComparison(**fields)
+
+SEGMENTS = ([analysis("a1", "ethics")], [analysis("b1", "governance")])
+
+def test_structural_defects_retry_the_missing_parts():
+    verdict, parts, issues, metrics = check_comparison(
+        comparison(focus_areas={"doc1": ["ethics"]}, verbose_comparison=""), *SEGMENTS, TAXONOMY, 0.7, 0.5
+    )
+    assert verdict == "retry"
+    assert parts == ["focus_areas", "verbose_report"]
+    assert metrics["focus_areas_missing"] == ["doc2"] and not metrics["has_verbose_report"]
+
+def test_low_coverage_retries_uncovered_categories():
+    segments = ([analysis("a1", "ethics"), analysis("a2", "compliance")], [analysis("b1", "compliance")])
+    verdict, parts, _, metrics = check_comparison(
+        comparison(differences=[], focus_areas={"doc1": ["scope"], "doc2": ["scope"]}), *segments, ["ethics", "compliance", "governance"], 0.7, 0.6
+    )
+    assert metrics["category_coverage"] == 0.5
+    assert verdict == "retry" and parts == ["category:compliance"]
+
+def test_clean_confident_comparison_is_accepted():
+    verdict, parts, issues, _ = check_comparison(comparison(), *SEGMENTS, TAXONOMY, 0.7, 0.5)
+    assert (verdict, parts, issues) == ("accept", [], [])
+    assert check_comparison(comparison(confidence=0.6), *SEGMENTS, TAXONOMY, 0.7, 0.5)[0] is None
+
+@pytest.mark.asyncio
+async def test_borderline_comparison_goes_to_llm_with_metrics(dummy_state, dummy_config, dummy_store, monkeypatch):
+    prompts = []
+
+    class ReviewLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            return AIMessage(content=json.dumps({"action": "retry", "confidence": 0.6, "reasoning": "Gaps missing", "deficient_parts": ["gaps"]}))
+
+    monkeypatch.setattr(reflect_module, "get_llm", lambda cache=True: ReviewLLM())
+    state = dummy_state.model_copy()
+    state.doc1_accepted_segments, state.doc2_accepted_segments = SEGMENTS
+    state.comparison_result = comparison(similarities=[{"topic": "made_up", "explanation": "x"}])
+    state = await self_reflect_comparison(state, dummy_config, dummy_store)
+    assert len(prompts) == 1 and "topics outside the taxonomy: made_up" in prompts[0]
+    assert state.comparison_action.action == "retry" and state.comparison_action.deficient_parts == ["gaps"]
+
+    prompts.clear()
+    state.comparison_result = comparison(gaps=["g"])
+    state = await self_reflect_comparison(state, dummy_config, dummy_store)
+    assert prompts == [] and state.comparison_action.action == "accept"
+    assert state.meta["reflect_comparison"]["checks"]["verdict"] == "accept"
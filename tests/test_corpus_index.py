@@ -0,0 +1,69 @@
+import os
+from unittest.mock import patch
+import pytest
+from ldaa.agents.embeddings import HashingEmbeddings
+from ldaa.utils.corpus_index import CURRENT_FILE, CorpusIndex
+
+SPEC = {"backend": "hashing", "dimensions": 128}
+
+class CountingEmbeddings(HashingEmbeddings):
+    def __init__(self, dimensions=128):
+        super().__init__(dimensions=dimensions)
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded += list(texts)
+        return super().embed_documents(texts)
+
+def chunks(*texts):
+    return [(text, {"text_id": text[:6]}) for text in texts]
+
+def test_incremental_sync_tombstones_and_revives(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = CorpusIndex(tmp_path, compact_ratio=0.9)
+    index.sync({"a.pdf": chunks("alpha clause", "beta clause"), "b.pdf": chunks("beta clause")}, embeddings, SPEC)
+    index.save()
+    assert embeddings.embedded == ["alpha clause", "beta clause"]
+
+    index = CorpusIndex(tmp_path, compact_ratio=0.9)
+    embeddings.embedded.clear()
+    stats = index.sync({"a.pdf": chunks("beta clause", "gamma clause")}, embeddings, SPEC)
+    assert embeddings.embedded == ["gamma clause"]
+    assert (stats["added"], stats["kept"], stats["tombstoned"]) == (1, 1, 1)
+    assert index.stats()["vectors"] == 3 and "alpha clause" not in [d.page_content for d in index.search("alpha clause", embeddings, k=3)]
+
+    embeddings.embedded.clear()
+    stats = index.sync({"b.pdf": chunks("beta clause", "alpha clause")}, embeddings, SPEC)
+    assert stats["revived"] == 1 and embeddings.embedded == []
+    assert index.search("alpha clause", embeddings, k=1)[0].metadata["sources"] == ["b.pdf"]
+
+def test_compaction_removes_tombstoned_vectors(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = CorpusIndex(tmp_path, compact_ratio=0.5)
+    index.sync({"a.pdf": chunks("one", "two", "three", "four")}, embeddings, SPEC)
+    assert index.sync({"a.pdf": chunks("one", "two", "three")}, embeddings, SPEC)["compacted"] == 0
+    assert index.sync({"a.pdf": chunks("one")}, embeddings, SPEC)["compacted"] == 3
+    assert index.stats() == {"generation": 0, "live_chunks": 1, "tombstones": 0, "vectors": 1}
+
+def test_failed_save_keeps_previous_generation(tmp_path):
+    embeddings = CountingEmbeddings()
+    index = CorpusIndex(tmp_path)
+    index.sync({"a.pdf": chunks("first")}, embeddings, SPEC)
+    index.save()
+    index.sync({"a.pdf": chunks("first", "second")}, embeddings, SPEC)
+    with patch("ldaa.utils.corpus_index.os.replace", side_effect=OSError("disk full")):
+        with pytest.raises(OSError):
+            index.save()
+    reloaded = CorpusIndex(tmp_path)
+    assert reloaded.generation == 1 and reloaded.stats()["live_chunks"] == 1
+    reloaded.save()
+    assert (tmp_path / CURRENT_FILE).read_text() == "gen-000002"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+def test_changed_embedder_reembeds_live_chunks(tmp_path):
+    index = CorpusIndex(tmp_path)
+    index.sync({"a.pdf": chunks("alpha", "beta")}, CountingEmbeddings(), SPEC)
+    wider = CountingEmbeddings(dimensions=256)
+    stats = index.sync({"b.pdf": chunks("gamma")}, wider, {**SPEC, "dimensions": 256})
+    assert stats["reembedded"] == 2 and sorted(wider.embedded) == ["alpha", "beta", "gamma"]
+    assert index.index.d == 256 and index.search("beta", wider, k=1)[0].page_content == "beta"
@@ -24,4 +24,70 @@ async def test_decide_segmentation_no_text(dummy_state, dummy_config, dummy_stor
     assert result.doc1_segments == []
     assert result.doc2_segments == []
     assert not result.meta['segmentation']['doc1']['success']
-    assert not result.meta['segmentation']['doc2']['success'] 
\ No newline at end of file
+    assert not result.meta['segmentation']['doc2']['success'] 
+@pytest.mark.asyncio
+async def test_segment_with_llm_windowed_reconciles_boundaries(monkeypatch):
+    import re
+    from ldaa.agents import decide_segmentation as module
+    articles = [f"Artículo {n}.- Disposición número {n} de la ley.\nContinúa el artículo {n} con más texto." for n in range(1, 21)]
+    text = "\n".join(articles)
+    async def fake_segment_with_llm(window_text, doc_label="doc"):
+        # Split at article headings; a window starting mid-article yields a partial segment
+        parts = [p for p in re.split(r"(?m)^(?=Artículo)", window_text) if p.strip()]
+        return [{"title": "", "text": p, "segment_type": "article"} for p in parts], {"success": True, "reasoning": []}
+    monkeypatch.setattr(module, "segment_with_llm", fake_segment_with_llm)
+    settings = module.load_config().model_copy(deep=True)
+    settings.segmentation.window_tokens = 60
+    settings.segmentation.overlap_tokens = 15
+    monkeypatch.setattr(module, "load_config", lambda: settings)
+    windows = module.split_into_windows(text, 60, 15)
+    assert len(windows) > 3
+    assert all(b[0] < a[1] for a, b in zip(windows, windows[1:]))  # consecutive windows overlap
+    segments, meta = await module.segment_with_llm_windowed(text, doc_label="doc1")
+    assert meta["windows"] == len(windows)
+    assert [seg["text"] for seg in segments] == articles
+
+@pytest.mark.asyncio
+async def test_decide_segmentation_slices_boundary_output(dummy_state, dummy_config, dummy_store, monkeypatch):
+    from ldaa.agents import decide_segmentation as module
+    prompts = []
+    class BoundaryLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            class Response:
+                # Second anchor has different whitespace than the document; snapping must still place it
+                content = '[{"title": "Intro", "start_anchor": "Section 1. Foo.", "segment_type": "section"}, {"title": "Second", "start_anchor": "Section  2.\\nBar", "segment_type": "section"}]'
+            return Response()
+    monkeypatch.setattr(module, "get_llm", lambda: BoundaryLLM())
+    settings = module.load_config().model_copy(deep=True)
+    settings.segmentation.strategy = "llm"
+    settings.segmentation.output = "boundaries"
+    monkeypatch.setattr(module, "load_config", lambda: settings)
+    state = dummy_state.model_copy()
+    state.doc1_text = 'Preamble. Section 1. Foo. Section 2. Bar.'
+    state.doc2_text = ''
+    result = await decide_segmentation(state, dummy_config, dummy_store)
+    assert "start_anchor" in prompts[0]
+    assert [seg.text for seg in result.doc1_segments] == ['Preamble. Section 1. Foo.', 'Section 2. Bar.']
+    assert [seg.title for seg in result.doc1_segments] == ['Intro', 'Second']
+    assert [seg.position for seg in result.doc1_segments] == [0, 1]
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("output", ["full_text", "boundaries"])
+async def test_segment_with_llm_output_estimate_matches_mode(monkeypatch, output):
+    from ldaa.agents import decide_segmentation as module
+    estimates = []
+    async def fake_invoke_llm(llm, prompt, expected_output_tokens=None, **kwargs):
+        estimates.append(expected_output_tokens)
+        class Response:
+            content = "[]"
+        return Response()
+    monkeypatch.setattr(module, "invoke_llm", fake_invoke_llm)
+    monkeypatch.setattr(module, "get_llm", lambda: None)
+    settings = module.load_config().model_copy(deep=True)
+    settings.segmentation.output = output
+    monkeypatch.setattr(module, "load_config", lambda: settings)
+    text = "Section 1. Foo. " * 200
+    await module.segment_with_llm(text)
+    # Boundaries are short anchors: the configured default estimate applies instead of the document length
+    assert estimates == [module.count_tokens(text, settings.model) if output == "full_text" else None]
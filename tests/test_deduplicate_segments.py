@@ -0,0 +1,48 @@
+import json
+import pytest
+from ldaa.agents import analyze_segment as analyze_module
+from ldaa.agents.deduplicate_segments import deduplicate_segments
+from ldaa.schemas import DocumentSegment, LegalAnalysisState
+from ldaa.utils.minhash import cluster_duplicates
+
+DEFINITIONS = (
+    "Para los efectos de esta Ley se entenderá por Autoridad la dependencia encargada de la "
+    "supervisión de los sistemas de inteligencia artificial, y por Usuario toda persona física "
+    "o moral que utilice dichos sistemas en el territorio nacional conforme a las disposiciones aplicables."
+)
+
+def test_cluster_duplicates_groups_exact_and_near_copies():
+    texts = [
+        DEFINITIONS,
+        "Una disposición completamente distinta sobre sanciones administrativas.",
+        DEFINITIONS.upper(),  # Exact after normalization
+        DEFINITIONS.replace("nacional", "mexicano"),  # One word changed
+        "",
+    ]
+    assert cluster_duplicates(texts, threshold=0.7) == [0, 1, 0, 0, 4]
+    assert cluster_duplicates(texts, near=False) == [0, 1, 0, 3, 4]
+
+@pytest.mark.asyncio
+async def test_duplicate_segments_are_analyzed_once(dummy_config, dummy_store, monkeypatch):
+    prompts = []
+
+    class CountingLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            class Response:
+                content = json.dumps({"summary": "Definitions", "category": "general_provisions", "pros": ["a"], "cons": ["b"], "confidence": 0.9, "reasoning": "R"})
+            return Response()
+
+    monkeypatch.setattr(analyze_module, "get_llm", lambda cache=True: CountingLLM())
+    state = LegalAnalysisState(
+        doc1_segments=[DocumentSegment(id="doc1_seg_0", text=DEFINITIONS, document_id="doc1", segment_type="article", position=0)],
+        doc2_segments=[DocumentSegment(id="doc2_seg_0", text=DEFINITIONS + " ", document_id="doc2", segment_type="article", position=0)],
+    )
+    state = deduplicate_segments(state, dummy_config, dummy_store)
+    assert state.meta["dedup"] == {"segments": 2, "clusters": 1, "duplicates": 1, "cross_document": 1}
+    result = await analyze_module.analyze_segment(state, dummy_config, dummy_store)
+    assert len(prompts) == 1
+    shared = result.doc2_analysis[0]
+    assert shared.segment_id == "doc2_seg_0" and shared.summary == "Definitions"
+    assert shared.meta["dedup"] == {"analyzed_as": "doc1_seg_0", "shared_with": ["doc1_seg_0"], "match": "exact"}
+    assert result.doc1_analysis[0].meta["dedup"]["shared_with"] == ["doc2_seg_0"]
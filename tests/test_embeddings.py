@@ -0,0 +1,46 @@
+import pytest
+import numpy as np
+from ldaa.agents.config import load_config
+from ldaa.agents.embeddings import HashingEmbeddings, embedding_spec, embeddings_from_spec, get_embeddings
+
+def test_hashing_embeddings_are_normalized_and_batched():
+    texts = ["The board approves the budget.", "the BOARD approves the budget", "Unrelated privacy clause."]
+    batched = HashingEmbeddings(dimensions=256, batch_size=2).encode(texts)
+    assert batched.shape == (3, 256) and batched.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(batched, axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(batched, HashingEmbeddings(dimensions=256).encode(texts))
+    assert batched[0] @ batched[1] > 0.99 > batched[0] @ batched[2]
+
+def test_backend_selected_from_config_and_spec():
+    settings = load_config().embeddings.model_copy(update={"backend": "hashing", "dimensions": 64})
+    embedder = get_embeddings(settings)
+    assert isinstance(embedder, HashingEmbeddings) and len(embedder.embed_query("text")) == 64
+    assert embeddings_from_spec(embedding_spec(settings)).dimensions == 64
+
+@pytest.mark.asyncio
+async def test_alignment_uses_configured_local_backend(dummy_config, dummy_store, monkeypatch):
+    import langchain_openai
+    from ldaa.agents import align_segments as align_module
+    from ldaa.schemas import LegalAnalysisState, SegmentAnalysis
+
+    def offline(*args, **kwargs):
+        raise AssertionError("network embedder used")
+
+    monkeypatch.setattr(langchain_openai, "OpenAIEmbeddings", offline)
+    settings = load_config().model_copy(deep=True)
+    settings.embeddings.backend = "hashing"
+    monkeypatch.setattr(align_module, "load_config", lambda: settings)
+
+    def analysis(segment_id, summary):
+        return SegmentAnalysis(segment=summary, segment_id=segment_id, summary=summary, category="ethics", pros=["p"], cons=["c"], confidence=0.9, reasoning="R")
+
+    state = LegalAnalysisState(
+        doc1_accepted_segments=[analysis("a1", "Providers of high-risk systems shall keep a risk management system.")],
+        doc2_accepted_segments=[
+            analysis("b1", "A national supervisory authority handles market surveillance."),
+            analysis("b2", "Developers of high-risk systems must keep a risk management process."),
+        ],
+    )
+    state = await align_module.align_segments(state, dummy_config, dummy_store)
+    assert [(p["doc1"], p["doc2"]) for p in state.segment_alignment["pairs"]] == [("a1", "b2")]
+    assert state.meta["alignment"]["embeddings"]["backend"] == "hashing" and state.meta["alignment"]["threshold"] == 0.3
@@ -0,0 +1,48 @@
+import pytest
+from ldaa.agents.llm import CachedChatModel
+from ldaa.utils.cache import LLMResponseCache
+from ldaa.utils import get_random_prompt_variant
+
+@pytest.mark.asyncio
+async def test_cached_llm_reuses_responses_across_runs(tmp_path):
+    calls = []
+
+    class CountingLLM:
+        async def ainvoke(self, prompt):
+            calls.append(prompt)
+            class Response:
+                content = '{"ok": true}'
+            return Response()
+
+    cache = LLMResponseCache(tmp_path / "llm.sqlite", ttl_seconds=None, max_entries=2)
+    templates = ["A {text}", "B {text}", "C {text}"]
+    for _ in range(3):  # Reruns pick the same seeded variant and hit the cache
+        llm = CachedChatModel(CountingLLM(), cache, "test-model")
+        prompt = get_random_prompt_variant(templates, {"text": "Foo"}, seed="segment-hash")
+        response = await llm.ainvoke(prompt + "  \n\n")
+        assert response.content == '{"ok": true}'
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 2 and cache.stats()["hit_rate"] == round(2 / 3, 4)
+    for text in ("x", "y", "z"):
+        cache.put(cache.key_for("test-model", text), text)
+    assert cache.get(cache.key_for("test-model", prompt)) is None  # Evicted as least recently used
+    assert cache.stats()["evictions"] >= 1
+
+@pytest.mark.asyncio
+async def test_cache_hits_bypass_the_scheduler(tmp_path, monkeypatch):
+    from langchain_core.messages import AIMessage
+    from ldaa.agents import llm as llm_module
+
+    class EchoLLM:
+        async def ainvoke(self, prompt):
+            return AIMessage(content=f"answer to {prompt}")
+
+    llm = CachedChatModel(EchoLLM(), LLMResponseCache(tmp_path / "llm.sqlite", ttl_seconds=None, max_entries=10), "test-model")
+    first = await llm_module.invoke_llm(llm, "question")
+    scheduler = llm_module.get_scheduler()
+    calls = scheduler.stats()["calls"]
+    chunks = []
+    second = await llm_module.invoke_llm(llm, "question", on_chunk=chunks.append)
+    assert second.content == first.content == "answer to question"
+    assert second.response_metadata["cache_hit"] and chunks == ["answer to question"]
+    assert scheduler.stats()["calls"] == calls
@@ -0,0 +1,51 @@
+import os
+import pytest
+from ldaa.agents import llm as llm_module
+from ldaa.agents.config import load_config, LLMPoolConfig
+
+def test_load_config_is_cached_until_mtime_changes(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text('model: "gpt-4o"\nconfidence_threshold: 0.7\ntaxonomy: [ethics]\n')
+    first = load_config(str(path))
+    assert load_config(str(path)) is first
+    path.write_text('model: "gpt-4o"\nconfidence_threshold: 0.5\ntaxonomy: [ethics]\n')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    reloaded = load_config(str(path))
+    assert reloaded is not first and reloaded.confidence_threshold == 0.5
+
+@pytest.mark.asyncio
+async def test_client_pool_shares_one_client_per_model(monkeypatch):
+    created = []
+
+    def fake_init_chat_model(model, **kwargs):
+        created.append((model, kwargs))
+        return object()
+
+    monkeypatch.setattr(llm_module, "init_chat_model", fake_init_chat_model)
+    pool = llm_module.ClientPool()
+    settings = LLMPoolConfig(max_connections=4, max_keepalive_connections=2)
+    first = pool.get("openai:gpt-4o", settings)
+    assert pool.get("openai:gpt-4o", settings) is first
+    assert pool.get("anthropic:claude", settings) is not first
+    assert "http_async_client" in created[0][1] and created[1][1] == {}
+    stats = pool.stats()
+    assert stats["clients"] == 2 and stats["created"] == 2 and stats["reused"] == 1
+    assert stats["open_connections"] == 0
+
+@pytest.mark.asyncio
+async def test_client_pool_closes_its_http_clients(monkeypatch):
+    monkeypatch.setattr(llm_module, "init_chat_model", lambda model, **kwargs: kwargs)
+    pool = llm_module.ClientPool()
+    kwargs = pool.get("openai:gpt-4o", LLMPoolConfig())
+    await pool.aclose()
+    assert kwargs["http_client"].is_closed and kwargs["http_async_client"].is_closed
+    assert pool.stats()["clients"] == 0
+    assert pool.get("openai:gpt-4o", LLMPoolConfig()) is not kwargs  # A fresh client after closing
+
+def test_client_pool_close_releases_clients_outside_a_loop(monkeypatch):
+    monkeypatch.setattr(llm_module, "init_chat_model", lambda model, **kwargs: kwargs)
+    pool = llm_module.ClientPool()
+    kwargs = pool.get("openai:gpt-4o", LLMPoolConfig())
+    pool.close()
+    assert kwargs["http_client"].is_closed and pool.stats()["clients"] == 0
@@ -0,0 +1,35 @@
+import logging
+import pytest
+from ldaa.utils import logging as ldaa_logging
+from ldaa.utils.logging import log_debug, truncate, RingBufferHandler
+
+@pytest.fixture
+def restore_logger():
+    logger = ldaa_logging.logger
+    level, handlers, propagate = logger.level, list(logger.handlers), logger.propagate
+    yield logger
+    logger.setLevel(level)
+    logger.handlers = handlers
+    logger.propagate = propagate
+
+def test_log_debug_is_lazy_when_disabled(restore_logger):
+    restore_logger.setLevel(logging.INFO)
+    def expensive():
+        raise AssertionError("payload must not be rendered when debug is disabled")
+    log_debug("TEST", "Not emitted", payload=expensive)
+
+def test_truncate_bounds_payload():
+    rendered = truncate("x" * 1000, limit=10)
+    assert rendered.startswith("'xxxxxxxxxx'")
+    assert "+990 chars" in rendered
+    assert truncate("short", limit=10) == "'short'"
+
+def test_ring_buffer_keeps_recent_records(restore_logger):
+    handler = ldaa_logging.enable_ring_buffer(capacity=3)
+    for i in range(5):
+        log_debug("TEST", f"record {i}", text="y" * 1000)
+    records = handler.dump()
+    assert len(records) == 3
+    assert "record 4" in records[-1]
+    assert len(records[-1]) < 1000
+    assert isinstance(handler, RingBufferHandler)
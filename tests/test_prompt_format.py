@@ -0,0 +1,46 @@
+from ldaa.agents.compare_documents import PROMPT_FIELDS
+from ldaa.schemas import DocumentComparison, SegmentAnalysis
+from ldaa.utils.prompt_format import format_analyses, format_comparison, serialization_savings, truncate
+
+ARTICLE = (
+    "Artículo 5. Los sistemas de inteligencia artificial de alto riesgo deberán contar con una "
+    "evaluación de impacto previa a su despliegue, que será revisada por la Autoridad competente "
+    "y publicada en los términos que establezca el reglamento de esta Ley. "
+) * 6
+
+def analysis(i):
+    return SegmentAnalysis(
+        segment=ARTICLE, segment_id=f"doc1_{i}", summary="Requires a prior impact assessment for high-risk AI systems.",
+        category="risk_management", segment_type="article", pros=["Prevents harm", "Transparency"], cons=["Compliance cost"],
+        confidence=0.87, reasoning="The article sets an ex-ante obligation.", meta={"dedup": {"analyzed_as": "doc1_0"}},
+    )
+
+def test_truncate_cuts_at_word_boundary():
+    assert truncate("one two three", 7) == "one two…"
+    assert truncate("  spaced\n text ") == "spaced text"
+    assert truncate("abc", 0) == ""
+
+def test_format_analyses_keeps_only_declared_fields():
+    rendered = format_analyses([analysis(1)], PROMPT_FIELDS, 300)
+    assert rendered.splitlines()[0] == "[doc1_1] risk_management | conf 0.87"
+    assert "  pros: Prevents harm; Transparency" in rendered
+    assert "Artículo 5" not in rendered and "analyzed_as" not in rendered
+    assert format_analyses([]) == "(none)"
+
+def test_compact_prompts_are_less_than_half_the_repr():
+    analyses = [analysis(i) for i in range(20)]
+    savings = serialization_savings(format_analyses(analyses, PROMPT_FIELDS, 300), str(analyses))
+    assert savings["saved_ratio"] > 0.5
+    assert savings["saved_tokens"] == savings["repr_tokens"] - savings["prompt_tokens"]
+
+def test_format_comparison_sections():
+    comparison = DocumentComparison(
+        similarities=[{"topic": "ethics", "explanation": "Both require audits"}], differences=[],
+        focus_areas={"doc1": ["ethics"], "doc2": []}, gaps=["No sanctions regime"], meta={},
+        verbose_comparison="# Report\n" + "long " * 500, comparative_summary="Similar", confidence=0.8, reasoning="R", success=True,
+    )
+    rendered = format_comparison(comparison, max_chars=100)
+    assert "similarities (1):\n  - ethics: Both require audits" in rendered
+    assert "differences (0):" in rendered and "  doc1: ethics" in rendered
+    assert "confidence: 0.80" in rendered
+    assert len(rendered) < 700
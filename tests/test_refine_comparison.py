@@ -0,0 +1,113 @@
+import json
+import pytest
+from langchain_core.messages import AIMessage
+from ldaa.agents import refine_comparison as refine_module
+from ldaa.agents import self_reflect_comparison as reflect_module
+from ldaa.agents.config import load_config
+from ldaa.agents.analyze_segment import pending_segment_indices
+from ldaa.agents.compare_documents import compare_documents
+from ldaa.agents.graph import comparison_reflection_router
+from ldaa.agents.refine_comparison import flag_segments_for_reboot, normalize_deficient_parts
+from ldaa.agents.self_reflect_comparison import self_reflect_comparison
+from ldaa.schemas import ComparisonAction, DocumentComparison, SegmentAction, SegmentAnalysis
+
+TAXONOMY = ["ethics", "governance"]
+
+def analysis(segment_id, category):
+    return SegmentAnalysis(segment="T", segment_id=segment_id, summary="S", category=category, pros=["p"], cons=["c"], confidence=0.9, reasoning="R")
+
+def test_normalize_deficient_parts():
+    parts = ["gaps", "verbose_comparison", "ethics", "category:governance", "category:made_up", "nonsense", "gaps"]
+    assert normalize_deficient_parts(parts, TAXONOMY) == ["gaps", "verbose_report", "category:ethics", "category:governance"]
+
+@pytest.mark.asyncio
+async def test_retry_regenerates_only_deficient_parts(dummy_state, dummy_config, dummy_store, monkeypatch):
+    prompts = []
+
+    class RefineLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            return AIMessage(content=json.dumps({
+                "gaps": ["New gap"],
+                "categories": {"ethics": {"similarities": [{"explanation": "Both require ethics boards"}], "differences": []}},
+                "confidence": 0.85,
+                "reasoning": "Refined",
+            }))
+
+    monkeypatch.setattr(refine_module, "get_llm", lambda cache=True: RefineLLM())
+    state = dummy_state.model_copy()
+    state.comparison_result = DocumentComparison(
+        similarities=[{"topic": "ethics", "explanation": "Old"}, {"topic": "governance", "explanation": "Kept"}],
+        differences=[{"topic": "ethics", "explanation": "Old difference"}],
+        focus_areas={"doc1": ["ethics"], "doc2": ["governance"]}, gaps=["Old gap"], meta={},
+        verbose_comparison="# Report", comparative_summary="Summary", confidence=0.5, reasoning="R", success=True,
+    )
+    state.comparison_action = ComparisonAction(action="retry", confidence=0.5, reasoning="Gaps are weak", deficient_parts=["gaps", "category:ethics"])
+    state = await compare_documents(state, dummy_config, dummy_store)
+    result = state.comparison_result
+    assert len(prompts) == 1 and "Gaps are weak" in prompts[0]
+    assert result.gaps == ["New gap"]
+    assert result.similarities == [{"topic": "governance", "explanation": "Kept"}, {"topic": "ethics", "explanation": "Both require ethics boards"}]
+    assert result.differences == []
+    assert result.verbose_comparison == "# Report" and result.focus_areas["doc1"] == ["ethics"]
+    assert result.confidence == 0.85
+    assert state.meta["compare"]["refined"] == ["gaps", "category:ethics"]
+    assert state.comparison_attempts == 1
+
+def test_reboot_flags_only_deficient_categories(dummy_state):
+    state = dummy_state.model_copy()
+    state.doc1_analysis = [analysis("a1", "ethics"), analysis("a2", "governance")]
+    state.doc2_analysis = [analysis("b1", "governance")]
+    state.doc1_segment_actions = [SegmentAction(segment_index=i, action="accept", confidence=0.9, reasoning="ok") for i in range(2)]
+    state.doc2_segment_actions = [SegmentAction(segment_index=0, action="accept", confidence=0.9, reasoning="ok")]
+    state.doc1_segment_attempts = [1, 3]
+    state.doc2_segment_attempts = [1]
+    flagged = flag_segments_for_reboot(state, ["governance"], TAXONOMY, max_attempts=3)
+    assert flagged == {"doc1": 0, "doc2": 1}  # a2 is out of attempts
+    actions = {"doc1": state.doc1_segment_actions, "doc2": state.doc2_segment_actions}
+    items = {"doc1": state.doc1_analysis, "doc2": state.doc2_analysis}
+    assert pending_segment_indices(items, actions) == {"doc1": [], "doc2": [0]}
+
+@pytest.mark.asyncio
+async def test_reboot_without_flagged_segments_becomes_retry(dummy_state, dummy_config, dummy_store, monkeypatch):
+    class RebootLLM:
+        async def ainvoke(self, prompt):
+            return AIMessage(content=json.dumps({"action": "reboot", "confidence": 0.3, "reasoning": "Redo governance", "deficient_parts": ["category:governance"]}))
+
+    settings = load_config().model_copy(deep=True)
+    settings.taxonomy = TAXONOMY
+    settings.reflection.local_comparison_checks = False
+    monkeypatch.setattr(reflect_module, "load_config", lambda: settings)
+    monkeypatch.setattr(reflect_module, "get_llm", lambda cache=True: RebootLLM())
+    state = dummy_state.model_copy(deep=True)
+    state.doc1_analysis = [analysis("a1", "ethics")]  # No governance segments to re-analyze
+    state = await self_reflect_comparison(state, dummy_config, dummy_store)
+    assert state.meta["reflect_comparison"]["reboot"] == {"doc1": 0, "doc2": 0}
+    assert state.comparison_action.action == "retry"
+    assert [a.action for a in state.doc1_segment_actions + state.doc2_segment_actions] == ["accept", "accept"]
+    assert comparison_reflection_router(state) == "compare_documents"
+
+@pytest.mark.asyncio
+async def test_failed_reflection_is_a_comparison_action(dummy_state, dummy_config, dummy_store, monkeypatch):
+    class BrokenLLM:
+        async def ainvoke(self, prompt):
+            return AIMessage(content="not json")
+
+    settings = load_config().model_copy(deep=True)
+    settings.reflection.local_comparison_checks = False
+    monkeypatch.setattr(reflect_module, "load_config", lambda: settings)
+    monkeypatch.setattr(reflect_module, "get_llm", lambda cache=True: BrokenLLM())
+    state = await self_reflect_comparison(dummy_state.model_copy(deep=True), dummy_config, dummy_store)
+    assert isinstance(state.comparison_action, ComparisonAction) and state.comparison_action.action == "mark_review"
+    assert comparison_reflection_router(state) == "human_in_the_loop_comparison"
+
+@pytest.mark.parametrize("action,route", [
+    ("retry", "compare_documents"),
+    ("reboot", "analyze_segment"),
+    ("mark_review", "human_in_the_loop_comparison"),
+    ("accept", "final_audit_export"),
+])
+def test_comparison_reflection_router(dummy_state, action, route):
+    state = dummy_state.model_copy()
+    state.comparison_action = ComparisonAction(action=action, confidence=0.5, reasoning="R")
+    assert comparison_reflection_router(state) == route
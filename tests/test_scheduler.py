@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from ldaa.utils.scheduler import LLMScheduler, is_rate_limit_error
+
+class FakeRateLimitError(Exception):
+    status_code = 429
+
+@pytest.mark.asyncio
+async def test_scheduler_preserves_order_and_caps_concurrency():
+    scheduler = LLMScheduler(max_concurrency=3)
+    active = {"now": 0, "peak": 0}
+
+    async def call(i):
+        active["now"] += 1
+        active["peak"] = max(active["peak"], active["now"])
+        await asyncio.sleep(0.01 * (10 - i))  # Later jobs finish first
+        active["now"] -= 1
+        return i
+
+    results = await asyncio.gather(*(scheduler.submit(lambda i=i: call(i)) for i in range(10)))
+    assert results == list(range(10))
+    assert active["peak"] == 3
+    assert scheduler.stats()["peak_concurrency"] == 3
+
+@pytest.mark.asyncio
+async def test_scheduler_retries_throttled_calls_and_backs_off():
+    scheduler = LLMScheduler(max_concurrency=4, base_backoff=0.001)
+    attempts = {"n": 0}
+
+    async def flaky():
+        attempts["n"] += 1
+        if attempts["n"] < 3:
+            raise FakeRateLimitError("Too Many Requests")
+        return "ok"
+
+    assert await scheduler.submit(flaky) == "ok"
+    stats = scheduler.stats()
+    assert stats["retries"] == 2 and stats["throttled"] == 2
+    assert stats["concurrency_limit"] < stats["max_concurrency"]  # Halved twice, regrown once
+    assert is_rate_limit_error(FakeRateLimitError())
+
+@pytest.mark.asyncio
+async def test_scheduler_raises_other_errors_without_retry():
+    scheduler = LLMScheduler(max_concurrency=2, base_backoff=0.001)
+
+    async def broken():
+        raise ValueError("bad prompt")
+
+    with pytest.raises(ValueError):
+        await scheduler.submit(broken)
+    assert scheduler.stats()["retries"] == 0
@@ -23,4 +23,38 @@ async def test_self_reflect_segment_empty(dummy_state, dummy_config, dummy_store
     state.doc2_analysis = []
     result = await self_reflect_segment(state, dummy_config, dummy_store)
     assert result.doc1_segment_actions == []
-    assert result.doc2_segment_actions == [] 
\ No newline at end of file
+    assert result.doc2_segment_actions == [] 
+@pytest.mark.asyncio
+async def test_self_reflect_segment_caps_retries(dummy_state, dummy_config, dummy_store, monkeypatch):
+    from ldaa.agents import self_reflect_segment as module
+    from ldaa.schemas import SegmentAction
+    prompts = []
+
+    class RetryLLM:
+        async def ainvoke(self, prompt):
+            prompts.append(prompt)
+            class Response:
+                content = '{"action": "retry", "confidence": 0.3, "reasoning": "Still weak"}'
+            return Response()
+
+    monkeypatch.setattr(module, "get_llm", lambda cache=True: RetryLLM())
+    state = dummy_state.model_copy()
+    # In the taxonomy but below the confidence threshold, so no local rule settles it
+    state.doc1_analysis = [state.doc1_analysis[0].model_copy(update={"category": "ethics", "confidence": 0.5})]
+    state.doc1_segment_actions = [SegmentAction(segment_index=0, action='retry', confidence=0.3, reasoning='Weak')]
+    state.doc1_segment_attempts = [3]
+    result = await self_reflect_segment(state, dummy_config, dummy_store)
+    assert len(prompts) == 1  # doc2's accepted segment is not reflected on again
+    assert result.doc1_segment_actions[0].action == 'mark_review'
+    assert result.doc2_segment_actions == dummy_state.doc2_segment_actions
+
+def test_pre_reflect_rules_decide_clear_cases():
+    from ldaa.agents.reflection_rules import pre_reflect
+    base = {"summary": "S", "category": "ethics", "pros": ["a"], "cons": ["b"], "confidence": 0.9, "reasoning": "R"}
+    taxonomy = ["ethics"]
+    assert pre_reflect(base, 0, 0.7, taxonomy)["rule"] == "confidence_above_threshold"
+    assert pre_reflect({**base, "confidence": 0.5}, 0, 0.7, taxonomy) is None
+    failed = {**base, "pros": [], "cons": [], "confidence": 0.0, "reasoning": "LLM analysis failed: timeout", "success": False}
+    assert pre_reflect(failed, 0, 0.7, taxonomy)["rule"] == "analysis_failed"
+    assert pre_reflect({**base, "cons": []}, 0, 0.7, taxonomy)["action"] == "retry"
+    assert pre_reflect({**base, "category": "astrology"}, 0, 0.7, taxonomy)["rule"] == "category_in_taxonomy"
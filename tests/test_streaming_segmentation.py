@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from ldaa.agents.streaming_segmentation import ingest_and_segment, segment_page_stream, split_at_boundary
+from ldaa.schemas import LegalAnalysisState
+
+def test_split_at_boundary_carries_unfinished_text():
+    batch, carry = split_at_boundary("Artículo 1. Texto completo.\nArtículo 2. Texto que\ncontinúa")
+    assert batch == "Artículo 1. Texto completo.\n"
+    assert carry == "Artículo 2. Texto que\ncontinúa"
+
+@pytest.mark.asyncio
+async def test_segment_page_stream_overlaps_extraction(monkeypatch):
+    events = []
+    async def fake_segment_document(text, doc_label="doc"):
+        events.append(("segment", text))
+        return [{"title": line, "text": line} for line in text.splitlines() if line], {"success": True, "reasoning": []}
+    monkeypatch.setattr("ldaa.agents.streaming_segmentation.segment_document", fake_segment_document)
+    async def pages():
+        for n in range(1, 5):
+            events.append(("page", n))
+            yield f"Page {n}."
+            await asyncio.sleep(0)
+    segments, meta = await segment_page_stream(pages(), "doc1", pages_per_batch=2)
+    assert [seg["text"] for seg in segments] == ["Page 1.", "Page 2.", "Page 3.", "Page 4."]
+    assert meta["batches"] == 2
+    # The first batch is segmented before the last page has been produced
+    assert events.index(("segment", "Page 1.\nPage 2.")) < events.index(("page", 4))
+
+@pytest.mark.asyncio
+async def test_ingest_and_segment_matches_batch_numbering(tmp_path, monkeypatch):
+    class DummyPage:
+        def extract_text(self):
+            return "Artículo 1. Foo."
+    class DummyPDF:
+        pages = [DummyPage(), DummyPage(), DummyPage()]
+        def __enter__(self): return self
+        def __exit__(self, exc_type, exc_val, exc_tb): pass
+    monkeypatch.setattr("pdfplumber.open", lambda path: DummyPDF())
+    async def fake_segment_document(text, doc_label="doc"):
+        return [{"text": line} for line in text.splitlines() if line], {"success": True, "reasoning": []}
+    monkeypatch.setattr("ldaa.agents.streaming_segmentation.segment_document", fake_segment_document)
+    pdf = tmp_path / "doc1.pdf"
+    pdf.write_bytes(b"%PDF-1.4\n...")
+    state = LegalAnalysisState(doc1_path=str(pdf), doc2_path=None)
+    result = await ingest_and_segment(state, config=None, store=None)
+    assert result.doc1_text == "Artículo 1. Foo.\nArtículo 1. Foo.\nArtículo 1. Foo."
+    assert [seg.position for seg in result.doc1_segments] == [0, 1, 2]
+    assert [seg.id for seg in result.doc1_segments] == ["doc1_seg_0", "doc1_seg_1", "doc1_seg_2"]
+    assert result.meta['ingest']["doc1"]["num_pages"] == 3
+    assert result.doc2_segments == []
+    assert not result.meta['segmentation']["doc2"]["success"]
@@ -0,0 +1,57 @@
+import pytest
+from ldaa.agents.structural_segmentation import presegment
+from ldaa.agents.decide_segmentation import decide_segmentation
+
+LAW_TEXT = """LEY FEDERAL DE PRUEBA
+TÍTULO I
+DISPOSICIONES GENERALES
+CAPÍTULO I
+Del objeto
+Artículo 1.- La presente Ley es de orden público.
+Artículo 2. - Para los efectos de esta Ley se entenderá por:
+I. Sistema: todo sistema;
+II. Usuario: toda persona.
+CAPÍTULO II
+De las obligaciones
+Artículo 3.- Los proveedores deberán registrar sus sistemas.
+TRANSITORIOS
+Primero. El presente Decreto entrará en vigor al día siguiente.
+Segundo.- Se derogan las disposiciones que se opongan."""
+
+def test_presegment_detects_articles_and_transitories():
+    pieces = presegment(LAW_TEXT)
+    assert all(p["kind"] == "segment" for p in pieces)
+    articles = [p for p in pieces if p["segment_type"] == "article"]
+    assert len(articles) == 5
+    assert articles[0]["title"] == "TÍTULO I > CAPÍTULO I > Artículo 1"
+    assert articles[0]["text"].startswith("LEY FEDERAL DE PRUEBA")
+    assert articles[1]["text"].endswith("II. Usuario: toda persona.")
+    assert articles[2]["title"] == "TÍTULO I > CAPÍTULO II > Artículo 3"
+    assert articles[2]["text"].startswith("CAPÍTULO II")
+    assert articles[3]["title"] == "TRANSITORIOS > Transitorio Primero"
+    # Every character of the document is covered, in order
+    assert "".join(p["text"] for p in pieces).replace("\n", "") == LAW_TEXT.replace("\n", "")
+
+def test_presegment_falls_back_for_unstructured_text():
+    pieces = presegment("Section 1. Foo. Section 2. Bar.")
+    assert pieces == [{"kind": "llm", "title": "", "text": "Section 1. Foo. Section 2. Bar."}]
+
+@pytest.mark.asyncio
+async def test_decide_segmentation_hybrid_only_sends_unclassified_regions(dummy_state, dummy_config, dummy_store, monkeypatch):
+    calls = []
+    async def fake_segment_with_llm(text, doc_label="doc"):
+        calls.append(text)
+        return [{"title": "Motivos", "text": text, "segment_type": "section"}], {"success": True, "reasoning": []}
+    monkeypatch.setattr("ldaa.agents.decide_segmentation.segment_with_llm", fake_segment_with_llm)
+    motives = "EXPOSICIÓN DE MOTIVOS\n" + "Texto de la exposición de motivos. " * 30
+    state = dummy_state.model_copy()
+    state.doc1_text = motives + "\n" + LAW_TEXT
+    state.doc2_text = LAW_TEXT
+    result = await decide_segmentation(state, dummy_config, dummy_store)
+    assert len(calls) == 1
+    assert calls[0].startswith("EXPOSICIÓN DE MOTIVOS")
+    assert result.doc1_segments[0].title == "Motivos"
+    assert [seg.position for seg in result.doc1_segments] == list(range(len(result.doc1_segments)))
+    assert result.meta['segmentation']['doc1']['llm_regions'] == 1
+    assert result.meta['segmentation']['doc2']['llm_regions'] == 0
+    assert result.doc2_segments[0].segment_type == "article"
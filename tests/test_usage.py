@@ -0,0 +1,79 @@
+import pytest
+from langchain_core.messages import AIMessage
+from ldaa.agents import llm as llm_module
+from ldaa.agents.compare_documents import PROMPT_FIELDS, PROMPT_MAX_CHARS, fit_comparison_to_budget
+from ldaa.agents.config import load_config
+from ldaa.schemas import LegalAnalysisState, SegmentAnalysis
+from ldaa.utils.prompt_format import format_analyses
+from ldaa.utils.tokens import count_tokens
+from ldaa.utils.usage import TokenBudgetExceeded, tracks_usage
+
+class UsageLLM:
+    async def ainvoke(self, prompt):
+        cached = prompt.startswith("cached")
+        return AIMessage(
+            content="ok",
+            usage_metadata={"input_tokens": 10, "output_tokens": 5, "total_tokens": 15},
+            response_metadata={"cache_hit": cached},
+        )
+
+@pytest.fixture
+def budget_settings(monkeypatch):
+    settings = load_config().model_copy(deep=True)
+    monkeypatch.setattr(llm_module, "load_config", lambda: settings)
+    return settings
+
+@pytest.mark.asyncio
+async def test_usage_is_recorded_per_node(budget_settings):
+    @tracks_usage("demo_node")
+    async def demo_node(state, config, store):
+        await llm_module.invoke_llm(UsageLLM(), "fresh prompt")
+        await llm_module.invoke_llm(UsageLLM(), "cached prompt")
+        return state
+
+    state = await demo_node(LegalAnalysisState(), None, None)
+    usage = state.meta["usage"]["nodes"]["demo_node"]
+    assert usage["calls"] == 2 and usage["cached_calls"] == 1
+    assert usage["input_tokens"] == 10 and usage["output_tokens"] == 5
+    assert usage["cost_usd"] > 0 and usage["estimated_latency_s"] > 0
+    assert state.meta["usage"]["total"]["input_tokens"] == 10
+
+@pytest.mark.asyncio
+async def test_budgets_reject_calls_before_sending(budget_settings):
+    budget_settings.budget.max_prompt_tokens = 5
+    with pytest.raises(TokenBudgetExceeded):
+        await llm_module.invoke_llm(UsageLLM(), "a prompt that is longer than five tokens for sure")
+    budget_settings.budget.max_prompt_tokens = None
+    budget_settings.budget.max_run_tokens = 16
+
+    @tracks_usage("demo_node")
+    async def demo_node(state, config, store):
+        await llm_module.invoke_llm(UsageLLM(), "short", expected_output_tokens=0)
+        await llm_module.invoke_llm(UsageLLM(), "short", expected_output_tokens=0)
+        return state
+
+    with pytest.raises(TokenBudgetExceeded):
+        await demo_node(LegalAnalysisState(), None, None)
+
+def test_comparison_prompt_is_trimmed_to_budget():
+    text = " ".join(f"word{j}" for j in range(80))
+    def analysis(i, confidence):
+        return SegmentAnalysis(segment="x" * 2000, segment_id=str(i), summary=text, category="ethics", pros=[text], cons=[text], confidence=confidence, reasoning=text)
+    doc1 = [analysis(i, 0.1 * i) for i in range(10)]
+    doc2 = [analysis(10 + i, 0.9) for i in range(10)]
+    # Rendered like the comparison node does: the segment text is not part of the prompt
+    render = lambda d1, d2: format_analyses(d1, PROMPT_FIELDS, PROMPT_MAX_CHARS) + format_analyses(d2, PROMPT_FIELDS, PROMPT_MAX_CHARS)
+    kept1, kept2, steps = fit_comparison_to_budget(render, doc1, doc2, max_tokens=4000)
+    assert steps == ["shortened_analysis_fields"]
+    assert count_tokens(render(kept1, kept2)) <= 4000 < count_tokens(render(doc1, doc2))
+    kept1, kept2, steps = fit_comparison_to_budget(render, doc1, doc2, max_tokens=2000)
+    assert steps[0] == "shortened_analysis_fields" and steps[1].endswith("_low_confidence_analyses")
+    assert len(kept1) < len(doc1) and len(kept2) == len(doc2)  # Low-confidence analyses go first
+    assert fit_comparison_to_budget(render, doc1, doc2, max_tokens=None) == (doc1, doc2, [])
+
+def test_comparison_budget_counts_with_the_given_model(monkeypatch):
+    from ldaa.agents import compare_documents
+    models = []
+    monkeypatch.setattr(compare_documents, "count_tokens", lambda text, model=None: models.append(model) or 0)
+    fit_comparison_to_budget(lambda d1, d2: "prompt", [], [], 100, "gpt-4o")
+    assert models and set(models) == {"gpt-4o"}